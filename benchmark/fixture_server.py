@@ -0,0 +1,228 @@
+'''
+This file contains a local HTTP server which serves BBC recipe site fixture
+pages for the benchmark suite. Category and recipe pages are rendered from
+the templates in fixtures/, which reproduce the markup the scraper's
+selectors target, so the scraper can be benchmarked without the live site.
+'''
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from string import Template
+
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+CATEGORY_TEMPLATE = Template((FIXTURES / 'category.html').read_text())
+RECIPE_TEMPLATE = Template((FIXTURES / 'recipe.html').read_text())
+CATEGORY_PATH = re.compile(r'^/food/recipes/a-z/([a-z])/(\d+)$')
+RECIPE_PATH = re.compile(r'^/food/recipes/([a-z0-9_]+)$')
+IMAGE_PATH = re.compile(r'^/food/images/([a-z0-9_]+)\.jpg$')
+
+WORDS = ('apple', 'apricot', 'bean', 'beef', 'butter', 'carrot', 'cheese', 'chicken',
+         'chilli', 'cream', 'egg', 'fennel', 'garlic', 'ginger', 'honey', 'lamb', 'leek',
+         'lemon', 'lentil', 'mushroom', 'onion', 'pea', 'pepper', 'potato', 'rice',
+         'salmon', 'spinach', 'sugar', 'tomato', 'yoghurt')
+#the upper bound of each time range, as in the BBC Recipe blocks
+ISO_TIMES = {'less than 30 mins': 'PT30M', '10 to 30 mins': 'PT30M',
+             '30 mins to 1 hour': 'PT1H', '1 to 2 hours': 'PT2H'}
+DISHES = ('pie', 'tart', 'soup', 'stew', 'salad', 'curry', 'risotto', 'bake', 'cake', 'pasta')
+
+
+class FixtureSite:
+
+    def __init__(self, letters: str = 'abc', pages_per_letter: int = 5, recipes_per_page: int = 24,
+                 image_bytes: int = 50000):
+        '''
+        Describes the fixture corpus served by the fixture server
+
+        Parameters
+        ----------
+        letters: str
+            The A-Z categories served
+        pages_per_letter: int
+            The number of pages in every category
+        recipes_per_page: int
+            The number of recipe links on every category page
+        image_bytes: int
+            The size of every recipe image
+        '''
+        self.letters = letters
+        self.pages_per_letter = pages_per_letter
+        self.recipes_per_page = recipes_per_page
+        self.image_bytes = image_bytes
+
+
+    def recipe_slugs(self, letter: str, page: int):
+        return [f'{letter}_recipe_{page}_{number}' for number in range(self.recipes_per_page)]
+
+
+    def category_page(self, letter: str, page: int):
+        '''
+        Renders one A-Z category page
+        '''
+        keyboard = '\n'.join(
+            f'        <li class="az-keyboard__item"><a class="az-keyboard__link" '
+            f'href="/food/recipes/a-z/{key}/1#featured-content">{key.upper()}</a></li>'
+            if key in self.letters else
+            f'        <li class="az-keyboard__item"><span>{key.upper()}</span></li>'
+            for key in 'abcdefghijklmnopqrstuvwxyz')
+        promos = '\n'.join(
+            f'        <div class="gel-layout__item promo"><a href="/food/recipes/{slug}">'
+            f'<h3 class="promo__title">{escape(self.recipe(slug)["name"])}</h3></a></div>'
+            for slug in self.recipe_slugs(letter, page))
+        pagination = '\n'.join(
+            f'        <li><a href="/food/recipes/a-z/{letter}/{number}#featured-content">{number}</a></li>'
+            for number in range(1, self.pages_per_letter + 1))
+        if page < self.pages_per_letter:
+            pagination += (f'\n        <li><a href="/food/recipes/a-z/{letter}/{page + 1}#featured-content">'
+                           f'<span aria-label="Next">Next</span></a></li>')
+        else:
+            pagination += '\n        <li><span aria-label="Next">Next</span></li>'
+
+        return CATEGORY_TEMPLATE.substitute(letter=letter.upper(), keyboard=keyboard,
+                                            promos=promos, pagination=pagination)
+
+
+    def recipe(self, slug: str):
+        '''
+        Returns the data points of a fixture recipe, the same for every call
+        '''
+        rng = random.Random(slug)
+        main, second = rng.sample(WORDS, 2)
+        ingredients = rng.sample(WORDS, rng.randint(4, 15))
+        return {
+            'name': f"{main.title()} and {second} {rng.choice(DISHES)}",
+            'description': f"A {rng.choice(('quick', 'classic', 'hearty', 'light'))} recipe "
+                           f"with {main} and {second}.",
+            'prep_time': rng.choice(('less than 30 mins', '30 mins to 1 hour')),
+            'cook_time': rng.choice(('10 to 30 mins', '30 mins to 1 hour', '1 to 2 hours')),
+            'ingredients': ingredients,
+            'image_path': f'/food/images/{slug}.jpg'
+        }
+
+
+    def recipe_page(self, slug: str, host: str):
+        '''
+        Renders one recipe page
+        '''
+        recipe = self.recipe(slug)
+        image_url = f'http://{host}{recipe["image_path"]}'
+        ingredients = '\n'.join(
+            '        <ul class="recipe-ingredients__list">\n' + '\n'.join(
+                f'          <li class="recipe-ingredients__list-item">{ingredient_amount(slug, word)} '
+                f'<a class="recipe-ingredients__link" href="/food/{word}">{word}</a>, chopped</li>'
+                for word in group) + '\n          <li>salt and pepper</li>\n        </ul>'
+            for group in (recipe['ingredients'][:4], recipe['ingredients'][4:]) if group)
+        method = '\n'.join(f'        <li><p>Step {number}: prepare the {word}.</p></li>'
+                           for number, word in enumerate(recipe['ingredients'], start=1))
+        json_ld = json.dumps({
+            '@context': 'http://schema.org',
+            '@type': 'Recipe',
+            'name': recipe['name'],
+            'description': recipe['description'],
+            'image': [image_url],
+            'recipeIngredient': [f'{ingredient_amount(slug, word)} {word}' for word in recipe['ingredients']],
+            'prepTime': ISO_TIMES[recipe['prep_time']],
+            'cookTime': ISO_TIMES[recipe['cook_time']]
+        })
+
+        return RECIPE_TEMPLATE.substitute(
+            name=escape(recipe['name']), description=escape(recipe['description']),
+            prep_time=recipe['prep_time'], cook_time=recipe['cook_time'], image_url=image_url,
+            ingredients=ingredients, method=method, json_ld=json_ld)
+
+
+    def image(self, slug: str):
+        '''
+        Returns the bytes of a fixture recipe image
+        '''
+        return random.Random(slug).getrandbits(self.image_bytes * 8).to_bytes(self.image_bytes, 'little')
+
+
+def ingredient_amount(slug: str, word: str):
+    '''
+    Returns a quantity for an ingredient line
+    '''
+    return f'{random.Random(slug + word).randint(1, 500)}g'
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    #headers and body are written separately, avoid delayed ACK stalls on keep-alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        site = self.server.site
+        if self.server.latency:
+            #simulated network and server time
+            time.sleep(self.server.latency)
+        path = self.path.split('#')[0].split('?')[0]
+        host = self.headers.get('Host', 'localhost')
+        content_type = 'text/html; charset=utf-8'
+        category = CATEGORY_PATH.match(path)
+        recipe = RECIPE_PATH.match(path)
+        image = IMAGE_PATH.match(path)
+        if category and category.group(1) in site.letters and 1 <= int(category.group(2)) <= site.pages_per_letter:
+            body = site.category_page(category.group(1), int(category.group(2))).encode()
+        elif recipe:
+            body = site.recipe_page(recipe.group(1), host).encode()
+        elif image:
+            body = site.image(image.group(1))
+            content_type = 'image/jpeg'
+        else:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        #keep benchmark output clean
+        pass
+
+
+class FixtureServer:
+
+    def __init__(self, site: FixtureSite, host: str = '127.0.0.1', port: int = 0, latency_ms: float = 0):
+        '''
+        Initialises a threaded fixture server, port 0 picks a free port
+        '''
+        self.httpd = ThreadingHTTPServer((host, port), FixtureHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.site = site
+        self.httpd.latency = latency_ms / 1000
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
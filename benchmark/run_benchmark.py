@@ -0,0 +1,348 @@
+'''
+This is the offline benchmark suite for the BBC recipe scraper.
+
+Fixture A-Z category and recipe pages are served from a local HTTP server,
+the S3 bucket is replaced by a local directory and RDS by SQLite, so the
+numbers only depend on the scraper code and can be compared across commits.
+For link discovery, extraction and persistence the suite reports pages/sec,
+per-stage latency percentiles and peak RSS as JSON.
+
+    python benchmark/run_benchmark.py --output bench.json
+    python benchmark/run_benchmark.py --browser    # also time the Chrome paths
+'''
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'scraper'))
+
+import storage_credentials
+from fixture_server import FixtureServer, FixtureSite
+from stand_ins import LocalS3
+from waits import RatePolicy
+
+
+def percentiles(times: list):
+    '''
+    Summarises durations in seconds as latency percentiles in milliseconds
+    '''
+    if not times:
+        return {'count': 0}
+    times = sorted(times)
+
+    def at(fraction):
+        return round(times[min(len(times) - 1, int(len(times) * fraction))] * 1000, 3)
+
+    return {
+        'count': len(times),
+        'mean_ms': round(sum(times) / len(times) * 1000, 3),
+        'p50_ms': at(0.50),
+        'p90_ms': at(0.90),
+        'p99_ms': at(0.99),
+        'max_ms': round(times[-1] * 1000, 3)
+    }
+
+
+def peak_rss_mb():
+    '''
+    Returns the peak resident set size of this process so far
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    '''
+    Collects the latency of every call in a benchmark stage
+    '''
+
+    def __init__(self):
+        self.times = []
+        self.start = None
+        self.seconds = 0
+
+
+    def wrap(self, function):
+        '''
+        Returns function wrapped so every call is timed
+        '''
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.times.append(time.perf_counter() - start)
+        return timed
+
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        #a stage may be entered several times, its wall time accumulates
+        self.seconds += time.perf_counter() - self.start
+
+
+    def report(self, pages: int = None):
+        pages = len(self.times) if pages is None else pages
+        return {
+            'pages': pages,
+            'seconds': round(self.seconds, 3),
+            'pages_per_sec': round(pages / self.seconds, 2) if self.seconds else None,
+            'latency': percentiles(self.times),
+            'peak_rss_mb': peak_rss_mb()
+        }
+
+
+def bench_http(scraper_class, start_url: str, results: dict, max_links: int, workers: int):
+    '''
+    Times browserless link discovery, extraction and persistence
+    '''
+    scraper = scraper_class(None, url=start_url, fetch_mode='http', browser=False,
+                            rate_policy=RatePolicy(0))
+
+    #link discovery: get_categories_direct and next_page_direct
+    discovery = StageTimer()
+    scraper.fetcher.get = discovery.wrap(scraper.fetcher.get)
+    with discovery:
+        scraper.get_categories_direct()
+        scraper.next_page_direct(max_workers=workers, max_links=max_links)
+    results['discovery_direct'] = discovery.report()
+    results['discovery_direct']['links'] = len(scraper.total_links_list)
+
+    #extraction: fetch and parse every recipe page
+    extraction = StageTimer()
+    records = []
+    get_details = extraction.wrap(scraper._get_details_http)
+    with extraction:
+        for scraper.link in scraper.total_links_list:
+            records.append(get_details())
+    results['extraction_http'] = extraction.report()
+
+    #persistence: image transfer, JSON to S3 and batched RDS write
+    from rds_writer import RecipeWriter
+    image, json_upload, rds = StageTimer(), StageTimer(), StageTimer()
+    upload_image = image.wrap(scraper._upload_image)
+    store_record = json_upload.wrap(scraper._store_record)
+    writer = RecipeWriter(storage_credentials.get_engine(), batch_size=100)
+    add = rds.wrap(writer.add)
+    for record in records:
+        scraper._load_record(record)
+        with image:
+            upload_image()
+        with json_upload:
+            store_record()
+    with rds:
+        for record in records:
+            add(record)
+        writer.close()
+    results['persistence_image'] = image.report()
+    results['persistence_json'] = json_upload.report()
+    results['persistence_rds_batched'] = rds.report()
+    scraper.fetcher.close()
+    scraper.image_transfer.close()
+
+    return records
+
+
+def bench_stream(scraper_class, start_url: str, results: dict, max_links: int, workers: int):
+    '''
+    Times iter_recipes extracting recipes while links are discovered, and the most
+    memory the Python heap held while streaming them
+    '''
+    scraper = scraper_class(None, url=start_url, fetch_mode='http', browser=False,
+                            rate_policy=RatePolicy(0))
+    stream = StageTimer()
+    scraper.get_categories_direct()
+    discover = lambda: scraper.next_page_direct(max_workers=workers, max_links=max_links)
+    tracemalloc.start()
+    with stream:
+        recipes = 0
+        for _ in scraper.iter_recipes(discover=discover, store=False):
+            recipes += 1
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    results['stream_http'] = stream.report(recipes)
+    results['stream_http']['peak_traced_kb'] = round(peak / 1024, 1)
+    scraper.fetcher.close()
+    scraper.image_transfer.close()
+
+
+def bench_parse(records: list, fetcher, results: dict):
+    '''
+    Times parsing alone, on pages already held in memory, with the JSON-LD block
+    and with the XPaths, and compares their output
+    '''
+    from recipe_parser import parity_report, parse_recipe
+    pages = [(record['recipe_url'], fetcher.get(record['recipe_url'])) for record in records]
+    for name, json_ld in (('jsonld', True), ('xpath', False)):
+        parse = StageTimer()
+        timed_parse = parse.wrap(parse_recipe)
+        with parse:
+            for recipe_url, page_html in pages:
+                timed_parse(page_html, recipe_url, json_ld=json_ld)
+        results[f'extraction_parse_only_{name}'] = parse.report()
+    results['extraction_parity'] = parity_report(pages)
+
+
+def bench_browser(scraper_class, start_url: str, results: dict, sample: int):
+    '''
+    Times link discovery and extraction through Chrome, and page loads with the full
+    and lean profiles
+    '''
+    from browser_profile import weight_summary
+    from chrome_config import chrome_options
+    from waits import RECIPE_TITLE
+    scraper = scraper_class(chrome_options, url=start_url, rate_policy=RatePolicy(0))
+    try:
+        discovery = StageTimer()
+        #one _get_links call per category page
+        scraper._get_links = discovery.wrap(scraper._get_links)
+        with discovery:
+            scraper.get_categories()
+            scraper.next_page()
+        results['discovery_browser'] = discovery.report()
+        results['discovery_browser']['links'] = len(scraper.total_links_list)
+        links = scraper.total_links_list[:sample]
+        for mode, method in (('xpath', scraper._get_details), ('script', scraper._get_details_script),
+                             ('jsonld', scraper._get_details_json_ld)):
+            load, extraction = StageTimer(), StageTimer()
+            get = load.wrap(scraper.driver.get)
+            extract = extraction.wrap(method)
+            for scraper.link in links:
+                with load:
+                    get(scraper.link)
+                with extraction:
+                    extract()
+            results[f'extraction_{mode}'] = extraction.report()
+            results[f'extraction_{mode}']['page_load'] = load.report()
+    finally:
+        scraper.driver.quit()
+
+    #page load time and bytes per page with and without the lean profile
+    for profile in ('full', 'lean'):
+        scraper = scraper_class(chrome_options, url=start_url, rate_policy=RatePolicy(0),
+                                lean=profile == 'lean')
+        try:
+            load = StageTimer()
+            open_page = load.wrap(scraper._open)
+            scraper.page_weights = []
+            with load:
+                for link in links:
+                    open_page(link, RECIPE_TITLE)
+            results[f'page_load_{profile}'] = load.report()
+            results[f'page_load_{profile}']['weight'] = weight_summary(scraper.page_weights)
+        finally:
+            scraper.driver.quit()
+
+
+def bench_cache(links: list, results: dict, cache_dir: str):
+    '''
+    Times fetching recipe pages through the response cache: downloading them into an
+    empty cache, revalidating them (304) and reading them while still fresh
+    '''
+    from http_fetch import HTTPFetcher
+    from response_cache import ResponseCache
+
+    cache = ResponseCache(cache_dir)
+    fetcher = HTTPFetcher(cache=cache)
+    for stage, ttl in (('cache_miss', 0), ('cache_revalidated', 0), ('cache_hit', 3600)):
+        cache.ttls['recipe'] = ttl
+        timer = StageTimer()
+        get = timer.wrap(fetcher.get)
+        with timer:
+            for link in links:
+                get(link)
+        results[f'fetch_{stage}'] = timer.report()
+    results['fetch_cache_hit']['cache'] = cache.stats()
+    fetcher.close()
+    cache.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Offline benchmark for the BBC recipe scraper')
+    parser.add_argument('--letters', default='abc', help='A-Z categories served by the fixture site')
+    parser.add_argument('--pages-per-letter', type=int, default=5)
+    parser.add_argument('--recipes-per-page', type=int, default=24)
+    parser.add_argument('--image-bytes', type=int, default=50000)
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='delay added to every fixture response')
+    parser.add_argument('--max-links', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--browser', action='store_true', help='also benchmark the Chrome paths')
+    parser.add_argument('--browser-sample', type=int, default=20,
+                        help='recipes extracted through Chrome')
+    parser.add_argument('--output', help='write the JSON results to this file')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    site = FixtureSite(args.letters, args.pages_per_letter, args.recipes_per_page, args.image_bytes)
+    work_dir = tempfile.TemporaryDirectory()
+    storage_credentials.configure(
+        s3_client=LocalS3(os.path.join(work_dir.name, 's3')),
+        bucket_name='benchmark',
+        bucket_link=f'file://{work_dir.name}/s3/benchmark/',
+        database_url=f'sqlite:///{work_dir.name}/recipes.db')
+    from recipe_scraper import BBCRecipeScraper
+
+    results = {}
+    cwd = os.getcwd()
+    #the scraper writes raw_recipe_data relative to the working directory
+    os.chdir(work_dir.name)
+    try:
+        with FixtureServer(site, latency_ms=args.latency_ms) as server:
+            start_url = f'{server.base_url}/food/recipes/a-z/{args.letters[0]}/1#featured-content'
+            records = bench_http(BBCRecipeScraper, start_url, results, args.max_links, args.workers)
+            bench_stream(BBCRecipeScraper, start_url, results, args.max_links, args.workers)
+            from http_fetch import HTTPFetcher
+            fetcher = HTTPFetcher()
+            bench_parse(records, fetcher, results)
+            fetcher.close()
+            bench_cache([record['recipe_url'] for record in records], results,
+                        os.path.join(work_dir.name, 'http_cache'))
+            if args.browser:
+                bench_browser(BBCRecipeScraper, start_url, results, args.browser_sample)
+    finally:
+        os.chdir(cwd)
+        work_dir.cleanup()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'config': vars(args),
+        'stages': results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,55 @@
+'''
+This file contains local stand-ins for the external storage used by the
+scraper, so persistence can be benchmarked without AWS. RDS is replaced by
+SQLite through storage_credentials.configure.
+'''
+
+import os
+import shutil
+import threading
+from botocore.exceptions import ClientError
+
+
+class LocalS3:
+    '''
+    Implements the s3 client calls used by the scraper by writing objects to a
+    local directory, one sub-directory per bucket
+    '''
+
+    def __init__(self, root: str):
+        self.root = root
+        self.puts = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+
+    def _path(self, bucket: str, key: str):
+        path = os.path.join(self.root, bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+
+    def _count(self, path: str):
+        with self._lock:
+            self.puts += 1
+            self.bytes += os.path.getsize(path)
+
+
+    def upload_file(self, filename: str, bucket: str, key: str):
+        path = self._path(bucket, key)
+        shutil.copyfile(filename, path)
+        self._count(path)
+
+
+    def upload_fileobj(self, fileobj, bucket: str, key: str, ExtraArgs: dict = None):
+        path = self._path(bucket, key)
+        with open(path, 'wb') as handler:
+            shutil.copyfileobj(fileobj, handler)
+        self._count(path)
+
+
+    def head_object(self, Bucket: str, Key: str):
+        path = os.path.join(self.root, Bucket, Key)
+        if not os.path.exists(path):
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        return {'ContentLength': os.path.getsize(path)}
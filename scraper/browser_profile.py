@@ -0,0 +1,103 @@
+'''
+This file contains the lean Chrome profile used by the web scraper. Recipe
+data only needs the HTML, so the lean profile stops Chrome from loading
+images, media, fonts and anything from hosts outside the BBC: images are
+turned off in the profile, non-BBC host names do not resolve, and the
+remaining asset URLs are blocked through the Chrome DevTools Protocol.
+The hero image is still read from its <img> src and copied to S3 separately.
+'''
+
+import copy
+
+
+#hosts Chrome may connect to with the lean profile
+ALLOWED_HOSTS = ('*.bbc.co.uk', '*.bbci.co.uk', '*.bbc.com', 'localhost')
+
+#asset URLs dropped by the lean profile, a trailing * also matches query strings
+BLOCKED_URL_PATTERNS = (
+    #images
+    '*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*',
+    #fonts
+    '*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*',
+    #media
+    '*.mp4*', '*.webm*', '*.mp3*', '*.m3u8*'
+)
+
+#navigation and resource timing for the current page. transferSize is 0 for
+#cached responses and for cross-origin resources without Timing-Allow-Origin
+PAGE_WEIGHT_SCRIPT = '''
+const navigation = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let bytes = navigation ? navigation.transferSize : 0;
+for (const resource of resources) {
+    bytes += resource.transferSize || 0;
+}
+return {
+    load_ms: navigation && navigation.loadEventEnd ? navigation.loadEventEnd - navigation.startTime : null,
+    bytes: bytes,
+    requests: resources.length + 1
+};
+'''
+
+
+def lean_options(options, allowed_hosts: tuple = ALLOWED_HOSTS):
+    '''
+    Returns a copy of options with images turned off and hosts outside allowed_hosts
+    blocked
+
+    Parameters
+    ----------
+    options: selenium.webdriver.chrome.options.Options
+        The full profile, e.g. chrome_config.chrome_options
+    allowed_hosts: tuple
+        Host name patterns which still resolve
+
+    Returns
+    -------
+    options: selenium.webdriver.chrome.options.Options
+        The lean profile
+    '''
+    options = copy.deepcopy(options)
+    prefs = dict(options.experimental_options.get('prefs', {}))
+    prefs['profile.managed_default_content_settings.images'] = 2
+    options.add_experimental_option('prefs', prefs)
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    exclude = ', '.join(f'EXCLUDE {host}' for host in allowed_hosts)
+    options.add_argument(f'--host-resolver-rules=MAP * ~NOTFOUND, {exclude}')
+
+    return options
+
+
+def block_resources(driver, patterns: tuple = BLOCKED_URL_PATTERNS):
+    '''
+    Blocks requests to URLs matching patterns for every page the driver loads
+    '''
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+
+
+def page_weight(driver):
+    '''
+    Measures the page currently loaded in driver
+
+    Returns
+    -------
+    weight: dict
+        load_ms, the bytes transferred and the number of requests
+    '''
+    return driver.execute_script(PAGE_WEIGHT_SCRIPT)
+
+
+def weight_summary(weights: list):
+    '''
+    Summarises page_weight measurements as median load time and mean bytes per page
+    '''
+    if not weights:
+        return {'pages': 0}
+    load_times = sorted(weight['load_ms'] for weight in weights if weight['load_ms'] is not None)
+    return {
+        'pages': len(weights),
+        'p50_load_ms': round(load_times[len(load_times) // 2], 1) if load_times else None,
+        'mean_bytes': round(sum(weight['bytes'] for weight in weights) / len(weights)),
+        'mean_requests': round(sum(weight['requests'] for weight in weights) / len(weights), 1)
+    }
@@ -0,0 +1,173 @@
+'''
+This file contains the crawl checkpoint used by the web scraper.
+The crawl frontier (discovered recipe links and the status of each link)
+is persisted to a local SQLite database, so a crawl which dies partway
+through can resume from where it stopped instead of starting over.
+'''
+
+import sqlite3
+import threading
+import time
+
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class CrawlCheckpoint:
+
+    def __init__(self, path: str = 'crawl_checkpoint.db', batch_size: int = 50):
+        '''
+        Opens (or creates) the checkpoint database
+
+        Parameters
+        ----------
+        path: str
+            The SQLite file the frontier is stored in
+        batch_size: int
+            Link status updates are buffered and written in batches of this size
+        '''
+        self.path = path
+        self.batch_size = batch_size
+        self._updates = []
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS links (
+                    url TEXT PRIMARY KEY,
+                    category TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    error TEXT,
+                    updated REAL
+                );
+                CREATE INDEX IF NOT EXISTS links_status ON links (status);
+                CREATE TABLE IF NOT EXISTS categories (
+                    url TEXT PRIMARY KEY,
+                    completed REAL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            ''')
+
+
+    def reset(self):
+        '''
+        Clears the checkpoint to start a fresh crawl
+        '''
+        with self._lock, self.connection:
+            self._updates = []
+            self.connection.executescript('DELETE FROM links; DELETE FROM categories; DELETE FROM meta;')
+
+
+    def add_category(self, category: str, links: list):
+        '''
+        Stores the links discovered in a category and marks the category complete
+        '''
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO links (url, category, updated) VALUES (?, ?, ?)',
+                [(link, category, now) for link in links])
+            self.connection.execute(
+                'INSERT OR REPLACE INTO categories (url, completed) VALUES (?, ?)', (category, now))
+
+
+    def completed_categories(self):
+        '''
+        Returns the set of categories whose links have all been discovered
+        '''
+        with self._lock:
+            return {row[0] for row in self.connection.execute('SELECT url FROM categories')}
+
+
+    def category_links(self, category: str):
+        '''
+        Returns the links discovered in a category, in discovery order
+        '''
+        with self._lock:
+            return [row[0] for row in self.connection.execute(
+                'SELECT url FROM links WHERE category = ? ORDER BY rowid', (category,))]
+
+
+    def set_discovery_complete(self):
+        '''
+        Records that link discovery finished, so a resumed crawl can skip it
+        '''
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('discovery_complete', '1')")
+
+
+    def discovery_complete(self):
+        '''
+        Returns True if link discovery finished in a previous run
+        '''
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = 'discovery_complete'").fetchone()
+        return row is not None
+
+
+    def links(self, statuses=(PENDING, FAILED)):
+        '''
+        Returns the discovered links with one of the given statuses, in discovery order
+        '''
+        self.flush()
+        placeholders = ', '.join('?' for _ in statuses)
+        with self._lock:
+            return [row[0] for row in self.connection.execute(
+                f'SELECT url FROM links WHERE status IN ({placeholders}) ORDER BY rowid',
+                tuple(statuses))]
+
+
+    def filter_pending(self, links: list):
+        '''
+        Returns the links which are not done, keeping their order
+        '''
+        done = set(self.links(statuses=(DONE,)))
+        return [link for link in links if link not in done]
+
+
+    def mark(self, url: str, status: str, error: str = None):
+        '''
+        Buffers a link status update, writing the buffer once it is full
+        '''
+        with self._lock:
+            self._updates.append((url, status, error, time.time()))
+            full = len(self._updates) >= self.batch_size
+        if full:
+            self.flush()
+
+
+    def flush(self):
+        '''
+        Writes all buffered link status updates in one transaction
+        '''
+        with self._lock, self.connection:
+            updates, self._updates = self._updates, []
+            self.connection.executemany(
+                'INSERT INTO links (url, status, error, updated) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (url) DO UPDATE SET status = excluded.status, '
+                'error = excluded.error, updated = excluded.updated',
+                updates)
+
+
+    def counts(self):
+        '''
+        Returns the number of links with each status
+        '''
+        self.flush()
+        with self._lock:
+            return dict(self.connection.execute('SELECT status, COUNT(*) FROM links GROUP BY status'))
+
+
+    def close(self):
+        '''
+        Writes buffered updates and closes the database
+        '''
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,82 @@
+'''
+This file contains the JavaScript used to extract a whole recipe record from
+the page loaded in Chrome with a single execute_script call, instead of one
+WebDriver round trip per field and per ingredient.
+'''
+
+from recipe_parser import _clean, find_json_ld_recipe, recipe_from_fields, recipe_from_json_ld
+
+
+#the XPaths match those used in BBCRecipeScraper._get_details
+RECIPE_SCRIPT = '''
+function first(xpath, context) {
+    return document.evaluate(xpath, context || document, null,
+        XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+function text(node) {
+    return node ? node.innerText.trim() : null;
+}
+var image = first('//div[@class="recipe-media__image responsive-image-container__16/9"]/img');
+var wrapper = first('//div[@class="recipe-ingredients-wrapper"]');
+var ingredients = [];
+if (wrapper) {
+    var rows = document.evaluate('./ul/li/a[1]', wrapper, null,
+        XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    for (var i = 0; i < rows.snapshotLength; i++) {
+        ingredients.push(text(rows.snapshotItem(i)));
+    }
+}
+return {
+    name: text(first('//h1[@class="gel-trafalgar content-title__text"]')),
+    description: text(first('//p[@class="recipe-description__text"]')),
+    cook_time: text(first(
+        '(//div[@class="gel-layout__item gel-1/4 recipe-leading-info__side-bar"]/div)[1]/div[2]/p[2]')),
+    image_url: image ? image.src : null,
+    ingredients: ingredients
+};
+'''
+
+#the text of every JSON-LD block, parsed in python by recipe_parser
+JSON_LD_SCRIPT = '''
+return Array.from(document.querySelectorAll('script[type="application/ld+json"]'),
+                  function (script) { return script.textContent; });
+'''
+
+
+def extract_recipe(driver, recipe_url: str):
+    '''
+    Extracts the recipe on the current page in one WebDriver round trip
+
+    Parameters
+    ----------
+    driver: webdriver.Chrome
+        The driver that has the recipe page loaded
+    recipe_url: str
+        The URL of the recipe page
+
+    Returns
+    -------
+    dict_recipe: dictionary
+        A dictionary with the same shape as BBCRecipeScraper._get_details returns
+    '''
+    fields = driver.execute_script(RECIPE_SCRIPT) or {}
+
+    return recipe_from_fields(recipe_url, **fields)
+
+
+def extract_recipe_json_ld(driver, recipe_url: str):
+    '''
+    Extracts the recipe on the current page from its JSON-LD Recipe block in one
+    WebDriver round trip
+
+    Returns
+    -------
+    dict_recipe: dictionary
+        A dictionary with the same shape as BBCRecipeScraper._get_details returns, or
+        None if the page has no Recipe block with a name
+    '''
+    recipe = find_json_ld_recipe(driver.execute_script(JSON_LD_SCRIPT) or [])
+    if recipe is None or not _clean(recipe.get('name')):
+        return None
+
+    return recipe_from_json_ld(recipe, recipe_url)
@@ -0,0 +1,247 @@
+'''
+This file contains the URL frontier used by the web scraper's link
+discovery. Every discovered recipe URL is canonicalized, so fragments such
+as #featured-content and query variants of the same recipe are scraped once,
+checked against the URLs already seen and counted against the crawl budget.
+
+Accepted URLs can be read from the frontier as they are discovered, so
+scraping can start before link discovery has finished. Only the seen set and
+the URLs not yet read are kept, a list of every accepted URL is opt-in
+(keep_links).
+'''
+
+import hashlib
+import math
+import queue
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+
+#marks the end of discovery for readers of the frontier
+_CLOSED = object()
+
+
+class FrontierClosed(ValueError):
+    '''
+    Raised when a URL is added after the frontier was closed, e.g. by a reader which
+    stopped reading early
+    '''
+
+
+def canonicalize(url: str):
+    '''
+    Returns the canonical form of a recipe URL: lower case scheme and host, no
+    default port, query, fragment or trailing slash
+    '''
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = f'{host}:{parts.port}'
+    path = parts.path.rstrip('/') or '/'
+
+    return urlunsplit((scheme, host, path, '', ''))
+
+
+def _digest(url: str):
+    return hashlib.blake2b(url.encode(), digest_size=16).digest()
+
+
+class DigestSet:
+    '''
+    An exact set of URLs which keeps a 64 bit hash of each URL instead of the URL
+    '''
+
+    def __init__(self):
+        self._digests = set()
+
+    def add(self, url: str):
+        '''
+        Adds url, returns False if it was already in the set
+        '''
+        digest = _digest(url)[:8]
+        if digest in self._digests:
+            return False
+        self._digests.add(digest)
+        return True
+
+    def __contains__(self, url: str):
+        return _digest(url)[:8] in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+
+class BloomFilter:
+    '''
+    A fixed size set of URLs for very large crawls. A URL which was never added is
+    reported as seen with probability error_rate, so it is skipped.
+    '''
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray(self.size // 8 + 1)
+        self._count = 0
+
+    def _positions(self, url: str):
+        digest = _digest(url)
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return [(first + number * second) % self.size for number in range(self.hashes)]
+
+    def add(self, url: str):
+        '''
+        Adds url, returns False if it was (probably) already in the filter
+        '''
+        added = False
+        for position in self._positions(url):
+            byte, bit = divmod(position, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                added = True
+        self._count += added
+        return added
+
+    def __contains__(self, url: str):
+        return all(self._bits[position // 8] & (1 << position % 8) for position in self._positions(url))
+
+    def __len__(self):
+        return self._count
+
+
+class Frontier:
+
+    def __init__(self, max_links: int = 1000, max_per_category: int = None,
+                 bloom_capacity: int = None, error_rate: float = 0.001, keep_links: bool = False):
+        '''
+        Initialises an empty frontier
+
+        Parameters
+        ----------
+        max_links: int
+            Accept at most this many URLs in total, None for no limit
+        max_per_category: int
+            Accept at most this many URLs from each category, None for no limit
+        bloom_capacity: int
+            Remember seen URLs in a Bloom filter sized for this many URLs instead of
+            an exact set
+        error_rate: float
+            The Bloom filter's false positive rate
+        keep_links: bool
+            Also keep every accepted URL in links. Otherwise links is None and URLs are
+            only held until they are read.
+        '''
+        self.max_links = max_links
+        self.max_per_category = max_per_category
+        self.seen = BloomFilter(bloom_capacity, error_rate) if bloom_capacity else DigestSet()
+        self.links = [] if keep_links else None
+        self.accepted = 0
+        self.duplicates = 0
+        self.over_budget = 0
+        self._category_counts = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+
+
+    @property
+    def full(self):
+        '''
+        Whether the total budget has been reached
+        '''
+        return self.max_links is not None and self.accepted >= self.max_links
+
+
+    @property
+    def closed(self):
+        '''
+        Whether discovery has ended, or a reader stopped it
+        '''
+        return self._closed
+
+
+    def category_full(self, category: str):
+        '''
+        Whether the budget for category has been reached
+        '''
+        return (self.max_per_category is not None
+                and self._category_counts.get(category, 0) >= self.max_per_category)
+
+
+    def add(self, url: str, category: str = None, limit: int = None):
+        '''
+        Adds a discovered URL if it is new and within budget, and within limit URLs 
+        in total if given
+
+        Returns
+        -------
+        url: str
+            The canonical URL, or None if it was a duplicate or over budget
+        '''
+        url = canonicalize(url)
+        with self._lock:
+            if self._closed:
+                raise FrontierClosed('URL added to a closed frontier')
+            if url in self.seen:
+                self.duplicates += 1
+                return None
+            if (self.full or self.category_full(category)
+                    or (limit is not None and self.accepted >= limit)):
+                self.over_budget += 1
+                return None
+            self.seen.add(url)
+            self.accepted += 1
+            if self.links is not None:
+                self.links.append(url)
+            self._category_counts[category] = self._category_counts.get(category, 0) + 1
+        self._queue.put(url)
+
+        return url
+
+
+    def extend(self, urls, category: str = None, limit: int = None):
+        '''
+        Adds URLs in order, returns the canonical URLs which were accepted
+        '''
+        return [url for url in (self.add(url, category, limit) for url in urls) if url is not None]
+
+
+    def close(self):
+        '''
+        Marks the end of discovery, so iteration stops once every URL has been read
+        '''
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(_CLOSED)
+
+
+    def __iter__(self):
+        '''
+        Yields accepted URLs in discovery order as they are added, until close() is
+        called. Each URL is yielded once, to one reader.
+        '''
+        while True:
+            url = self._queue.get()
+            if url is _CLOSED:
+                #let other readers stop too
+                self._queue.put(_CLOSED)
+                return
+            yield url
+
+
+    def __len__(self):
+        return self.accepted
+
+
+    def stats(self):
+        '''
+        Returns the frontier counters
+        '''
+        return {
+            'links': self.accepted,
+            'duplicates': self.duplicates,
+            'over_budget': self.over_budget,
+            'categories': len(self._category_counts)
+        }
@@ -0,0 +1,115 @@
+'''
+This file contains the raw HTML archive used by the web scraper. When it is
+enabled, the HTML of every recipe page is saved, gzip compressed, as the
+page is scraped, together with the UUID and S3 image URL given to the
+recipe. reparse.py can then extract every recipe again from the archive,
+e.g. after the BBC markup changes or a field is added to dict_recipe,
+without loading a single page.
+
+    {directory}/index.db              URL, file, UUID and image_s3 of each page
+    {directory}/pages/ab/ab12....html.gz
+'''
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from frontier import canonicalize
+
+
+class HTMLArchive:
+
+    def __init__(self, directory: str = 'html_archive'):
+        '''
+        Opens (or creates) the archive
+
+        Parameters
+        ----------
+        directory: str
+            Where the index and the compressed pages are stored
+        '''
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'pages'), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    uuid TEXT,
+                    image_s3 TEXT,
+                    archived REAL NOT NULL
+                )''')
+
+
+    def put(self, url: str, page_html: str):
+        '''
+        Saves the HTML of a page, replacing any earlier copy
+        '''
+        url = canonicalize(url)
+        digest = hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+        path = os.path.join('pages', digest[:2], f'{digest}.html.gz')
+        full_path = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        #write then rename, so a reparse never reads a partial page
+        temporary = f'{full_path}.{threading.get_ident()}.tmp'
+        with gzip.open(temporary, 'wt', encoding='utf-8') as handler:
+            handler.write(page_html)
+        os.replace(temporary, full_path)
+        with self._lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO pages (url, path, archived) VALUES (?, ?, ?) ON CONFLICT (url) '
+                'DO UPDATE SET path = excluded.path, archived = excluded.archived',
+                (url, path, time.time()))
+
+
+    def set_outputs(self, dict_recipe: dict):
+        '''
+        Records the UUID and S3 image URL given to a scraped recipe, which cannot be
+        read from its HTML, so a reparse keeps them
+        '''
+        image_s3 = dict_recipe.get('image_s3') or None
+        if isinstance(image_s3, dict):
+            #the URLs of the original and its variants, see image_processing
+            image_s3 = json.dumps(image_s3)
+        with self._lock, self.connection:
+            self.connection.execute('UPDATE pages SET uuid = ?, image_s3 = ? WHERE url = ?',
+                                    (dict_recipe.get('uuid'), image_s3,
+                                     canonicalize(dict_recipe['recipe_url'])))
+
+
+    def pages(self):
+        '''
+        Returns (url, path, uuid, image_s3) for every archived page, with the full path
+        of its HTML file
+        '''
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT url, path, uuid, image_s3 FROM pages ORDER BY archived').fetchall()
+        return [(url, os.path.join(self.directory, path), uuid,
+                 json.loads(image_s3) if image_s3 and image_s3.startswith('{') else image_s3)
+                for url, path, uuid, image_s3 in rows]
+
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+
+    def close(self):
+        '''
+        Closes the index
+        '''
+        self.connection.close()
+
+
+def read_page(path: str):
+    '''
+    Returns the HTML saved at path
+    '''
+    with gzip.open(path, 'rt', encoding='utf-8') as handler:
+        return handler.read()
@@ -0,0 +1,98 @@
+'''
+This file contains the HTTP fetch engine used by the web scraper when a page
+does not need a browser. A single keep-alive requests.Session is shared, so
+connections to www.bbc.co.uk are pooled and reused between pages. Requests
+are retried and paused by the shared resilience policy (resilience.py), and
+can be served from the persistent response cache (response_cache.py).
+'''
+
+import requests
+from requests.adapters import HTTPAdapter
+from chrome_config import user_agent
+from resilience import Resilience
+
+
+class HTTPFetcher:
+
+    def __init__(self, pool_size: int = 10, timeout: float = 20, retries: int = 2,
+                 rate_policy=None, resilience=None, cache=None):
+        '''
+        Initialises a pooled, keep-alive HTTP session
+
+        Parameters
+        ----------
+        pool_size: int
+            The number of connections kept open per host
+        timeout: float
+            Seconds to wait for the server before giving up on a page, when no 
+            resilience policy is given
+        retries: int
+            How many times a timeout, failed connection, 429 or 5xx response is retried, 
+            when no resilience policy is given
+        rate_policy: waits.RatePolicy
+            If given, every request waits for the policy's politeness delay, and the 
+            policy observes every response
+        resilience: resilience.Resilience
+            The timeouts, retries and circuit breakers shared with the rest of the run
+        cache: response_cache.ResponseCache
+            If given, fresh cached pages are returned without a request and stale ones 
+            are revalidated with their ETag or Last-Modified date
+        '''
+        self.resilience = resilience or Resilience(timeout=timeout, retries=retries)
+        self.timeout = self.resilience.timeout
+        self.rate_policy = rate_policy
+        self.cache = cache
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': user_agent})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+
+    def get(self, url: str):
+        '''
+        Fetches a page and returns its HTML
+
+        Raises requests.RequestException if the server does not return the page, or
+        resilience.CircuitOpenError if the host is paused.
+        '''
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is not None and entry.fresh:
+            return entry.text
+        headers = entry.validators() if entry is not None else None
+        response = self.resilience.call(url, self._get, url, headers)
+        if response.status_code == 304 and entry is not None:
+            self.cache.refresh(url)
+            return entry.text
+        if self.cache is not None:
+            self.cache.put(url, response.text, response.headers.get('ETag'),
+                           response.headers.get('Last-Modified'))
+
+        return response.text
+
+
+    def _get(self, url: str, headers: dict = None):
+        #every attempt waits for the rate policy, retries included
+        if self.rate_policy is None:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+            return response
+        self.rate_policy.wait(url)
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.Timeout:
+            #a timeout is the slowest response
+            self.rate_policy.observe(url, latency=self.timeout)
+            raise
+        self.rate_policy.observe(url, response.status_code, response.elapsed.total_seconds(),
+                                 response.headers.get('Retry-After'))
+        response.raise_for_status()
+
+        return response
+
+
+    def close(self):
+        '''
+        Closes all pooled connections
+        '''
+        self.session.close()
@@ -0,0 +1,273 @@
+'''
+This file contains the image processing stage used by the web scraper.
+Recipe images are stored under the SHA-256 hash of their bytes, so an image
+shared by several recipes, or kept when a recipe is renamed, is uploaded
+once. Resized and recompressed variants, e.g. thumbnails, are made in a
+process pool and stored next to the original:
+
+    images/{sha256}/original.png
+    images/{sha256}/thumb.jpg
+    images/{sha256}/medium.jpg
+
+The original keeps its bytes and is uploaded with the content type and file
+extension of its format, the variants are always JPEG. Records keep the URL of the original and of each variant.
+
+Pillow is needed to make the variants; without it only the original is stored.
+'''
+
+import hashlib
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from botocore.exceptions import ClientError
+from metrics import IMAGES_DEDUPLICATED
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+#variant name: the longest side in pixels
+DEFAULT_VARIANTS = {'thumb': 320, 'medium': 960}
+
+
+def parse_variants(spec: str):
+    '''
+    Reads variants written as name=size pairs, e.g. 'thumb=320,medium=960'
+    '''
+    variants = {}
+    for pair in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, size = pair.partition('=')
+        if not name or name == 'original' or not size.isdigit() or int(size) <= 0:
+            raise ValueError(f'Invalid image variant: {pair}')
+        variants[name] = int(size)
+
+    return variants
+
+
+def content_key(digest: str, variant: str = 'original', prefix: str = 'images/',
+                extension: str = 'jpg'):
+    '''
+    Returns the object key of a variant of the image with the hash digest
+    '''
+    return f'{prefix}{digest}/{variant}.{extension}'
+
+
+#leading bytes of the image formats the site serves, and their content type
+SIGNATURES = ((b'\xff\xd8\xff', 'image/jpeg'),
+              (b'\x89PNG\r\n\x1a\n', 'image/png'),
+              (b'GIF87a', 'image/gif'),
+              (b'GIF89a', 'image/gif'))
+
+#file extension of the original by content type, JPEG and unknown formats keep .jpg
+EXTENSIONS = {'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp', 'image/avif': 'avif'}
+
+
+def content_type(image_data: bytes):
+    '''
+    Returns the content type of an image from its leading bytes
+    '''
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return 'image/webp'
+    if image_data[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    for signature, mime_type in SIGNATURES:
+        if image_data.startswith(signature):
+            return mime_type
+    return 'application/octet-stream'
+
+
+def variant_url(image_s3: str, variant: str):
+    '''
+    Returns the URL of a variant from the URL of the original stored in a record
+    '''
+    return f"{image_s3.rsplit('/', 1)[0]}/{variant}.jpg"
+
+
+def make_variants(image_data: bytes, variants: dict, quality: int = 80):
+    '''
+    Resizes and recompresses an image into JPEG variants. This runs in the worker
+    processes of ImageProcessor.
+
+    Parameters
+    ----------
+    image_data: bytes
+        The original image
+    variants: dict
+        The longest side in pixels of each variant, images are never enlarged
+    quality: int
+        The JPEG quality of the variants
+
+    Returns
+    -------
+    variants: dict
+        The bytes of each variant, empty if Pillow is missing or the image cannot
+        be read
+    '''
+    if Image is None:
+        return {}
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            image = image.convert('RGB')
+            encoded = {}
+            for name, size in variants.items():
+                variant = image.copy()
+                variant.thumbnail((size, size), Image.LANCZOS)
+                buffer = io.BytesIO()
+                variant.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+                encoded[name] = buffer.getvalue()
+    except OSError:
+        #not an image Pillow can read, keep the original only
+        return {}
+
+    return encoded
+
+
+class ImageProcessor:
+
+    def __init__(self, s3_client, bucket_name: str, bucket_link: str, variants: dict = None,
+                 quality: int = 80, workers: int = None, prefix: str = 'images/'):
+        '''
+        Initialises the processor and its process pool
+
+        Parameters
+        ----------
+        s3_client: boto3 S3 client
+            The client used to upload images
+        bucket_name: str
+            The bucket images are uploaded to
+        bucket_link: str
+            The public URL prefix of the bucket
+        variants: dict
+            The longest side in pixels of each variant, defaults to DEFAULT_VARIANTS.
+            An empty dict stores the original only.
+        quality: int
+            The JPEG quality of the variants
+        workers: int
+            The number of processes making variants, defaults to the number of CPUs
+        prefix: str
+            The key prefix images are stored under
+        '''
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.bucket_link = bucket_link
+        self.variants = DEFAULT_VARIANTS if variants is None else variants
+        self.quality = quality
+        self.prefix = prefix
+        self.uploaded = 0
+        self.duplicates = 0
+        #URLs of the images stored by this run, by hash
+        self._stored = {}
+        #hashes being stored by a thread, set once their URLs are in _stored
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        if Image is not None and self.variants:
+            #spawn, so the workers do not fork the scraper's threads and open connections
+            self._pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        elif self.variants:
+            print('Pillow is not installed, only original images are stored.')
+
+
+    def _exists(self, key: str):
+        '''
+        Checks whether key is already in the bucket
+        '''
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as error:
+            if error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+
+    def _upload(self, image_data: bytes, key: str):
+        self.s3_client.upload_fileobj(io.BytesIO(image_data), self.bucket_name, key,
+                                      ExtraArgs={'ContentType': content_type(image_data)})
+
+
+    def store(self, image_data: bytes):
+        '''
+        Stores an image and its variants under the hash of its bytes, unless an image
+        with the same bytes is already stored
+
+        Returns
+        -------
+        urls: dict
+            The URL of the original and of each variant, by variant name
+        '''
+        digest = hashlib.sha256(image_data).hexdigest()
+        while True:
+            with self._lock:
+                urls = self._stored.get(digest)
+                in_flight = self._in_flight.get(digest)
+                if urls is None and in_flight is None:
+                    in_flight = self._in_flight[digest] = threading.Event()
+                    break
+            if urls is not None:
+                break
+            #another thread is storing the same image, use its URLs once it is done
+            in_flight.wait()
+        duplicate = urls is not None
+        if not duplicate:
+            try:
+                extension = EXTENSIONS.get(content_type(image_data), 'jpg')
+                keys = {'original': content_key(digest, 'original', self.prefix, extension)}
+                keys.update((name, content_key(digest, name, self.prefix)) for name in self.variants)
+                duplicate = self._exists(keys['original'])
+                if duplicate:
+                    #stored by an earlier run or another process
+                    urls = {name: self.bucket_link + key for name, key in keys.items()
+                            if name == 'original' or self._exists(key)}
+                else:
+                    urls = self._process(image_data, keys)
+                with self._lock:
+                    self._stored[digest] = urls
+            finally:
+                #on failure a waiting thread stores the image itself
+                with self._lock:
+                    del self._in_flight[digest]
+                in_flight.set()
+        with self._lock:
+            if duplicate:
+                self.duplicates += 1
+            else:
+                self.uploaded += 1
+        if duplicate:
+            IMAGES_DEDUPLICATED.inc()
+
+        return urls
+
+
+    def _process(self, image_data: bytes, keys: dict):
+        '''
+        Makes the variants in the process pool and uploads them, then the original
+        '''
+        variants = {}
+        if self._pool is not None:
+            variants = self._pool.submit(make_variants, image_data, self.variants, self.quality).result()
+        urls = {}
+        for name, variant_data in variants.items():
+            self._upload(variant_data, keys[name])
+            urls[name] = self.bucket_link + keys[name]
+        #the original goes last, so once it is stored its variants are too
+        self._upload(image_data, keys['original'])
+
+        return {'original': self.bucket_link + keys['original'], **urls}
+
+
+    def stats(self):
+        '''
+        Returns the number of images uploaded and found already stored
+        '''
+        return {'uploaded': self.uploaded, 'duplicates': self.duplicates}
+
+
+    def close(self):
+        '''
+        Shuts down the process pool
+        '''
+        if self._pool is not None:
+            self._pool.shutdown()
@@ -0,0 +1,130 @@
+'''
+This file contains the image transfer used by the web scraper. Recipe images
+are streamed from the image host straight into the S3 bucket over a shared,
+pooled HTTP session, without writing a temporary file or downloading the
+same image twice.
+'''
+
+import io
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from chrome_config import user_agent
+from resilience import Resilience
+
+
+class ImageTransfer:
+
+    def __init__(self, s3_client, bucket_name: str, bucket_link: str,
+                 pool_size: int = 8, timeout: float = 20, resilience=None):
+        '''
+        Initialises the image transfer
+
+        Parameters
+        ----------
+        s3_client: boto3 S3 client
+            The client used to upload images
+        bucket_name: str
+            The bucket images are uploaded to
+        bucket_link: str
+            The public URL prefix of the bucket
+        pool_size: int
+            The number of connections kept open to the image host, this should be at
+            least the number of threads transferring images
+        timeout: float
+            Seconds to wait for the image host before giving up on an image, when no 
+            resilience policy is given
+        resilience: resilience.Resilience
+            The timeouts, retries and circuit breakers shared with the rest of the run
+        '''
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.bucket_link = bucket_link
+        self.resilience = resilience or Resilience(timeout=timeout)
+        self.timeout = self.resilience.timeout
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': user_agent})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+
+    def transfer(self, src: str, key: str, local_path: str = None):
+        '''
+        Streams an image from src into the S3 bucket
+
+        Parameters
+        ----------
+        src: str
+            The image URL
+        key: str
+            The object key in the S3 bucket
+        local_path: str
+            If given, a local copy of the image is written here from the same bytes
+
+        Returns
+        -------
+        object_url: str
+            The URL of the uploaded image
+        '''
+        #a retry downloads the image again, the stream cannot be rewound
+        return self.resilience.call(src, self._transfer, src, key, local_path)
+
+
+    def _transfer(self, src: str, key: str, local_path: str = None):
+        with self.session.get(src, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            if local_path:
+                #images are small, so read once and use the bytes for both copies
+                image_data = response.content
+                self._save(image_data, local_path)
+                body = io.BytesIO(image_data)
+            else:
+                response.raw.decode_content = True
+                body = response.raw
+            self.s3_client.upload_fileobj(body, self.bucket_name, key)
+
+        return self.bucket_link + key
+
+
+    def fetch(self, src: str, local_path: str = None):
+        '''
+        Downloads an image from src, for processing before it is uploaded
+
+        Parameters
+        ----------
+        src: str
+            The image URL
+        local_path: str
+            If given, a local copy of the image is written here
+
+        Returns
+        -------
+        image_data: bytes
+            The image
+        '''
+        image_data = self.resilience.call(src, self._fetch, src)
+        if local_path:
+            self._save(image_data, local_path)
+
+        return image_data
+
+
+    def _fetch(self, src: str):
+        response = self.session.get(src, timeout=self.timeout)
+        response.raise_for_status()
+
+        return response.content
+
+
+    def _save(self, image_data: bytes, local_path: str):
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        with open(local_path, 'wb') as handler:
+            handler.write(image_data)
+
+
+    def close(self):
+        '''
+        Closes all pooled connections
+        '''
+        self.session.close()
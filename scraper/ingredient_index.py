@@ -0,0 +1,262 @@
+'''
+This file contains the normalized ingredient tables used to find recipes by
+their ingredients. Scraped records are bulk loaded into three tables:
+
+    recipes             one row per recipe_url
+    ingredients         one row per normalized ingredient name
+    recipe_ingredients  the many-to-many join, keyed (ingredient_id, recipe_id)
+
+The join table's primary key is an inverted index from each ingredient to the
+recipes using it, so "recipes containing X and Y" reads only the index
+entries of X and Y instead of scanning the ingredient text of every recipe.
+Ids are hashes of the recipe_url and the ingredient name, so records can be
+loaded from several machines without looking ids up first.
+
+    python scraper/ingredient_index.py load raw_recipe_data shards
+    python scraper/ingredient_index.py find "plain flour" eggs
+'''
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from sqlalchemy import bindparam, text
+from rds_writer import insert_rows
+from recipe_parser import ingredient_name
+from storage_credentials import get_engine
+
+
+def _id(value: str):
+    '''
+    Returns a signed 64 bit id for value, which fits a BIGINT column
+    '''
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def _first(value):
+    #records store data points which were not found as empty lists
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    if isinstance(value, dict):
+        #image URLs by variant, see image_processing
+        return value.get('original')
+    return value
+
+
+def read_records(*paths):
+    '''
+    Yields the recipe records saved under paths: data.json files written per recipe
+    and NDJSON shards (.ndjson or .ndjson.gz) written by ShardWriter
+    '''
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        for file in files:
+            if os.path.basename(file) == 'data.json':
+                with open(file) as handler:
+                    yield json.load(handler)
+            elif file.endswith(('.ndjson', '.ndjson.gz')):
+                opener = gzip.open if file.endswith('.gz') else open
+                with opener(file, 'rt') as handler:
+                    for line in handler:
+                        if line.strip():
+                            yield json.loads(line)
+
+
+class IngredientIndex:
+
+    def __init__(self, engine, prefix: str = ''):
+        '''
+        Initialises the index and creates its tables if they do not exist
+
+        Parameters
+        ----------
+        engine: sqlalchemy Engine
+            The database, RDS PostgreSQL or SQLite
+        prefix: str
+            Prepended to the table names
+        '''
+        self.engine = engine
+        self.recipes = f'{prefix}recipes'
+        self.ingredients = f'{prefix}ingredients'
+        self.recipe_ingredients = f'{prefix}recipe_ingredients'
+        self.create_tables()
+
+
+    def create_tables(self):
+        '''
+        Creates the three tables and their indexes
+        '''
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {self.recipes} ('
+                f'recipe_id BIGINT PRIMARY KEY, '
+                f'recipe_url TEXT NOT NULL UNIQUE, '
+                f'name TEXT, '
+                f'sku TEXT, '
+                f'time TEXT, '
+                f'image_s3 TEXT)'))
+            connection.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {self.ingredients} ('
+                f'ingredient_id BIGINT PRIMARY KEY, '
+                f'name TEXT NOT NULL UNIQUE)'))
+            #the primary key is the inverted index, ingredient first
+            connection.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {self.recipe_ingredients} ('
+                f'ingredient_id BIGINT NOT NULL, '
+                f'recipe_id BIGINT NOT NULL, '
+                f'line TEXT, '
+                f'PRIMARY KEY (ingredient_id, recipe_id))'))
+            connection.execute(text(
+                f'CREATE INDEX IF NOT EXISTS {self.recipe_ingredients}_recipe_idx '
+                f'ON {self.recipe_ingredients} (recipe_id)'))
+
+
+    def load(self, records, batch_size: int = 1000):
+        '''
+        Bulk loads scraped records. Rows which are already loaded are skipped, so
+        loading the same records again adds nothing.
+
+        Parameters
+        ----------
+        records: iterable
+            Recipe dictionaries as saved by the scraper
+        batch_size: int
+            Records inserted per transaction
+
+        Returns
+        -------
+        records: int
+            The number of records read
+        '''
+        count = 0
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                count += self._load_batch(batch)
+                batch = []
+        if batch:
+            count += self._load_batch(batch)
+
+        return count
+
+
+    def _load_batch(self, records):
+        recipes, ingredients, links = {}, {}, {}
+        for record in records:
+            recipe_url = _first(record.get('recipe_url'))
+            if not recipe_url:
+                continue
+            recipe_id = _id(recipe_url)
+            recipes[recipe_id] = {'recipe_id': recipe_id, 'recipe_url': recipe_url,
+                                  'name': _first(record.get('name')), 'sku': _first(record.get('sku')),
+                                  'time': _first(record.get('time')),
+                                  'image_s3': _first(record.get('image_s3'))}
+            for line in record.get('ingredients') or []:
+                name = ingredient_name(line)
+                if name is None:
+                    continue
+                ingredient_id = _id(name)
+                ingredients[ingredient_id] = {'ingredient_id': ingredient_id, 'name': name}
+                links.setdefault((ingredient_id, recipe_id),
+                                 {'ingredient_id': ingredient_id, 'recipe_id': recipe_id, 'line': line})
+        #one multi-row statement per table, instead of a round trip per row
+        with self.engine.begin() as connection:
+            if recipes:
+                insert_rows(connection, self.recipes,
+                            ('recipe_id', 'recipe_url', 'name', 'sku', 'time', 'image_s3'),
+                            list(recipes.values()), 'ON CONFLICT DO NOTHING')
+            if ingredients:
+                insert_rows(connection, self.ingredients, ('ingredient_id', 'name'),
+                            list(ingredients.values()), 'ON CONFLICT DO NOTHING')
+            if links:
+                insert_rows(connection, self.recipe_ingredients, ('ingredient_id', 'recipe_id', 'line'),
+                            list(links.values()), 'ON CONFLICT DO NOTHING')
+
+        return len(records)
+
+
+    def find_recipes(self, ingredients, match_all: bool = True, limit: int = 50):
+        '''
+        Finds recipes by their ingredients
+
+        Parameters
+        ----------
+        ingredients: list
+            Ingredient names, normalized with ingredient_name
+        match_all: bool
+            Only return recipes containing every ingredient, otherwise return recipes
+            containing any of them, those with the most matches first
+        limit: int
+            The most recipes returned
+
+        Returns
+        -------
+        recipes: list
+            Dictionaries with the recipe_url, name and number of matched ingredients
+        '''
+        ids = sorted({_id(name) for name in filter(None, map(ingredient_name, ingredients))})
+        if not ids:
+            return []
+        having = 'HAVING COUNT(*) = :matches ' if match_all else ''
+        query = text(
+            f'SELECT r.recipe_url, r.name, matched.matches FROM ('
+            f'SELECT recipe_id, COUNT(*) AS matches FROM {self.recipe_ingredients} '
+            f'WHERE ingredient_id IN :ids GROUP BY recipe_id {having}) AS matched '
+            f'JOIN {self.recipes} AS r ON r.recipe_id = matched.recipe_id '
+            f'ORDER BY matched.matches DESC, r.name LIMIT :limit'
+        ).bindparams(bindparam('ids', expanding=True))
+        with self.engine.connect() as connection:
+            rows = connection.execute(query, {'ids': ids, 'matches': len(ids), 'limit': limit})
+            return [{'recipe_url': recipe_url, 'name': name, 'matches': matches}
+                    for recipe_url, name, matches in rows]
+
+
+    def search_ingredients(self, term: str, limit: int = 20):
+        '''
+        Returns the ingredient names containing term, e.g. 'flour' finds 'plain flour'
+        '''
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(
+                f'SELECT name FROM {self.ingredients} WHERE name LIKE :term ORDER BY name LIMIT :limit'),
+                {'term': f'%{term.lower()}%', 'limit': limit})
+            return [row[0] for row in rows]
+
+
+    def counts(self):
+        '''
+        Returns the number of rows in each table
+        '''
+        with self.engine.connect() as connection:
+            return {table: connection.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+                    for table in (self.recipes, self.ingredients, self.recipe_ingredients)}
+
+
+def main():
+    '''
+    Loads scraped records into the index in RDS, or queries it
+    '''
+    parser = argparse.ArgumentParser(description='Recipe ingredient index')
+    commands = parser.add_subparsers(dest='command', required=True)
+    load = commands.add_parser('load', help='bulk load records from data.json files and NDJSON shards')
+    load.add_argument('paths', nargs='+')
+    find = commands.add_parser('find', help='find recipes containing ingredients')
+    find.add_argument('ingredients', nargs='+')
+    find.add_argument('--any', action='store_true', help='match any of the ingredients instead of all')
+    find.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    index = IngredientIndex(get_engine())
+    if args.command == 'load':
+        print(f'{index.load(read_records(*args.paths))} records loaded: {index.counts()}')
+    else:
+        for recipe in index.find_recipes(args.ingredients, match_all=not args.any, limit=args.limit):
+            print(f"{recipe['matches']}  {recipe['name']}  {recipe['recipe_url']}")
+
+
+if __name__ == '__main__':
+
+    main()
@@ -1,25 +1,230 @@
 #%%
 
-import time
+import argparse
 from chrome_config import *
 from recipe_scraper import *
+from rds_writer import RecipeWriter
+from seen_index import SeenIndex
+from shard_writer import ShardWriter
+from checkpoint import CrawlCheckpoint
+from rate_limiter import RateLimiter
+from work_queue import WorkQueue
+from frontier import Frontier
+from resilience import Resilience
+from response_cache import ResponseCache
+from html_archive import HTMLArchive
+from image_processing import ImageProcessor, parse_variants
+from metrics import start_metrics_server
+
+
+def parse_args():
+    '''
+    Reads the command line options for the scraper
+    '''
+    parser = argparse.ArgumentParser(description='BBC recipe web scraper')
+    parser.add_argument('--fetch-mode', choices=('browser', 'http'), default='browser',
+                        help="'http' fetches recipe pages without Chrome where possible")
+    parser.add_argument('--extraction-mode', choices=('xpath', 'script', 'jsonld'), default='xpath',
+                        help="'jsonld' reads each recipe's schema.org block (its time is the cook time, "
+                             "not the page's range), 'script' reads each recipe in Chrome with one "
+                             "execute_script call")
+    parser.add_argument('--link-mode', choices=('click', 'direct'), default='click',
+                        help="'direct' builds every category page URL and fetches them concurrently")
+    parser.add_argument('--rds-batch-size', type=int, default=0,
+                        help='write recipes to RDS in batches of this size (0 writes one at a time)')
+    parser.add_argument('--manifest', default='scraped_urls.txt',
+                        help='local file listing recipe urls which have already been scraped')
+    parser.add_argument('--refresh', action='store_true',
+                        help='scrape every recipe again, including those already scraped')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='scrape recipes with this many Chrome drivers (0 uses a single driver)')
+    parser.add_argument('--recycle-after', type=int, default=50,
+                        help='restart each worker driver after this many pages')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='run fetching, image transfer, uploads and the RDS write as concurrent stages')
+    parser.add_argument('--fetch-workers', type=int, default=1,
+                        help='threads loading pages in the pipeline')
+    parser.add_argument('--keep-images', action='store_true',
+                        help='also save each recipe image locally')
+    parser.add_argument('--shard-size', type=int, default=0,
+                        help='write records to NDJSON shards of this many records (0 writes one data.json per recipe)')
+    parser.add_argument('--checkpoint', default='crawl_checkpoint.db',
+                        help='SQLite file the crawl frontier is saved to')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume the crawl saved in the checkpoint instead of starting over')
+    parser.add_argument('--no-browser', action='store_true',
+                        help='run without Chrome, needs --fetch-mode http and --link-mode direct')
+    parser.add_argument('--min-interval', type=float, default=1.0,
+                        help='fewest seconds between two requests to one host (0 only keeps to '
+                             'robots.txt and the site\'s responses)')
+    parser.add_argument('--rate-store', default='',
+                        help='SQLite file the per-host rate limits are shared through, for several '
+                             "processes or containers crawling at once ('' keeps them in this process)")
+    parser.add_argument('--burst', type=int, default=1,
+                        help='requests a host can receive back to back after being idle')
+    parser.add_argument('--latency-target', type=float, default=2.0,
+                        help='slow a host down when its pages take longer than this many seconds')
+    parser.add_argument('--browser-latency-target', type=float, default=30.0,
+                        help='the --latency-target of pages loaded in Chrome, timed with their '
+                             'rendering and subresources')
+    parser.add_argument('--ignore-robots', action='store_true',
+                        help='do not keep to the Crawl-delay in robots.txt')
+    parser.add_argument('--page-timeout', type=float, default=10,
+                        help='most seconds to wait for a page to be ready')
+    parser.add_argument('--profile', choices=('lean', 'full'), default='lean',
+                        help="'lean' stops Chrome loading images, media, fonts and non-BBC hosts")
+    parser.add_argument('--max-links', type=int, default=1000,
+                        help='stop link discovery after this many unique recipe urls (0 for no limit)')
+    parser.add_argument('--max-per-category', type=int, default=0,
+                        help='take at most this many recipe urls from each A-Z category (0 for no limit)')
+    parser.add_argument('--bloom-capacity', type=int, default=0,
+                        help='remember discovered urls in a Bloom filter sized for this many urls '
+                             'instead of an exact set, for very large crawls')
+    parser.add_argument('--stream', action='store_true',
+                        help='with --pipeline, scrape links while they are still being discovered')
+    parser.add_argument('--role', choices=('standalone', 'coordinator', 'worker'), default='standalone',
+                        help="'coordinator' discovers links and publishes them to the shared work queue, "
+                             "'worker' scrapes links claimed from it")
+    parser.add_argument('--batch-size', type=int, default=10,
+                        help='links a worker claims from the work queue at a time')
+    parser.add_argument('--lease-seconds', type=float, default=600,
+                        help='seconds before links claimed by a worker which stopped are reclaimed')
+    parser.add_argument('--timeout', type=float, default=20,
+                        help='most seconds any page load, request or image transfer may take')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='times a call is retried after a timeout, dropped connection, 429 or 5xx')
+    parser.add_argument('--retry-ratio', type=float, default=0.2,
+                        help='share of all calls in a run which may be retries')
+    parser.add_argument('--breaker-threshold', type=int, default=5,
+                        help='consecutive failures after which calls to a host are paused')
+    parser.add_argument('--breaker-reset', type=float, default=60,
+                        help='seconds a paused host is left alone before it is tried again')
+    parser.add_argument('--cache-dir', default='http_cache',
+                        help="keep pages fetched over HTTP in this directory between runs ('' disables the cache)")
+    parser.add_argument('--cache-size-mb', type=int, default=500,
+                        help='most megabytes of compressed pages kept in the cache')
+    parser.add_argument('--cache-ttl-category', type=float, default=24,
+                        help='hours a cached A-Z category page is used before it is revalidated')
+    parser.add_argument('--cache-ttl-recipe', type=float, default=168,
+                        help='hours a cached recipe page is used before it is revalidated')
+    parser.add_argument('--archive-html', action='store_true',
+                        help='save the raw HTML of every recipe page for scraper/reparse.py')
+    parser.add_argument('--archive-dir', default='html_archive',
+                        help='directory the raw HTML is saved to with --archive-html')
+    parser.add_argument('--process-images', action='store_true',
+                        help='store recipe images under the hash of their bytes with resized variants')
+    parser.add_argument('--image-variants', default='thumb=320,medium=960',
+                        help='resized variants made with --process-images, as name=longest side pairs')
+    parser.add_argument('--image-quality', type=int, default=80,
+                        help='JPEG quality of the resized variants')
+    parser.add_argument('--image-workers', type=int, default=0,
+                        help='processes making resized variants (0 uses one per CPU)')
+    parser.add_argument('--metrics-port', type=int, default=8000,
+                        help='serve Prometheus metrics on this port (0 disables the endpoint)')
+
+    args = parser.parse_args()
+    if args.no_browser and args.fetch_mode != 'http':
+        parser.error('--no-browser needs --fetch-mode http')
+    if args.no_browser and args.link_mode != 'direct':
+        parser.error('--no-browser needs --link-mode direct')
+
+    return args
 
 
 def main():
     '''
     Function that controls recipe_scraper script
     '''
-    
-    scraper = BBCRecipeScraper(chrome_options)
-    time.sleep(3)
+    args = parse_args()
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    seen_index = SeenIndex.load(get_engine(), args.manifest)
+    rds_writer = RecipeWriter(get_engine(), batch_size=args.rds_batch_size) if args.rds_batch_size else None
+    work_queue = None
+    if args.role != 'standalone':
+        work_queue = WorkQueue(get_engine(), lease_seconds=args.lease_seconds)
+    #workers are resumed by the work queue instead of a local checkpoint
+    checkpoint = CrawlCheckpoint(args.checkpoint) if args.role != 'worker' else None
+    if checkpoint is not None and not args.resume:
+        checkpoint.reset()
+    resilience = Resilience(timeout=args.timeout, retries=args.retries, 
+                            retry_ratio=args.retry_ratio, 
+                            failure_threshold=args.breaker_threshold, 
+                            reset_timeout=args.breaker_reset)
+    shard_writer = None
+    if args.shard_size:
+        shard_writer = ShardWriter(max_records=args.shard_size, s3_client=get_s3_client(), 
+                                   bucket_name=get_bucket_name(), resilience=resilience)
+    image_processor = None
+    if args.process_images:
+        image_processor = ImageProcessor(get_s3_client(), get_bucket_name(), get_bucket_link(), 
+                                         variants=parse_variants(args.image_variants), 
+                                         quality=args.image_quality, 
+                                         workers=args.image_workers or None)
+    cache = None
+    if args.cache_dir:
+        cache = ResponseCache(args.cache_dir, max_bytes=args.cache_size_mb * 2 ** 20, 
+                              ttls={'category': args.cache_ttl_category * 3600, 
+                                    'recipe': args.cache_ttl_recipe * 3600})
+    archive = HTMLArchive(args.archive_dir) if args.archive_html else None
+    scraper = BBCRecipeScraper(chrome_options, fetch_mode=args.fetch_mode, 
+                               extraction_mode=args.extraction_mode, 
+                               rds_writer=rds_writer, 
+                               seen_index=seen_index, 
+                               keep_images=args.keep_images, 
+                               shard_writer=shard_writer, 
+                               checkpoint=checkpoint, 
+                               browser=not args.no_browser, 
+                               rate_policy=RateLimiter(args.min_interval, burst=args.burst, 
+                                                       store=args.rate_store or None, 
+                                                       robots=not args.ignore_robots, 
+                                                       latency_target=args.latency_target, 
+                                                       browser_latency_target=args.browser_latency_target), 
+                               page_timeout=args.page_timeout, 
+                               lean=args.profile == 'lean', 
+                               frontier=Frontier(max_links=args.max_links or None, 
+                                                 max_per_category=args.max_per_category or None, 
+                                                 bloom_capacity=args.bloom_capacity or None), 
+                               image_processor=image_processor, 
+                               resilience=resilience, 
+                               cache=cache, 
+                               archive=archive)
     scraper.accept_cookies()
-    scraper.get_categories()
-    scraper.next_page()
-    scraper.scraper_scrape()
+    if args.role == 'worker':
+        scraper.scraper_scrape_queue(work_queue, batch_size=args.batch_size, refresh=args.refresh)
+        return
+    discover = None
+    if args.resume and checkpoint.discovery_complete():
+        scraper.resume_links()
+    else:
+        if args.no_browser:
+            scraper.get_categories_direct()
+        else:
+            scraper.get_categories()
+        discover = scraper.next_page_direct if args.link_mode == 'direct' else scraper.next_page
+    if args.stream and args.pipeline and args.role == 'standalone' and discover is not None:
+        #discovery runs inside the pipeline
+        scraper.scraper_scrape_pipeline(fetch_workers=args.fetch_workers, refresh=args.refresh, 
+                                        discover=discover)
+        checkpoint.close()
+        return
+    if discover is not None:
+        discover()
+    if args.role == 'coordinator':
+        work_queue.publish(scraper.total_links_list)
+        print(f'Work queue: {work_queue.counts()}')
+    elif args.pipeline:
+        scraper.scraper_scrape_pipeline(fetch_workers=args.fetch_workers, refresh=args.refresh)
+    elif args.workers:
+        scraper.scraper_scrape_pool(workers=args.workers, recycle_after=args.recycle_after, 
+                                    refresh=args.refresh)
+    else:
+        scraper.scraper_scrape(refresh=args.refresh)
+    checkpoint.close()
 
 
 if __name__ == '__main__':
-    
+
     main()
 
-#%%
\ No newline at end of file
+#%%
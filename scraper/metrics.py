@@ -0,0 +1,63 @@
+'''
+This file contains the Prometheus metrics reported by the web scraper.
+Stage latencies are histograms and page outcomes are counters, so the stage
+limiting throughput can be read from the existing Prometheus and Grafana
+dashboards. start_metrics_server serves them on /metrics.
+'''
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+
+#from a cached page (milliseconds) to a slow Chrome page load (a minute)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+PAGE_LOAD_SECONDS = Histogram(
+    'scraper_page_load_seconds', 'Time to load a page until it is ready to be read',
+    ['mode'], buckets=LATENCY_BUCKETS)
+EXTRACTION_SECONDS = Histogram(
+    'scraper_extraction_seconds', 'Time to extract a recipe from a loaded page',
+    ['mode'], buckets=LATENCY_BUCKETS)
+IMAGE_TRANSFER_SECONDS = Histogram(
+    'scraper_image_transfer_seconds', 'Time to copy a recipe image to s3',
+    buckets=LATENCY_BUCKETS)
+S3_UPLOAD_SECONDS = Histogram(
+    'scraper_s3_upload_seconds', 'Time to upload a data file to s3',
+    ['kind'], buckets=LATENCY_BUCKETS)
+RDS_WRITE_SECONDS = Histogram(
+    'scraper_rds_write_seconds', 'Time to write to RDS, per recipe or per batch',
+    ['mode'], buckets=LATENCY_BUCKETS)
+
+PAGE_BYTES = Histogram(
+    'scraper_page_bytes', 'Bytes transferred to load a page in Chrome',
+    ['profile'], buckets=(1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2e7))
+
+PAGES_SCRAPED = Counter('scraper_pages_scraped', 'Recipe pages scraped and stored')
+PAGES_SKIPPED = Counter('scraper_pages_skipped', 'Recipe pages skipped as already scraped')
+PAGES_FAILED = Counter('scraper_pages_failed', 'Recipe pages which could not be scraped')
+PAGES_RETRIED = Counter('scraper_pages_retried', 'Recipe pages queued again after a driver crash')
+CALLS_RETRIED = Counter('scraper_calls_retried', 'Network calls retried after a transient error', ['host'])
+FAILURES = Counter('scraper_failures', 'Failed pages and calls by stage and cause', ['stage', 'cause'])
+CACHE_REQUESTS = Counter('scraper_cache_requests', 'Pages read from the response cache (hit), '
+                         'confirmed unchanged with a 304 (revalidated) or downloaded (miss)', ['result'])
+IMAGES_DEDUPLICATED = Counter('scraper_images_deduplicated', 'Recipe images already stored under their content hash')
+RATE_LIMIT_BACKOFFS = Counter('scraper_rate_limit_backoffs', 'Times a host was slowed down after a 429/503 '
+                              '(throttled) or a slow response (slow)', ['host', 'reason'])
+
+QUEUE_DEPTH = Gauge('scraper_queue_depth', 'Recipe links or records waiting in a queue', ['queue'])
+RATE_LIMIT_INTERVAL = Gauge('scraper_rate_limit_interval_seconds', 'Current seconds between requests to a host',
+                            ['host'])
+
+
+def track_queue(name: str, work_queue):
+    '''
+    Reports the size of work_queue as the queue_depth of name whenever metrics are read
+    '''
+    QUEUE_DEPTH.labels(queue=name).set_function(work_queue.qsize)
+
+
+def start_metrics_server(port: int = 8000, addr: str = '0.0.0.0'):
+    '''
+    Serves the metrics on http://addr:port/metrics from a background thread
+    '''
+    start_http_server(port, addr=addr)
+    print(f'Serving metrics on port {port}.')
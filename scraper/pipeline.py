@@ -0,0 +1,153 @@
+'''
+This file contains a staged producer/consumer pipeline used by the web
+scraper. Each stage has its own worker threads and a bounded input queue, so
+uploads run while the next pages load and a slow stage blocks the stages
+feeding it (backpressure) instead of building up records in memory.
+'''
+
+import queue
+import threading
+import time
+from metrics import PAGES_FAILED, track_queue
+
+
+#marks the end of the input for one worker thread
+_STOP = object()
+
+
+class Stage:
+
+    def __init__(self, name: str, function, workers: int = 1, maxsize: int = 16, on_exit=None,
+                 on_error=None):
+        '''
+        Initialises a pipeline stage
+
+        Parameters
+        ----------
+        name: str
+            The stage name used in the stage counters
+        function: callable
+            Called with each item, its return value is passed to the next stage
+        workers: int
+            The number of threads running the function
+        maxsize: int
+            The number of items which can wait in the stage's input queue
+        on_exit: callable
+            Called in each worker thread when it finishes, e.g. to quit a driver
+        on_error: callable
+            Called with the item and the error when the function fails on an item
+        '''
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.on_exit = on_exit
+        self.on_error = on_error
+        self.inbox = queue.Queue(maxsize=maxsize)
+        self.outbox = None
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+
+    def start(self, outbox: queue.Queue = None):
+        '''
+        Starts the worker threads, passing results to outbox
+        '''
+        self.outbox = outbox
+        track_queue(self.name, self.inbox)
+        self._threads = [threading.Thread(target=self._run, name=f'{self.name}-{number}', daemon=True)
+                         for number in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+
+    def _run(self):
+        '''
+        Processes items from the input queue until a stop marker is received
+        '''
+        try:
+            while True:
+                item = self.inbox.get()
+                if item is _STOP:
+                    break
+                start = time.perf_counter()
+                try:
+                    result = self.function(item)
+                except Exception as error:
+                    #drop the item so one bad recipe does not stop the run
+                    print(f'{self.name} stage failed: {error!r}')
+                    with self._lock:
+                        self.failed += 1
+                    PAGES_FAILED.inc()
+                    if self.on_error is not None:
+                        self.on_error(item, error)
+                    continue
+                with self._lock:
+                    self.processed += 1
+                    self.busy_seconds += time.perf_counter() - start
+                if self.outbox is not None and result is not None:
+                    #blocks while the next stage is full
+                    self.outbox.put(result)
+        finally:
+            if self.on_exit is not None:
+                self.on_exit()
+
+
+    def close(self):
+        '''
+        Stops the stage once its queue has drained and waits for its threads
+        '''
+        for _ in self._threads:
+            self.inbox.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+
+    def stats(self):
+        '''
+        Returns the stage counters
+        '''
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'processed': self.processed,
+            'failed': self.failed,
+            'busy_seconds': round(self.busy_seconds, 2),
+            'queue_depth': self.inbox.qsize()
+        }
+
+
+class Pipeline:
+
+    def __init__(self, stages: list):
+        '''
+        Initialises a pipeline where each stage feeds the next
+        '''
+        self.stages = stages
+
+
+    def run(self, items):
+        '''
+        Feeds items into the first stage and waits for every stage to finish
+
+        Returns
+        -------
+        stage_stats: list
+            The counters for each stage
+        '''
+        for stage, next_stage in zip(self.stages, self.stages[1:] + [None]):
+            stage.start(next_stage.inbox if next_stage is not None else None)
+        for item in items:
+            #blocks while the first stage is full
+            self.stages[0].inbox.put(item)
+        #close stages in order, so each one drains before the next is stopped
+        for stage in self.stages:
+            stage.close()
+
+        stage_stats = [stage.stats() for stage in self.stages]
+        for stats in stage_stats:
+            print(stats)
+
+        return stage_stats
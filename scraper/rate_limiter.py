@@ -0,0 +1,312 @@
+'''
+This file contains the adaptive per-host rate limiter used by the web
+scraper. It is a drop-in RatePolicy: every page request waits for a token
+from its host's token bucket, so the crawl runs as fast as each host allows.
+
+    - The fewest seconds between two requests to a host start at the operator's
+      min_interval, or the host's robots.txt Crawl-delay if that is longer.
+    - A 429 or 503 response doubles the host's interval and pauses the host for
+      its Retry-After. Slow responses stretch the interval by a quarter, and
+      every other response shrinks it back towards the floor.
+    - Buckets are kept in a small SQLite store. Scrapers in several processes or
+      containers sharing the store file share one budget per host.
+'''
+
+import email.utils
+import random
+import sqlite3
+import threading
+import time
+import requests
+from urllib.parse import urlsplit
+from chrome_config import user_agent
+from metrics import RATE_LIMIT_BACKOFFS, RATE_LIMIT_INTERVAL
+from waits import RatePolicy
+
+
+#responses which ask the client to slow down
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_crawl_delay(robots_txt: str, agent: str = user_agent):
+    '''
+    Returns the Crawl-delay robots.txt sets for agent in seconds, or None
+
+    The group naming agent's product token is used, else the * group. Unlike
+    urllib.robotparser, fractional delays such as 0.5 are read.
+    '''
+    token = agent.split('/')[0].lower()
+    delays = {}
+    agents, in_rules = [], False
+    for line in robots_txt.splitlines():
+        field, _, value = line.split('#')[0].partition(':')
+        field, value = field.strip().lower(), value.strip()
+        if field == 'user-agent':
+            if in_rules:
+                #a User-agent after rules starts a new group
+                agents, in_rules = [], False
+            agents.append(value.lower())
+        elif field:
+            in_rules = True
+            if field == 'crawl-delay':
+                try:
+                    for name in agents:
+                        delays.setdefault(name, float(value))
+                except ValueError:
+                    pass
+    for name, delay in delays.items():
+        if name != '*' and name in token:
+            return delay
+    return delays.get('*')
+
+
+def parse_retry_after(value: str):
+    '''
+    Returns the seconds a Retry-After header, in seconds or as an HTTP date, asks
+    the client to wait, or None
+    '''
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter(RatePolicy):
+
+    def __init__(self, min_interval: float = 1.0, jitter: float = 0.0, burst: int = 1,
+                 store: str = None, robots: bool = True, latency_target: float = 2.0,
+                 max_interval: float = 60.0, browser_latency_target: float = 30.0):
+        '''
+        Initialises the per-host token buckets
+
+        Parameters
+        ----------
+        min_interval: float
+            The fewest seconds between two requests to one host, the operator's floor.
+            0 requests pages as fast as the host responds well.
+        jitter: float
+            Up to this many random seconds added to each wait
+        burst: int
+            Requests a host can receive back to back after being idle
+        store: str
+            SQLite file the buckets are kept in, shared by every process using it. By
+            default the buckets are only shared by the threads of this process.
+        robots: bool
+            Read each host's robots.txt once and keep to its Crawl-delay
+        latency_target: float
+            Responses slower than this many seconds stretch the host's interval
+        max_interval: float
+            The longest interval a host is slowed down to
+        browser_latency_target: float
+            The latency_target of pages loaded in Chrome, which include rendering and 
+            every subresource, so only loads close to the page timeout stretch the interval
+        '''
+        super().__init__(min_interval, jitter)
+        self.burst = burst
+        self.robots = robots
+        self.latency_target = latency_target
+        self.max_interval = max_interval
+        self.browser_latency_target = browser_latency_target
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': user_agent})
+        self._robots_lock = threading.Lock()
+        #autocommit, so each update takes the store's write lock with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(store or ':memory:', timeout=30, isolation_level=None,
+                                          check_same_thread=False)
+        with self._lock:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS hosts (
+                    host TEXT PRIMARY KEY,
+                    floor REAL NOT NULL,
+                    interval REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    paused_until REAL NOT NULL DEFAULT 0
+                )''')
+
+
+    def _update(self, host: str, change):
+        '''
+        Runs change(row) on the host's row inside a write transaction, so processes
+        sharing the store never interleave, and saves the row it returns
+
+        Returns
+        -------
+        row: dict
+            The host's floor, interval, tokens, updated and paused_until after the change
+        '''
+        with self._lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                values = self.connection.execute(
+                    'SELECT floor, interval, tokens, updated, paused_until FROM hosts WHERE host = ?',
+                    (host,)).fetchone()
+                row = dict(zip(('floor', 'interval', 'tokens', 'updated', 'paused_until'), values))
+                row = change(row)
+                self.connection.execute(
+                    'UPDATE hosts SET interval = ?, tokens = ?, updated = ?, paused_until = ? '
+                    'WHERE host = ?',
+                    (row['interval'], row['tokens'], row['updated'], row['paused_until'], host))
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+        RATE_LIMIT_INTERVAL.labels(host=host).set(row['interval'])
+
+        return row
+
+
+    def _register(self, url: str):
+        '''
+        Adds the host of url to the store, with the floor set by min_interval and its
+        robots.txt, unless this or another process already did
+
+        Returns
+        -------
+        host: str
+            The host of url
+        '''
+        parts = urlsplit(url or '')
+        host = parts.netloc
+        with self._lock:
+            known = self.connection.execute('SELECT 1 FROM hosts WHERE host = ?', (host,)).fetchone()
+        if known:
+            return host
+        with self._robots_lock, self._lock:
+            known = self.connection.execute('SELECT 1 FROM hosts WHERE host = ?', (host,)).fetchone()
+        if known:
+            return host
+        with self._robots_lock:
+            floor = self.min_interval
+            if self.robots and host:
+                floor = max(floor, self.crawl_delay(f'{parts.scheme}://{host}') or 0)
+            with self._lock:
+                self.connection.execute(
+                    'INSERT OR IGNORE INTO hosts (host, floor, interval, tokens, updated) '
+                    'VALUES (?, ?, ?, ?, ?)', (host, floor, floor, self.burst, time.time()))
+
+        return host
+
+
+    def crawl_delay(self, origin: str):
+        '''
+        Fetches origin's robots.txt and returns its Crawl-delay for this scraper, or
+        None if it has none or cannot be read
+        '''
+        try:
+            response = self.session.get(f'{origin}/robots.txt', timeout=10)
+        except requests.RequestException:
+            return None
+        if response.status_code != 200:
+            return None
+        return parse_crawl_delay(response.text)
+
+
+    def wait(self, url: str = None):
+        '''
+        Blocks until a request to the host of url is allowed
+
+        Returns
+        -------
+        delay: float
+            The seconds spent waiting
+        '''
+        host = self._register(url)
+        reserved = {}
+
+        def take_token(row):
+            now = time.time()
+            start = max(now, row['paused_until'])
+            if row['interval'] <= 0:
+                reserved['start'] = start
+                return row
+            #refill since the last request, then reserve one token, which may be owed
+            tokens = min(self.burst, row['tokens'] + max(now - row['updated'], 0) / row['interval'])
+            tokens -= 1
+            reserved['start'] = start + max(-tokens, 0) * row['interval']
+            return {**row, 'tokens': tokens, 'updated': now}
+
+        self._update(host, take_token)
+        delay = max(reserved['start'] - time.time(), 0) + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        return delay
+
+
+    def observe(self, url: str, status: int = None, latency: float = None, retry_after: str = None,
+                browser: bool = False):
+        '''
+        Adapts the host's interval to a response
+
+        Parameters
+        ----------
+        url: str
+            The page which was requested
+        status: int
+            The HTTP status, None for pages loaded in Chrome
+        latency: float
+            Seconds the response took
+        retry_after: str
+            The response's Retry-After header
+        browser: bool
+            The page was loaded in Chrome, its latency is compared with
+            browser_latency_target
+        '''
+        host = self._register(url)
+        target = self.browser_latency_target if browser else self.latency_target
+
+        def adapt(row):
+            interval = row['interval']
+            if status in THROTTLE_STATUSES:
+                RATE_LIMIT_BACKOFFS.labels(host=host, reason='throttled').inc()
+                interval = max(interval * 2, 1.0)
+                pause = parse_retry_after(retry_after)
+                if pause:
+                    row['paused_until'] = max(row['paused_until'], time.time() + pause)
+                #no burst straight after being throttled
+                row['tokens'] = min(row['tokens'], 0)
+            elif latency is not None and latency > target:
+                RATE_LIMIT_BACKOFFS.labels(host=host, reason='slow').inc()
+                interval = max(interval * 1.25, 0.25)
+            else:
+                interval *= 0.9
+                if interval - row['floor'] < 0.05:
+                    interval = row['floor']
+            row['interval'] = min(max(interval, row['floor']), max(self.max_interval, row['floor']))
+            return row
+
+        self._update(host, adapt)
+
+
+    def interval(self, host: str):
+        '''
+        Returns the current seconds between requests to host, or None if it has not
+        been requested
+        '''
+        with self._lock:
+            row = self.connection.execute('SELECT interval FROM hosts WHERE host = ?', (host,)).fetchone()
+        return row[0] if row else None
+
+
+    def stats(self):
+        '''
+        Returns the floor and current interval of every host in the store
+        '''
+        with self._lock:
+            rows = self.connection.execute('SELECT host, floor, interval FROM hosts').fetchall()
+        return {host: {'floor': floor, 'interval': round(interval, 3)} for host, floor, interval in rows}
+
+
+    def close(self):
+        '''
+        Closes the store and the robots.txt session
+        '''
+        self.session.close()
+        self.connection.close()
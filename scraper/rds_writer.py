@@ -0,0 +1,243 @@
+'''
+This file contains a buffered writer for the recipe_data table in RDS.
+Recipes are collected in memory and inserted in batches with one
+multi-row INSERT ... VALUES (...), (...) ON CONFLICT DO NOTHING, sent in one
+round trip instead of one execute per row, so recipes which are
+already in the table are skipped by the database's unique index instead of
+an EXISTS query per recipe. A writer created with replace=True updates them
+instead, e.g. when recipes are re-parsed.
+'''
+
+import json
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from metrics import RDS_WRITE_SECONDS
+
+
+RECIPE_COLUMNS = ('uuid', 'sku', 'name', 'description', 'ingredients',
+                  'time', 'image_url', 'image_s3', 'recipe_url')
+
+#bound parameters per statement: SQLite's default limit and PostgreSQL's exact limit, the
+#16-bit parameter count of its wire protocol
+MAX_PARAMETERS = {'sqlite': 32766, 'postgresql': 65535}
+
+
+def recipe_row(dict_recipe):
+    '''
+    Converts a recipe dictionary into a row for the recipe_data table.
+
+    Data points which were not found on the page (empty lists) are stored as NULL
+    and the ingredient list, and the image URLs by variant, are stored as JSON text.
+    '''
+    row = {}
+    for column in RECIPE_COLUMNS:
+        value = dict_recipe.get(column)
+        if isinstance(value, (list, tuple)):
+            value = json.dumps(list(value)) if value else None
+        elif isinstance(value, dict):
+            value = json.dumps(value)
+        row[column] = value
+
+    return row
+
+
+def insert_rows(connection, table: str, columns: tuple, rows: list, conflict: str = ''):
+    '''
+    Inserts rows with one INSERT ... VALUES (...), (...) statement, split only to
+    keep within the database's limit on bound parameters.
+
+    Passing a list of rows to execute is an executemany, which psycopg2 runs as one
+    round trip per row.
+
+    Parameters
+    ----------
+    connection: sqlalchemy Connection
+        The connection to insert with, inside a transaction
+    table: str
+        The table rows are inserted into
+    columns: tuple
+        The columns of each row
+    rows: list
+        Dictionaries with a value for every column
+    conflict: str
+        The ON CONFLICT clause, e.g. 'ON CONFLICT DO NOTHING'
+
+    Returns
+    -------
+    rowcount: int
+        The number of rows the statements inserted or updated, without those skipped
+        by the conflict clause
+    '''
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    limit = MAX_PARAMETERS.get(connection.dialect.name, 32766)
+    batch_rows = max(limit // len(columns), 1)
+    rowcount = 0
+    for start in range(0, len(rows), batch_rows):
+        parameters = {}
+        tuples = []
+        for number, row in enumerate(rows[start:start + batch_rows]):
+            names = []
+            for position, column in enumerate(columns):
+                name = f'p{number}_{position}'
+                parameters[name] = row[column]
+                names.append(f':{name}')
+            tuples.append(f"({', '.join(names)})")
+        statement = f"INSERT INTO {table} ({column_list}) VALUES {', '.join(tuples)} {conflict}"
+        rowcount += connection.execute(text(statement), parameters).rowcount
+
+    return rowcount
+
+
+class RecipeWriter:
+
+    def __init__(self, engine, table: str = 'recipe_data', batch_size: int = 100,
+                 flush_interval: float = 30, replace: bool = False, on_flush=None):
+        '''
+        Initialises the writer and creates the table and its unique index once
+
+        Parameters
+        ----------
+        engine: sqlalchemy Engine or Connection
+            The database to write to, e.g. RDS PostgreSQL or a local SQLite stand-in
+        table: str
+            The table recipes are written to
+        batch_size: int
+            Flush once this many recipes are buffered
+        flush_interval: float
+            Flush when a recipe is added and this many seconds have passed since
+            the last flush. It is only checked in add, there is no timer: once recipes 
+            stop arriving the buffer waits for the next add, flush or close.
+        replace: bool
+            Update recipes which are already in the table, keeping their uuid, instead
+            of skipping them
+        on_flush: callable
+            Called with the recipe_urls of each batch once it is committed
+        '''
+        self.engine = engine
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.replace = replace
+        self.on_flush = on_flush
+        self.rows_written = 0
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.create_table()
+
+
+    def _begin(self):
+        '''
+        Returns a context manager yielding a connection inside a transaction
+        '''
+        if isinstance(self.engine, Connection):
+            return _ConnectionTransaction(self.engine)
+        return self.engine.begin()
+
+
+    def create_table(self):
+        '''
+        Creates the recipe table with a unique index on recipe_url if it does not exist
+        '''
+        columns = ', '.join(f'"{column}" TEXT' for column in RECIPE_COLUMNS)
+        with self._write_lock, self._begin() as connection:
+            connection.execute(text(f'CREATE TABLE IF NOT EXISTS {self.table} ({columns})'))
+            connection.execute(text(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS {self.table}_recipe_url_key '
+                f'ON {self.table} (recipe_url)'))
+
+
+    def add(self, dict_recipe):
+        '''
+        Buffers a recipe and flushes the buffer if it is full or the flush interval
+        has passed
+        '''
+        with self._buffer_lock:
+            self._buffer.append(recipe_row(dict_recipe))
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+
+    def flush(self):
+        '''
+        Inserts all buffered recipes in one statement, skipping (or with replace, 
+        updating) recipe_urls which are already in the table
+
+        Returns
+        -------
+        rows: int
+            The number of recipes inserted or updated, without duplicates and recipes 
+            skipped because they were already in the table
+        '''
+        with self._buffer_lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not rows:
+            return 0
+
+        conflict = 'DO NOTHING'
+        if self.replace:
+            updates = ', '.join(f'"{column}" = excluded."{column}"' for column in RECIPE_COLUMNS
+                                if column not in ('uuid', 'recipe_url'))
+            conflict = f'DO UPDATE SET {updates}'
+        #one statement cannot update a row twice, so each recipe_url is sent once: the
+        #last version when replacing, else the first as the database would keep
+        unique = {}
+        for row in rows:
+            if self.replace or row['recipe_url'] not in unique:
+                unique[row['recipe_url']] = row
+        try:
+            with self._write_lock, self._begin() as connection:
+                with RDS_WRITE_SECONDS.labels(mode='batch').time():
+                    written = insert_rows(connection, self.table, RECIPE_COLUMNS, list(unique.values()),
+                                          f'ON CONFLICT (recipe_url) {conflict}')
+        except Exception:
+            #keep the batch so it is retried on the next flush
+            with self._buffer_lock:
+                self._buffer[:0] = rows
+            raise
+        self.rows_written += written
+        if self.on_flush is not None:
+            self.on_flush(list(unique))
+
+        return written
+
+
+    def close(self):
+        '''
+        Writes any recipes left in the buffer, called at the end of a run
+        '''
+        self.flush()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _ConnectionTransaction:
+    '''
+    Runs a transaction on an already open Connection and yields the connection,
+    so the writer works the same with an Engine or a Connection
+    '''
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.transaction = self.connection.begin()
+        return self.connection
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.transaction.commit()
+        else:
+            self.transaction.rollback()
@@ -0,0 +1,455 @@
+'''
+This file contains a browserless parser for BBC recipe pages.
+The recipe pages are server-rendered, so the same data points extracted
+through Chrome in the recipe_scraper script can be read straight from the
+page HTML. Recipes are read from the schema.org Recipe block embedded as
+JSON-LD, and only pages without one are walked with compiled lxml XPaths.
+'''
+
+import html
+import json
+import re
+import uuid
+from urllib.parse import urljoin
+from lxml import html as lxml_html
+from lxml import etree
+
+
+#compiled once and reused for every page
+NAME_XPATH = etree.XPath('//h1[@class="gel-trafalgar content-title__text"]')
+DESCRIPTION_XPATH = etree.XPath('//p[@class="recipe-description__text"]')
+TIME_XPATH = etree.XPath(
+    '(//div[@class="gel-layout__item gel-1/4 recipe-leading-info__side-bar"]/div)[1]/div[2]/p[2]')
+IMAGE_XPATH = etree.XPath(
+    '//div[@class="recipe-media__image responsive-image-container__16/9"]/img/@src')
+INGREDIENTS_XPATH = etree.XPath('(//div[@class="recipe-ingredients-wrapper"])[1]/ul/li/a[1]')
+CATEGORY_LINKS_XPATH = etree.XPath('//*[@class="az-keyboard gel-wrap"]/div/ul/li/a[1]/@href')
+RECIPE_LINKS_XPATH = etree.XPath(
+    '(//*[@class="gel-wrap promo-collection__container az-page"]/div)[1]/div/descendant::a[1]/@href')
+PAGE_COUNT_XPATH = etree.XPath("(//span[@aria-label='Next']/preceding::a[1])[1]")
+#category pages follow /food/recipes/a-z/{letter}/{page}
+CATEGORY_PAGE_RE = re.compile(r'(/food/recipes/a-z/[^/]+/)\d+')
+#found with a regex, so pages with a JSON-LD block are never parsed into a tree
+JSON_LD_RE = re.compile(
+    r'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.DOTALL | re.IGNORECASE)
+UNITS = {'g', 'kg', 'mg', 'ml', 'l', 'cl', 'oz', 'lb', 'lbs', 'fl', 'tsp', 'tbsp', 'teaspoon',
+         'teaspoons', 'tablespoon', 'tablespoons', 'cup', 'cups', 'pint', 'pints', 'pinch',
+         'handful', 'x', 'large', 'medium', 'small', 'heaped', 'level', 'of'}
+#a leading quantity such as 200g/7oz, 1½, 2-3 or ¼
+QUANTITY_RE = re.compile(r'^[\d¼½¾⅓⅔⅛.,/\-–]+[a-z]*(?:/[\d.]+[a-z]*)*$')
+BRACKETS_RE = re.compile(r'\([^)]*\)')
+ISO_DURATION_RE = re.compile(
+    r'^P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$')
+
+
+def new_recipe_dict():
+    '''
+    Returns an empty recipe dictionary with the keys used by the scraper
+    '''
+    return {
+        'uuid': [],
+        'sku': [],
+        'name': [],
+        'description': [],
+        'ingredients': [],
+        'time': [],
+        'image_url': [],
+        'image_s3': [],
+        'recipe_url': []
+    }
+
+
+def make_sku(name: str):
+    '''
+    Generates the user friendly SKU from a recipe name
+    '''
+    return name.upper().replace(" ", "-").replace("'", "")
+
+
+def _text(element):
+    '''
+    Returns the visible text of an element with whitespace collapsed, the same
+    way selenium reports WebElement.text
+    '''
+    return ' '.join(element.text_content().split())
+
+
+def parse_html(page_html):
+    '''
+    Parses raw page HTML into an lxml document
+    '''
+    return lxml_html.fromstring(page_html)
+
+
+def parse_category_links(page_html, page_url: str):
+    '''
+    Obtains the link for each alphabet recipe category, as BBCRecipeScraper.get_categories
+
+    Parameters
+    ----------
+    page_html: str or bytes
+        The HTML of any A-Z recipe page
+    page_url: str
+        The URL of the page, used to make relative links absolute
+
+    Returns
+    -------
+    category_links: list
+        A list with all the links for category
+    '''
+    document = parse_html(page_html)
+    return [urljoin(page_url, href) for href in CATEGORY_LINKS_XPATH(document)]
+
+
+def parse_recipe_links(page_html, page_url: str):
+    '''
+    Obtains all the recipe links on a category page, as BBCRecipeScraper._get_links
+
+    Parameters
+    ----------
+    page_html: str or bytes
+        The HTML of the category page
+    page_url: str
+        The URL of the category page, used to make relative links absolute
+
+    Returns
+    -------
+    recipe_links: list
+        A list with all the recipe links in the page
+    '''
+    document = parse_html(page_html)
+    return [urljoin(page_url, href) for href in RECIPE_LINKS_XPATH(document)]
+
+
+def parse_page_count(page_html):
+    '''
+    Obtains the number of pages in a recipe category from its first page.
+    Categories without pagination have a single page.
+    '''
+    document = parse_html(page_html)
+    last_page = PAGE_COUNT_XPATH(document)
+    try:
+        return max(int(_text(last_page[0])), 1)
+    except (IndexError, ValueError):
+        return 1
+
+
+def category_page_urls(category_link: str, number_of_pages: int):
+    '''
+    Builds the URL of every page in a recipe category
+
+    Parameters
+    ----------
+    category_link: str
+        The link to any page of the category, e.g. .../food/recipes/a-z/b/1#featured-content
+    number_of_pages: int
+        The number of pages in the category
+
+    Returns
+    -------
+    page_urls: list
+        The URLs for pages 1 to number_of_pages, in order
+    '''
+    if not CATEGORY_PAGE_RE.search(category_link):
+        raise ValueError(f'Not a recipe category link: {category_link}')
+    return [CATEGORY_PAGE_RE.sub(rf'\g<1>{page}', category_link, count=1)
+            for page in range(1, number_of_pages + 1)]
+
+
+def parse_ingredients(document):
+    '''
+    Obtains the ingredient list from a parsed recipe page
+
+    Parameters
+    ----------
+    document: lxml.html.HtmlElement
+        The parsed recipe page
+
+    Returns
+    -------
+    ingredient_list: list
+        A list of upper case ingredient names with duplicates removed
+    '''
+    ingredient_list = [_text(a_tag).upper() for a_tag in INGREDIENTS_XPATH(document)]
+    #remove duplicates
+    return list(dict.fromkeys(ingredient_list))
+
+
+def iso_duration(duration: str):
+    '''
+    Formats an ISO 8601 duration from a Recipe block, e.g. PT1H30M as '1 hour 30 mins'
+
+    Returns None if duration is missing or not a duration.
+    '''
+    match = ISO_DURATION_RE.match(duration or '')
+    if not match or not any(match.groupdict().values()):
+        return None
+    parts = {name: int(value or 0) for name, value in match.groupdict().items()}
+    hours = parts['days'] * 24 + parts['hours']
+    minutes = parts['minutes'] + (1 if parts['seconds'] >= 30 else 0)
+    formatted = []
+    if hours:
+        formatted.append(f"{hours} hour{'s' if hours > 1 else ''}")
+    if minutes or not hours:
+        formatted.append(f"{minutes} min{'s' if minutes != 1 else ''}")
+
+    return ' '.join(formatted)
+
+
+def _clean(value):
+    '''
+    Returns JSON-LD text with HTML entities decoded and whitespace collapsed
+    '''
+    if not isinstance(value, str):
+        return None
+    return ' '.join(html.unescape(value).split()) or None
+
+
+def _image_url(image):
+    '''
+    Returns the first URL of a schema.org image, which may be a URL, a list or an
+    ImageObject
+    '''
+    if isinstance(image, list):
+        image = image[0] if image else None
+    if isinstance(image, dict):
+        image = image.get('url')
+    return image if isinstance(image, str) else None
+
+
+def find_json_ld_recipe(blocks):
+    '''
+    Finds the schema.org Recipe in the text of a page's JSON-LD script blocks
+
+    Parameters
+    ----------
+    blocks: iterable
+        The text of every application/ld+json script on the page
+
+    Returns
+    -------
+    recipe: dict
+        The Recipe object, or None if no block holds one
+    '''
+    for block in blocks:
+        try:
+            data = json.loads(block)
+        except ValueError:
+            #a malformed block does not hide the others
+            continue
+        candidates = data if isinstance(data, list) else [data]
+        while candidates:
+            candidate = candidates.pop(0)
+            if not isinstance(candidate, dict):
+                continue
+            types = candidate.get('@type')
+            if types == 'Recipe' or (isinstance(types, list) and 'Recipe' in types):
+                return candidate
+            candidates.extend(candidate.get('@graph', []))
+
+    return None
+
+
+def ingredient_name(line: str):
+    '''
+    Normalizes an ingredient, e.g. '200g/7oz plain flour, sifted' becomes 'plain
+    flour'. Names found by the XPath extraction are only lower cased.
+
+    Returns
+    -------
+    name: str
+        The ingredient name, or None if nothing is left
+    '''
+    line = BRACKETS_RE.sub(' ', line.lower()).split(',')[0]
+    words = line.split()
+    while words and (words[0] in UNITS or QUANTITY_RE.match(words[0])):
+        words.pop(0)
+    name = ' '.join(words).strip(' .;:-')
+
+    return name or None
+
+
+def recipe_from_json_ld(recipe: dict, recipe_url: str):
+    '''
+    Builds a recipe dictionary from a schema.org Recipe object.
+
+    The time is the cookTime (or totalTime) formatted by iso_duration, which is
+    the upper bound of the range the page shows. The recipeIngredient lines are
+    normalized with ingredient_name, so ingredients are names as the XPath
+    extraction stores them, without quantities.
+    '''
+    ingredients = recipe.get('recipeIngredient') or []
+    if isinstance(ingredients, str):
+        ingredients = [ingredients]
+
+    return recipe_from_fields(
+        recipe_url,
+        name=_clean(recipe.get('name')),
+        description=_clean(recipe.get('description')),
+        cook_time=iso_duration(recipe.get('cookTime') or recipe.get('totalTime')),
+        image_url=_image_url(recipe.get('image')),
+        ingredients=[name for name in map(ingredient_name, filter(None, map(_clean, ingredients)))
+                     if name])
+
+
+def parse_recipe_json_ld(page_html, recipe_url: str):
+    '''
+    Extracts data points from the JSON-LD Recipe block of recipe page HTML
+
+    Returns
+    -------
+    dict_recipe: dictionary
+        A dictionary containing the recipe details, or None if the page has no
+        Recipe block with a name
+    '''
+    if isinstance(page_html, bytes):
+        page_html = page_html.decode('utf-8', 'replace')
+    recipe = find_json_ld_recipe(JSON_LD_RE.findall(page_html))
+    if recipe is None or not _clean(recipe.get('name')):
+        return None
+
+    return recipe_from_json_ld(recipe, recipe_url)
+
+
+def recipe_from_fields(recipe_url: str, name=None, description=None, cook_time=None,
+                       image_url=None, ingredients=()):
+    '''
+    Builds a recipe dictionary from extracted data points.
+
+    Text is cleaned the same way as BBCRecipeScraper._get_details, and a SKU and
+    UUID(v4) are added. Data points which were not found are left as empty lists.
+
+    Parameters
+    ----------
+    recipe_url: str
+        The URL of the recipe page
+    name, description, cook_time, image_url: str or None
+        The data points extracted from the page
+    ingredients: iterable
+        The ingredient names in page order
+
+    Returns
+    -------
+    dict_recipe: dictionary
+        A dictionary containing the recipe details
+    '''
+    dict_recipe = new_recipe_dict()
+    dict_recipe['recipe_url'] = recipe_url
+    if name:
+        dict_recipe['name'] = name.replace("'", "")
+        dict_recipe['sku'] = make_sku(name)
+    #webpages do not always have descriptions
+    if description:
+        dict_recipe['description'] = description.replace("'", "")
+    if cook_time:
+        dict_recipe['time'] = cook_time
+    #webpages do not always have images
+    if image_url:
+        dict_recipe['image_url'] = image_url
+    #remove duplicates
+    ingredients = list(dict.fromkeys(ingredient.upper() for ingredient in ingredients))
+    if ingredients:
+        dict_recipe['ingredients'] = ingredients
+    #UUID v4
+    dict_recipe['uuid'] = str(uuid.uuid4())
+
+    return dict_recipe
+
+
+def parse_recipe(page_html, recipe_url: str, json_ld: bool = False):
+    '''
+    Extracts data points from recipe page HTML into a recipe dictionary.
+
+    The page is parsed with the XPaths of BBCRecipeScraper._get_details. With json_ld 
+    the JSON-LD Recipe block is read first, and only pages without one are parsed 
+    with the XPaths. Fields which are missing from the page are left as empty lists.
+
+    Parameters
+    ----------
+    page_html: str or bytes
+        The HTML of the recipe page
+    recipe_url: str
+        The URL the page was fetched from
+    json_ld: bool
+        Read the JSON-LD block first. Its time is the cookTime, not the range the
+        page shows, see recipe_from_json_ld.
+
+    Returns
+    -------
+    dict_recipe: dictionary
+        A dictionary containing the recipe details
+    '''
+    if json_ld:
+        dict_recipe = parse_recipe_json_ld(page_html, recipe_url)
+        if dict_recipe is not None:
+            return dict_recipe
+    document = parse_html(page_html)
+    name = NAME_XPATH(document)
+    description = DESCRIPTION_XPATH(document)
+    cook_time = TIME_XPATH(document)
+    image_src = IMAGE_XPATH(document)
+
+    return recipe_from_fields(
+        recipe_url,
+        name=_text(name[0]) if name else None,
+        description=_text(description[0]) if description else None,
+        cook_time=_text(cook_time[0]) if cook_time else None,
+        image_url=str(image_src[0]) if image_src else None,
+        ingredients=parse_ingredients(document))
+
+
+def _ingredient_covered(name: str, lines: list):
+    '''
+    Checks an ingredient name from the ingredient links is part of a JSON-LD line
+    '''
+    return any(name in line for line in lines)
+
+
+def parity_report(pages, examples: int = 5):
+    '''
+    Compares the JSON-LD extractor with the XPath extractor on the same pages
+
+    Parameters
+    ----------
+    pages: iterable
+        (recipe_url, page_html) pairs
+    examples: int
+        The number of differing values kept for each field
+
+    Returns
+    -------
+    report: dict
+        The number of pages, how many had a Recipe block, the share of those pages
+        where each field matches (ingredients: the share of ingredient names found
+        in a recipeIngredient line) and examples of differences
+    '''
+    fields = ('name', 'sku', 'description', 'time', 'image_url')
+    matches = dict.fromkeys(fields + ('ingredients',), 0)
+    differences = {field: [] for field in matches}
+    pages_checked = found = 0
+    for recipe_url, page_html in pages:
+        pages_checked += 1
+        from_json_ld = parse_recipe_json_ld(page_html, recipe_url)
+        if from_json_ld is None:
+            continue
+        found += 1
+        from_xpath = parse_recipe(page_html, recipe_url, json_ld=False)
+        for field in fields:
+            if from_json_ld[field] == from_xpath[field]:
+                matches[field] += 1
+            elif len(differences[field]) < examples:
+                differences[field].append(
+                    {'recipe_url': recipe_url, 'json_ld': from_json_ld[field], 'xpath': from_xpath[field]})
+        names = from_xpath['ingredients'] or []
+        covered = sum(_ingredient_covered(name, from_json_ld['ingredients'] or []) for name in names)
+        matches['ingredients'] += covered / len(names) if names else 1
+        if covered < len(names) and len(differences['ingredients']) < examples:
+            differences['ingredients'].append(
+                {'recipe_url': recipe_url, 'json_ld': from_json_ld['ingredients'], 'xpath': names})
+
+    return {
+        'pages': pages_checked,
+        'json_ld_found': found,
+        'match': {field: round(count / found, 3) if found else None for field, count in matches.items()},
+        'differences': {field: values for field, values in differences.items() if values}
+    }
@@ -0,0 +1,67 @@
+'''
+This file contains the compact recipe record yielded by the scraper's
+streaming API (BBCRecipeScraper.iter_recipes). Fields which were not found
+on the page are None instead of empty lists, and the ingredients are a
+tuple. to_dict returns the dictionary the JSON, S3 and RDS outputs are
+written from, so records can be passed on to the existing writers.
+'''
+
+from recipe_parser import new_recipe_dict
+
+
+FIELDS = ('uuid', 'sku', 'name', 'description', 'ingredients',
+          'time', 'image_url', 'image_s3', 'recipe_url')
+
+
+class Recipe:
+    '''
+    One scraped recipe
+    '''
+
+    __slots__ = FIELDS
+
+    def __init__(self, recipe_url: str, uuid: str = None, sku: str = None, name: str = None,
+                 description: str = None, ingredients: tuple = (), time: str = None,
+                 image_url: str = None, image_s3=None):
+        self.recipe_url = recipe_url
+        self.uuid = uuid
+        self.sku = sku
+        self.name = name
+        self.description = description
+        self.ingredients = tuple(ingredients)
+        self.time = time
+        self.image_url = image_url
+        self.image_s3 = image_s3
+
+
+    @classmethod
+    def from_dict(cls, dict_recipe: dict):
+        '''
+        Makes a record from a recipe dictionary, as returned by recipe_parser
+        '''
+        values = {field: dict_recipe.get(field) or None for field in FIELDS}
+        values['ingredients'] = values['ingredients'] or ()
+        return cls(**values)
+
+
+    def to_dict(self):
+        '''
+        Returns the recipe dictionary, with empty lists for the fields which were not
+        found, as stored in data.json, the shards and RDS
+        '''
+        dict_recipe = new_recipe_dict()
+        for field in FIELDS:
+            value = getattr(self, field)
+            if value:
+                dict_recipe[field] = list(value) if field == 'ingredients' else value
+        return dict_recipe
+
+
+    def __eq__(self, other):
+        if not isinstance(other, Recipe):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in FIELDS)
+
+
+    def __repr__(self):
+        return f'Recipe({self.recipe_url!r}, name={self.name!r})'
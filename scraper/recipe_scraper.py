@@ -4,18 +4,57 @@ import requests
 import uuid
 import json
 import os
-import pandas as pd
-import urllib
-import tempfile
+import statistics
+import threading
+import copy
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from botocore.exceptions import BotoCoreError, ClientError
+from sqlalchemy import text
 from tqdm import tqdm
-from storage_credentials import(s3_client, 
-                                s3_bucket_name, 
-                                s3_bucket_link,
-                                engine)
+from http_fetch import HTTPFetcher
+from dom_script import extract_recipe, extract_recipe_json_ld
+from worker_pool import WorkerPool
+from pipeline import Pipeline, Stage
+from image_transfer import ImageTransfer
+from frontier import Frontier, FrontierClosed
+from recipe_record import Recipe
+from rds_writer import RECIPE_COLUMNS, recipe_row
+from resilience import Resilience, FailureLog, CircuitOpenError, EmptyPageError
+from rate_limiter import RateLimiter
+from browser_profile import lean_options, block_resources, page_weight, weight_summary
+from waits import (RatePolicy, 
+                   wait_for, 
+                   wait_for_replaced, 
+                   AZ_KEYBOARD, 
+                   PROMO_COLLECTION, 
+                   RECIPE_TITLE, 
+                   COOKIES_BUTTON)
+from metrics import (PAGE_LOAD_SECONDS, 
+                     EXTRACTION_SECONDS, 
+                     IMAGE_TRANSFER_SECONDS, 
+                     S3_UPLOAD_SECONDS, 
+                     RDS_WRITE_SECONDS, 
+                     PAGE_BYTES, 
+                     PAGES_SCRAPED, 
+                     PAGES_SKIPPED, 
+                     PAGES_FAILED, 
+                     PAGES_RETRIED)
+from recipe_parser import (new_recipe_dict, 
+                           parse_category_links, 
+                           parse_recipe, 
+                           parse_recipe_links, 
+                           parse_page_count, 
+                           category_page_urls)
+from storage_credentials import(get_s3_client, 
+                                get_bucket_name, 
+                                get_bucket_link,
+                                get_engine)
 
 
 '''
@@ -26,37 +65,213 @@ an external storage service.
 '''
 
 
+#timing samples kept for the end of run summaries, the latest pages only
+SAMPLES = 10000
+
+
+def latency_summary(times: list):
+    '''
+    Summarises a list of durations in seconds as milliseconds
+    '''
+    if not times:
+        return {'pages': 0}
+    times = sorted(times)
+    return {
+        'pages': len(times),
+        'mean_ms': round(statistics.mean(times) * 1000, 2),
+        'p50_ms': round(statistics.median(times) * 1000, 2),
+        'p95_ms': round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 2)
+    }
+
+
 class BBCRecipeScraper:
     
-    def __init__(self, chrome_options, url: str = 'https://www.bbc.co.uk/food/recipes/a-z/a/1#featured-content'):
+    def __init__(self, chrome_options, url: str = 'https://www.bbc.co.uk/food/recipes/a-z/a/1#featured-content',
+                 fetch_mode: str = 'browser', extraction_mode: str = 'xpath', 
+                 rds_writer=None, seen_index=None, keep_images: bool = False, 
+                 shard_writer=None, checkpoint=None, browser: bool = True, 
+                 rate_policy=None, page_timeout: float = 10, lean: bool = False, 
+                 frontier=None, image_processor=None, resilience=None, cache=None, 
+                 archive=None):
         '''
         Initialises desired URL
         
         This identifies the URL as the BBC recipe site and uses Chrome webdriver 
         to open it.
+        
+        Parameters
+        ----------
+        fetch_mode: str
+            'browser' opens every recipe page in Chrome. 'http' fetches recipe pages 
+            through a pooled requests session and only falls back to Chrome when the 
+            recipe cannot be read from the HTML.
+        extraction_mode: str
+            How recipes are read from pages loaded in Chrome. 'xpath' finds each element 
+            with its own WebDriver call, 'script' extracts the whole recipe with a single 
+            execute_script call, 'jsonld' reads the page's schema.org Recipe block and 
+            only falls back to 'xpath' on pages without one. Pages fetched over HTTP are 
+            also read from the block with 'jsonld'. Its time is the cookTime, not the 
+            range the page shows, so 'xpath' stays the default.
+        rds_writer: rds_writer.RecipeWriter
+            If given, recipes are buffered and written to RDS in batches instead of 
+            one _upload_to_RDS call per recipe.
+        seen_index: seen_index.SeenIndex
+            Recipe URLs scraped in previous runs, which scraper_scrape skips.
+        keep_images: bool
+            Also save each recipe image locally next to its data.json.
+        shard_writer: shard_writer.ShardWriter
+            If given, records are appended to rolling NDJSON shards instead of one 
+            data.json file and S3 object per recipe.
+        checkpoint: checkpoint.CrawlCheckpoint
+            If given, discovered links and the status of each link are persisted so 
+            an interrupted crawl can resume.
+        browser: bool
+            Start Chrome. Without a browser only the 'http' fetch mode and the direct 
+            link discovery methods can be used, and recipes are never re-read in Chrome.
+        rate_policy: waits.RatePolicy
+            The politeness delay between page requests, shared by every driver and 
+            thread of this scraper. Defaults to RatePolicy(). A rate_limiter.RateLimiter 
+            paces each host separately and adapts to its responses.
+        page_timeout: float
+            The most seconds to wait for a page to show the element the next step needs.
+        lean: bool
+            Use the lean Chrome profile (browser_profile.py), which does not load images, 
+            media, fonts or anything from non-BBC hosts.
+        frontier: frontier.Frontier
+            Receives the links found by link discovery, removing duplicates and enforcing 
+            the crawl budget. Defaults to Frontier(), which accepts 1000 links.
+        image_processor: image_processing.ImageProcessor
+            If given, recipe images are stored under the hash of their bytes together 
+            with resized variants, instead of one full size {SKU}_image.jpg object each.
+        resilience: resilience.Resilience
+            The timeouts, retries, retry budget and per-host circuit breakers used by 
+            every page load, fetch and upload of this scraper. Defaults to Resilience().
+        cache: response_cache.ResponseCache
+            Keeps pages fetched over HTTP on disk between runs, so pages which have not 
+            changed are not downloaded again. Pages loaded in Chrome are not cached.
+        archive: html_archive.HTMLArchive
+            If given, the raw HTML of every recipe page is saved as it is scraped, so 
+            reparse.py can extract the recipes again without loading any page.
         '''
+        if fetch_mode not in ('browser', 'http'):
+            raise ValueError(f'Unknown fetch_mode: {fetch_mode}')
+        if not browser and fetch_mode != 'http':
+            raise ValueError("fetch_mode must be 'http' when running without a browser")
+        if extraction_mode not in ('xpath', 'script', 'jsonld'):
+            raise ValueError(f'Unknown extraction_mode: {extraction_mode}')
+        self.fetch_mode = fetch_mode
+        self.extraction_mode = extraction_mode
+        self.rds_writer = rds_writer
+        self.seen_index = seen_index
+        self.keep_images = keep_images
+        self.shard_writer = shard_writer
+        #outputs each link is still waiting on, it is done once its record and row are written
+        self._unwritten = {}
+        self._unwritten_lock = threading.Lock()
+        if shard_writer is not None and shard_writer.on_complete is None:
+            shard_writer.on_complete = lambda links: self._written('shard', links)
+        if rds_writer is not None and rds_writer.on_flush is None:
+            rds_writer.on_flush = lambda links: self._written('rds', links)
+        self.checkpoint = checkpoint
+        self.rate_policy = rate_policy if rate_policy is not None else RatePolicy()
+        self.page_timeout = page_timeout
+        self.frontier = frontier if frontier is not None else Frontier()
+        self.resilience = resilience if resilience is not None else Resilience()
+        self.cache = cache
+        self.archive = archive
+        #failed pages and calls with their cause
+        self.failures = FailureLog()
+        self.image_transfer = ImageTransfer(get_s3_client(), get_bucket_name(), get_bucket_link(), 
+                                            resilience=self.resilience)
+        self.image_processor = image_processor
+        self._rds_lock = threading.Lock()
+        #databases whose recipe_data table exists, shared with the copies of the scraper
+        self._rds_tables = set()
+        self._driver_lock = threading.Lock()
+        #seconds spent extracting each recipe page in Chrome
+        self.extract_latency = deque(maxlen=SAMPLES)
+        #load time and bytes transferred for each page loaded in Chrome
+        self.page_weights = deque(maxlen=SAMPLES)
+        #whether links are read from the frontier while they are discovered
+        self._streaming = False
+        self.fetcher = None
+        if fetch_mode == 'http':
+            self.fetcher = HTTPFetcher(rate_policy=self.rate_policy, resilience=self.resilience, 
+                                       cache=self.cache)
         #scraper init
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.get(url)
-        self.WebDriverWait = WebDriverWait
-        self.EC = EC
-        time.sleep(3)
+        self.url = url
+        self.lean = lean
+        self.chrome_options = lean_options(chrome_options) if lean else chrome_options
+        self.driver = None
+        if not browser:
+            return
+        self.driver = self._new_driver()
+        self._open(url, AZ_KEYBOARD)
         
         print('Opening www.bbc.co.uk/food/recipes in background.')        
         
         
-    def accept_cookies(self):
+    def _new_driver(self):
+        '''
+        Starts a Chrome driver with this scraper's profile
+        '''
+        driver = webdriver.Chrome(options=self.chrome_options)
+        #Chrome waits 300 seconds for a page by default
+        driver.set_page_load_timeout(self.resilience.timeout)
+        if self.lean:
+            block_resources(driver)
+            
+        return driver
+    
+    
+    def _open(self, url: str, ready: tuple):
+        '''
+        Loads url in Chrome once the rate policy allows it and waits for the page to 
+        show the ready element. The page's load time and bytes transferred are added 
+        to page_weights. Page loads which time out are retried by the resilience policy.
+        
+        Parameters
+        ----------
+        url: str
+            The page to load
+        ready: tuple
+            The (By, selector) locator of an element the next step reads, see waits.py
+            
+        Returns
+        -------
+        element: WebElement
+            The ready element, or None if it did not appear within page_timeout
+        '''
+        def load():
+            self.rate_policy.wait(url)
+            start = time.perf_counter()
+            self.driver.get(url)
+            #Chrome does not report the status, only how long the page took
+            self.rate_policy.observe(url, latency=time.perf_counter() - start, browser=True)
+            
+        with PAGE_LOAD_SECONDS.labels(mode='browser').time():
+            self.resilience.call(url, load)
+            element = wait_for(self.driver, ready, self.page_timeout)
+        weight = page_weight(self.driver)
+        self.page_weights.append(weight)
+        PAGE_BYTES.labels(profile='lean' if self.lean else 'full').observe(weight['bytes'])
+            
+        return element
+    
+    
+    def accept_cookies(self, timeout: float = 5):
         '''
         Accepts Cookies
         
-        This clicks 'accept' on cookies pop-up if it appears, if it does not appear then
-        nothing happens.
+        This clicks 'accept' on cookies pop-up if it appears within timeout seconds, if 
+        it does not appear then nothing happens. Without a browser there is nothing to 
+        accept.
         '''
-        try:
-            self.driver.find_element(
-                By.XPATH, '//*[@id="bbccookies-continue-button"]').click()
-        except:
-            pass
+        if self.driver is None:
+            return
+        button = wait_for(self.driver, COOKIES_BUTTON, timeout, EC.element_to_be_clickable)
+        if button is not None:
+            button.click()
         
         print('Cookies acccepted.')
         
@@ -89,7 +304,7 @@ class BBCRecipeScraper:
                 letter_list = self.driver.find_element(By.XPATH, final_xpath)
                 link = letter_list.get_attribute('href')
                 self.category_links.append(link)
-            except:
+            except NoSuchElementException:
                 pass
             
         print(f'{len(self.category_links)} recipe category links obtained.')
@@ -97,6 +312,26 @@ class BBCRecipeScraper:
         return self.category_links
     
     
+    def get_categories_direct(self):
+        '''
+        Obtains links for each alphabet recipe category without a browser, by fetching 
+        the start URL over HTTP
+        
+        Returns
+        -------
+        category_links: list
+            A list with all the links for category
+        '''
+        fetcher = self.fetcher or HTTPFetcher(rate_policy=self.rate_policy, 
+                                              resilience=self.resilience, cache=self.cache)
+        self.category_links = parse_category_links(fetcher.get(self.url), self.url)
+        if fetcher is not self.fetcher:
+            fetcher.close()
+        print(f'{len(self.category_links)} recipe category links obtained.')
+        
+        return self.category_links
+    
+    
     def _get_links(self):
         '''
         Obtains all the links on the current page and concatinates into list
@@ -121,51 +356,217 @@ class BBCRecipeScraper:
     
     def next_page(self):
         '''
-        Obtains all links from all categories until 1000 URLs collected.        
+        Obtains all links from all categories until the frontier's budget is reached.
         
         This method obtains the total page number per recipe category and clicks next 
-        page for self.get_links method and appends all URLs to total_recipe_list. When 
-        over 1000 URLs have been collected inside total_recipe_list the loop breaks.
+        page for self.get_links method and adds all URLs to the frontier, which removes 
+        duplicates. Categories and pages are no longer walked once the frontier's total 
+        budget (1000 URLs by default) or the category's budget is reached.
         
         Returns
         -------
         total_links_list: list
             An extended recipe_links list with all links from all pages
         '''
-        self.total_links_list = []
+        completed_categories = self._completed_categories()
         
         for links in self.category_links:
             
-            self.driver.get(links)
-            time.sleep(3)
-            #obtain links for first page, otherwise cannot obtain in loop below
-            self.total_links_list.extend(self._get_links())
-            #find number of pages per category
-            try:
-                number_of_pages = int(self.driver.find_element(
-                        By.XPATH, "//span[@aria-label='Next']/preceding::a[1]").text)
-            except:
-                pass
-            
-            if number_of_pages > 0:
-                
-                for page in range(number_of_pages - 1):
-                    
-                    next_button = self.driver.find_element(By.XPATH, "//span[@aria-label='Next']")
-                    self.driver.execute_script("arguments[0].click();", next_button)
-                    #wait for page to load
-                    time.sleep(3)
-                    self.total_links_list.extend(self._get_links())
+            if links in completed_categories:
+                #links were discovered before the last run stopped
+                self.frontier.extend(self.checkpoint.category_links(links), links)
+            else:
+                category_links = self._walk_category(links)
+                if self.checkpoint is not None:
+                    self.checkpoint.add_category(links, category_links)
                     
-            #obtain 1000 recipe links
-            if len(self.total_links_list) > 1000:
+            if self.frontier.full or self.frontier.closed:
                 break
             
-        print(f'{len(self.total_links_list)} recipe urls obtained.')
+        return self._discovery_complete()
+    
+    
+    def _walk_category(self, links: str):
+        '''
+        Obtains the links from one category by clicking through its pages, until the 
+        frontier's budget is reached
+        
+        Returns
+        -------
+        category_links: list
+            The canonical recipe links accepted by the frontier
+        '''
+        category_links = []
+        self._open(links, PROMO_COLLECTION)
+        #obtain links for first page, otherwise cannot obtain in loop below
+        category_links.extend(self.frontier.extend(self._get_links(), links))
+        #find number of pages per category
+        number_of_pages = 1
+        try:
+            number_of_pages = int(self.driver.find_element(
+                    By.XPATH, "//span[@aria-label='Next']/preceding::a[1]").text)
+        except (NoSuchElementException, ValueError):
+            #categories with a single page have no page numbers
+            pass
+        
+        for page in range(number_of_pages - 1):
+            
+            if self.frontier.full or self.frontier.closed or self.frontier.category_full(links):
+                break
+            next_button = self.driver.find_element(By.XPATH, "//span[@aria-label='Next']")
+            container = self.driver.find_element(*PROMO_COLLECTION)
+            self.rate_policy.wait(self.driver.current_url)
+            self.driver.execute_script("arguments[0].click();", next_button)
+            #wait for the next page's recipes to replace the current ones
+            wait_for_replaced(self.driver, container, PROMO_COLLECTION, self.page_timeout)
+            category_links.extend(self.frontier.extend(self._get_links(), links))
+                
+        return category_links
+    
+    
+    def _discovery_complete(self):
+        '''
+        Closes the frontier at the end of link discovery and records it in the checkpoint
+        
+        Returns
+        -------
+        total_links_list: list
+            The canonical links accepted by the frontier, in discovery order. While links 
+            are streamed from the frontier they were already read, and it is left as is.
+        '''
+        #a frontier closed by its reader was stopped before discovery was complete
+        stopped = self.frontier.closed
+        self.frontier.close()
+        if self.checkpoint is not None and not stopped:
+            self.checkpoint.set_discovery_complete()
+        if self.frontier.links is not None:
+            self.total_links_list = list(self.frontier.links)
+        elif not self._streaming:
+            #nothing read the frontier during discovery, so it still holds every link
+            self.total_links_list = list(self.frontier)
+        print(f'{len(self.frontier)} recipe urls obtained. {self.frontier.stats()}')
+        
+        return self.total_links_list
+    
+    
+    def _completed_categories(self):
+        '''
+        Returns the categories whose links are already stored in the checkpoint
+        '''
+        if self.checkpoint is None:
+            return set()
+        return self.checkpoint.completed_categories()
+    
+    
+    def resume_links(self):
+        '''
+        Loads the links which are not yet done from the checkpoint, so scraping can 
+        resume without discovering links again
+        
+        Returns
+        -------
+        total_links_list: list
+            The pending and failed links in discovery order
+        '''
+        self.total_links_list = self.checkpoint.links()
+        print(f'{len(self.total_links_list)} recipe urls left from the last run.')
         
         return self.total_links_list
     
     
+    def next_page_direct(self, max_workers: int = 8, max_links: int = None):
+        '''
+        Obtains all links from all categories without clicking through pages.
+        
+        The first page of every category is fetched to read its page count, then the 
+        URL of every page is built from the /food/recipes/a-z/{letter}/{page} scheme and 
+        all pages are fetched concurrently over a pooled HTTP session. As in next_page, 
+        links are added to the frontier category by category until its budget is 
+        reached, and pages which are no longer needed are not fetched.
+        
+        Parameters
+        ----------
+        max_workers: int
+            The number of pages fetched at the same time
+        max_links: int
+            If given, stop once the frontier holds this many links, as well as at its 
+            own budget
+        
+        Returns
+        -------
+        total_links_list: list
+            An extended recipe_links list with all links from all pages
+        '''
+        def budget_reached():
+            return (self.frontier.full or self.frontier.closed
+                    or (max_links is not None and len(self.frontier) >= max_links))
+        
+        fetcher = self.fetcher or HTTPFetcher(pool_size=max_workers, rate_policy=self.rate_policy, 
+                                              resilience=self.resilience, cache=self.cache)
+        
+        def get_page(page_url):
+            #bypass pages which fail to load, as next_page does
+            try:
+                return fetcher.get(page_url)
+            except (requests.RequestException, CircuitOpenError) as error:
+                self.failures.record(page_url, error, stage='discovery')
+                return None
+            
+        def get_links(page_url):
+            page_html = get_page(page_url)
+            return parse_recipe_links(page_html, page_url) if page_html else []
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            #read the page count of every category once
+            completed_categories = self._completed_categories()
+            pending = [links for links in self.category_links if links not in completed_categories]
+            first_pages = dict(zip(pending, executor.map(get_page, pending)))
+            category_pages = []
+            
+            for links in self.category_links:
+                
+                if links in completed_categories:
+                    #links were discovered before the last run stopped
+                    category_pages.append((links, self.checkpoint.category_links(links), []))
+                    continue
+                page_html = first_pages[links]
+                if not page_html:
+                    continue
+                page_urls = category_page_urls(links, parse_page_count(page_html))
+                first_links = parse_recipe_links(page_html, links)
+                if self.frontier.max_per_category and first_links:
+                    #pages beyond the category budget are not fetched
+                    pages_needed = math.ceil(self.frontier.max_per_category / len(first_links))
+                    page_urls = page_urls[:max(pages_needed, 1)]
+                #fetch the remaining pages of every category up front
+                futures = [executor.submit(get_links, url) for url in page_urls[1:]]
+                category_pages.append((links, first_links, futures))
+                
+            for index, (links, first_links, futures) in enumerate(category_pages):
+                
+                try:
+                    category_links = self.frontier.extend(first_links, links, max_links)
+                    for future in futures:
+                        category_links.extend(self.frontier.extend(future.result(), links, max_links))
+                except FrontierClosed:
+                    #the reader stopped, the category is not recorded as discovered
+                    for future in futures:
+                        future.cancel()
+                else:
+                    if self.checkpoint is not None and links not in completed_categories:
+                        self.checkpoint.add_category(links, category_links)
+                if budget_reached():
+                    for _, _, pending_futures in category_pages[index + 1:]:
+                        for future in pending_futures:
+                            future.cancel()
+                    break
+                
+        if fetcher is not self.fetcher:
+            fetcher.close()
+        
+        return self._discovery_complete()
+    
+    
     def _get_ingredients(self):
         '''
         Obtains ingredient list for each recipe, which is then appended to the 
@@ -192,7 +593,7 @@ class BBCRecipeScraper:
                 try:
                     ingredient = element.find_element(By.XPATH, final_xpath).text.upper()
                     ingredient_list.append(ingredient)
-                except:
+                except NoSuchElementException:
                     pass
                 
         #remove duplicates
@@ -213,17 +614,7 @@ class BBCRecipeScraper:
         dict_recipe: dictionary
             An dictionary containing all the recipe details from each link in total_links_list
         '''
-        self.dict_recipe = {
-            'uuid': [],
-            'sku': [],
-            'name': [],
-            'description': [],
-            'ingredients': [],
-            'time': [], 
-            'image_url': [], 
-            'image_s3': [],
-            'recipe_url': []
-        }
+        self.dict_recipe = new_recipe_dict()
         #recipe URL
         self.dict_recipe['recipe_url'] = self.link
         #recipe name
@@ -234,14 +625,14 @@ class BBCRecipeScraper:
             #recipe SKU 
             self.SKU = self.name.upper().replace(" ", "-").replace("'", "")
             self.dict_recipe['sku'] = self.SKU
-        except:
+        except NoSuchElementException:
             pass
         #description
         try:
             description = self.driver.find_element(
                 By.XPATH, '//p[@class="recipe-description__text"]').text
             self.dict_recipe['description'] = description.replace("'", "")
-        except:
+        except NoSuchElementException:
             #webpages do not always have descriptions
             pass
         #recipe total cooking time
@@ -250,21 +641,21 @@ class BBCRecipeScraper:
                 By.XPATH, '//div[@class="gel-layout__item gel-1/4 recipe-leading-info__side-bar"]/div')
             cook_time = time_container.find_element(By.XPATH, './div[2]/p[2]').text
             self.dict_recipe['time'] = cook_time
-        except: 
+        except NoSuchElementException:
             pass
         #recipe image url
         try:
             image_tag = self.driver.find_element(
                 By.XPATH, '//div[@class="recipe-media__image responsive-image-container__16/9"]/img')
             self.dict_recipe['image_url'] = image_tag.get_attribute('src')
-        except:
+        except NoSuchElementException:
             #webpages do not always have images
             pass
             
         #recipe ingredients
         try:
             self.dict_recipe['ingredients'] = self._get_ingredients()    
-        except:
+        except NoSuchElementException:
             pass
         #UUID v4
         self.dict_recipe['uuid'] = str(uuid.uuid4())
@@ -273,6 +664,136 @@ class BBCRecipeScraper:
         return self.dict_recipe
     
     
+    def _get_details_http(self):
+        '''
+        Extracts data points from a URL without a browser.
+        
+        The recipe page HTML is fetched through the pooled HTTP session and parsed with
+        recipe_parser. If the page cannot be fetched or has no recipe name (e.g. it needs 
+        JavaScript to render), the recipe is extracted through Chrome instead. Without a 
+        browser a page which cannot be fetched raises its error.
+        
+        Returns
+        -------
+        dict_recipe: dictionary
+            An dictionary containing all the recipe details from each link in total_links_list
+        '''
+        try:
+            with PAGE_LOAD_SECONDS.labels(mode='http').time():
+                page_html = self.fetcher.get(self.link)
+            if self.archive is not None:
+                self.archive.put(self.link, page_html)
+            with EXTRACTION_SECONDS.labels(mode='html').time():
+                self.dict_recipe = parse_recipe(page_html, self.link, 
+                                                json_ld=self.extraction_mode == 'jsonld')
+        except (requests.RequestException, CircuitOpenError):
+            if self.driver is None:
+                raise
+            self.dict_recipe = new_recipe_dict()
+            
+        if self.dict_recipe['name'] or self.driver is None:
+            self.SKU = self.dict_recipe['sku'] or self.dict_recipe['uuid']
+        else:
+            #fall back to the browser for pages that need JavaScript
+            with self._driver_lock:
+                self._open(self.link, RECIPE_TITLE)
+                if self.archive is not None:
+                    self.archive.put(self.link, self.driver.page_source)
+                self._extract_details()
+            
+        return self.dict_recipe
+    
+    
+    def _get_details_script(self):
+        '''
+        Extracts data points from the current page with a single execute_script call.
+        
+        Returns
+        -------
+        dict_recipe: dictionary
+            The same dictionary as _get_details returns
+        '''
+        self.dict_recipe = extract_recipe(self.driver, self.link)
+        if self.dict_recipe['sku']:
+            self.SKU = self.dict_recipe['sku']
+            
+        return self.dict_recipe
+    
+    
+    def _get_details_json_ld(self):
+        '''
+        Extracts data points from the JSON-LD Recipe block of the current page, or with 
+        _get_details if the page does not have one.
+        
+        Returns
+        -------
+        dict_recipe: dictionary
+            The same dictionary as _get_details returns
+        '''
+        dict_recipe = extract_recipe_json_ld(self.driver, self.link)
+        if dict_recipe is None:
+            return self._get_details()
+        self.dict_recipe = dict_recipe
+        self.SKU = self.dict_recipe['sku']
+            
+        return self.dict_recipe
+    
+    
+    def _extract_details(self):
+        '''
+        Extracts the recipe on the current page using extraction_mode and records how 
+        long the extraction took in extract_latency.
+        '''
+        start = time.perf_counter()
+        if self.extraction_mode == 'script':
+            self._get_details_script()
+        elif self.extraction_mode == 'jsonld':
+            self._get_details_json_ld()
+        else:
+            self._get_details()
+        elapsed = time.perf_counter() - start
+        self.extract_latency.append(elapsed)
+        EXTRACTION_SECONDS.labels(mode=self.extraction_mode).observe(elapsed)
+        
+        return self.dict_recipe
+    
+    
+    def compare_extraction(self, links: list):
+        '''
+        Measures per-page extraction latency of the xpath, script and jsonld paths.
+        
+        Each page is loaded once and extracted with every path, so they are timed 
+        against the same DOM.
+        
+        Parameters
+        ----------
+        links: list
+            Recipe URLs to measure
+        
+        Returns
+        -------
+        report: dict
+            Latency summary in milliseconds for each path
+        '''
+        paths = {'xpath': self._get_details, 
+                 'script': self._get_details_script, 
+                 'jsonld': self._get_details_json_ld}
+        latency = {path: [] for path in paths}
+        
+        for self.link in links:
+            self._open(self.link, RECIPE_TITLE)
+            for path, extract in paths.items():
+                start = time.perf_counter()
+                extract()
+                latency[path].append(time.perf_counter() - start)
+            
+        report = {path: latency_summary(times) for path, times in latency.items()}
+        for path, summary in report.items():
+            print(f'{path} extraction: {summary}')
+            
+        return report
+    
+    
     def _download_image(self):
         '''
         Downloads the images locally 
@@ -289,13 +810,14 @@ class BBCRecipeScraper:
             os.makedirs(self.filepath)
         #download image to filepath
         src = self.dict_recipe['image_url']
+        #webpages do not always have images
+        if not src:
+            return
         try:
-            img_data = requests.get(src).content
-            with open(f'{self.filepath}/images.jpg', 'wb') as handler:
-                handler.write(img_data)
+            self.image_transfer.fetch(src, f'{self.filepath}/images.jpg')
             self.dict_recipe['image_s3'] = f'{self.SKU}.jpg'
-        except:
-            pass
+        except (requests.RequestException, CircuitOpenError) as error:
+            self.failures.record(src, error, stage='image')
         
         return
     
@@ -305,25 +827,34 @@ class BBCRecipeScraper:
         Uploads images and stores them externally to an s3 bucket hosted by AWS 
         (Amazon Web Services).
         
-        A temporary directory is created to download the images before they are uploaded. 
-        The image's object url is appended to the dict_recipe dictionary to ensure each
+        The image is streamed from its URL straight into the bucket through the shared 
+        image_transfer session, without a temporary file. If keep_images is set, a local 
+        copy is written to raw_recipe_data/{SKU}/images.jpg from the same bytes. The 
+        image's object url is appended to the dict_recipe dictionary to ensure each
         image is correctly associated with it's item and obtains a unique identifier.
+        
+        With an image_processor the image is downloaded and stored under the hash of 
+        its bytes instead, and image_s3 holds the URL of the original and of each 
+        variant, by variant name.
         '''
-        #create temp directory to store images
-        with tempfile.TemporaryDirectory() as temp_dir:
-            
-            src = self.dict_recipe['image_url']
-            try:
-                urllib.request.urlretrieve(src, f'{temp_dir}/{self.SKU}_image.jpg')
-                #upload images to s3 bucket
-                s3_client.upload_file(
-                    f'{temp_dir}/{self.SKU}_image.jpg', s3_bucket_name, f'{self.SKU}_image.jpg')
-                time.sleep(1)
-                #append new image link to dict_recipe dictionary
-                self.dict_recipe["image_s3"] = (s3_bucket_link + f'{self.SKU}_image.jpg')
-                
-            except:
-                pass
+        src = self.dict_recipe['image_url']
+        #webpages do not always have images
+        if not src:
+            return
+        local_path = f'raw_recipe_data/{self.SKU}/images.jpg' if self.keep_images else None
+        try:
+            #append new image link to dict_recipe dictionary
+            with IMAGE_TRANSFER_SECONDS.time():
+                if self.image_processor is not None:
+                    image_data = self.image_transfer.fetch(src, local_path)
+                    self.dict_recipe["image_s3"] = self.image_processor.store(image_data)
+                else:
+                    self.dict_recipe["image_s3"] = self.image_transfer.transfer(
+                        src, f'{self.SKU}_image.jpg', local_path)
+        except (requests.RequestException, BotoCoreError, ClientError, CircuitOpenError) as error:
+            #the recipe is stored without its image
+            print(f'Image for {self.link} was not uploaded: {error!r}')
+            self.failures.record(src, error, stage='image')
         
         return
     
@@ -351,8 +882,10 @@ class BBCRecipeScraper:
         Uploads the json file to s3 bucket hosted by AWS as storage for the tabular data.
         '''
         #upload file to s3 bucket
-        s3_client.upload_file(
-            f'{self.filepath}/data.json', s3_bucket_name, f'{self.SKU}_data.json')
+        with S3_UPLOAD_SECONDS.labels(kind='json').time():
+            self.resilience.call(
+                f's3://{get_bucket_name()}', get_s3_client().upload_file, 
+                f'{self.filepath}/data.json', get_bucket_name(), f'{self.SKU}_data.json')
         
         return
     
@@ -361,58 +894,586 @@ class BBCRecipeScraper:
         '''
         Connects to an RDS instance and SQL database to present the data in table form.
         
-        Using sqlalchemy this method creates a query to determine if recipe_data table 
-        exists and creates one if it does not. Then it creates a query to find if the
-        recipe_url exists in the recipe_data table and appends to it if it does not. 
-        '''
-        #to pandas
-        self.recipe_df = pd.DataFrame.from_dict(self.dict_recipe, orient='index')
-        self.recipe_df = self.recipe_df.transpose()
-        
-        #if SQL table does not exist, create it
-        if not engine.execute(  """
-                                SELECT EXISTS 
-                                (
-                                SELECT FROM information_schema.tables 
-                                WHERE  table_schema = 'public'
-                                AND    table_name   = 'recipe_data'
-                                );
-                                """
-                                ).first()[0]:
-            self.recipe_df.to_sql("recipe_data", engine, index=False)
+        Using sqlalchemy this method creates the recipe_data table once per run if it does 
+        not exist. Then it inserts the recipe as one row, in the same statement as the 
+        check that its recipe_url is not in the recipe_data table yet. 
+        '''
+        start = time.perf_counter()
+        engine = get_engine()
+        #one row, as RecipeWriter writes it
+        row = recipe_row(self.dict_recipe)
+        columns = ', '.join(f'"{column}"' for column in RECIPE_COLUMNS)
+        values = ', '.join(f':{column}' for column in RECIPE_COLUMNS)
+        
+        created = str(engine.url) not in self._rds_tables
+        with engine.begin() as connection:
+            if created:
+                #if SQL table does not exist, create it
+                definitions = ', '.join(f'"{column}" TEXT' for column in RECIPE_COLUMNS)
+                connection.execute(text(f'CREATE TABLE IF NOT EXISTS recipe_data ({definitions})'))
+            #if URL does not exist in recipe_data table, insert the recipe
+            connection.execute(text(
+                f'INSERT INTO recipe_data ({columns}) SELECT {values} '
+                f'WHERE NOT EXISTS (SELECT 1 FROM recipe_data WHERE recipe_url = :recipe_url)'), row)
+        if created:
+            self._rds_tables.add(str(engine.url))
+        RDS_WRITE_SECONDS.labels(mode='single').observe(time.perf_counter() - start)
+            
+        return
+    
+    
+    def _store_record(self):
+        '''
+        Saves the current recipe as JSON, either to a shard or as its own data.json 
+        file uploaded to the s3 bucket
+        '''
+        with self._unwritten_lock:
+            self._unwritten[self.link] = {'shard', 'rds'}
+        if self.shard_writer is not None:
+            self.shard_writer.write(self.dict_recipe)
+        else:
+            self._download_info()
+            self._upload_to_cloud()
+            self._written('shard', [self.link])
+            
+        return
+    
+    
+    def _links_to_scrape(self, refresh: bool = False):
+        '''
+        Returns the links in total_links_list which still need to be scraped
+        
+        Parameters
+        ----------
+        refresh: bool
+            Scrape every link again, including those already in seen_index
+        '''
+        links = self.total_links_list
+        if self.seen_index is not None and not refresh:
+            #skip recipes scraped in previous runs before opening any page
+            links = self.seen_index.filter(links)
+            PAGES_SKIPPED.inc(len(self.total_links_list) - len(links))
+            print(f'{len(self.total_links_list) - len(links)} recipe urls already scraped, skipping.')
+        if self.checkpoint is not None:
+            links = self.checkpoint.filter_pending(links)
+            
+        return links
+    
+    
+    def _iter_links_to_scrape(self, links, refresh: bool = False):
+        '''
+        Yields the links which still need to be scraped, as _links_to_scrape, while 
+        links are still being discovered
+        
+        Parameters
+        ----------
+        links: iterable
+            The links to scrape, e.g. the frontier
+        refresh: bool
+            Scrape every link again, including those already in seen_index
+        '''
+        done = set(self.checkpoint.links(statuses=('done',))) if self.checkpoint is not None else set()
+        for link in links:
+            if self.seen_index is not None and not refresh and link in self.seen_index:
+                PAGES_SKIPPED.inc()
+                continue
+            if link in done:
+                continue
+            yield link
+    
+    
+    def _fetch_details(self):
+        '''
+        Loads the recipe at self.link with fetch_mode and extracts its details
+        
+        Raises resilience.EmptyPageError if no recipe name was found, so an error page 
+        or a page which did not load is recorded as a failure instead of stored.
+        
+        Returns
+        -------
+        dict_recipe: dictionary
+            An dictionary containing all the recipe details
+        '''
+        if self.fetch_mode == 'http':
+            self._get_details_http()
+        else:
+            self._open(self.link, RECIPE_TITLE)
+            if self.archive is not None:
+                self.archive.put(self.link, self.driver.page_source)
+            self._extract_details()
+        if not self.dict_recipe['name']:
+            raise EmptyPageError(f'No recipe found on {self.link}')
+            
+        return self.dict_recipe
+    
+    
+    def _record_failure(self, link: str, error: Exception):
+        '''
+        Records a link which could not be scraped with the cause of the failure, and 
+        marks it failed in the checkpoint so the next --resume run scrapes it again
+        
+        Returns
+        -------
+        reason: str
+            The cause and the error
+        '''
+        reason = self.failures.record(link, error)
+        if self.checkpoint is not None:
+            self.checkpoint.mark(link, 'failed', reason)
             
+        return reason
+    
+    
+    def _scrape_link(self):
+        '''
+        Scrapes, stores and uploads the recipe at self.link
+        '''
+        self._fetch_details()
+        # self._download_image()
+        self._upload_image()
+        self._store_record()
+        if self.rds_writer is not None:
+            self.rds_writer.add(self.dict_recipe)
+        else:
+            #keep the exists checks and insert of pool workers from interleaving
+            with self._rds_lock:
+                self._upload_to_RDS()
+            self._written('rds', [self.link])
+        if self.archive is not None:
+            self.archive.set_outputs(self.dict_recipe)
+        PAGES_SCRAPED.inc()
             
-        #if URL does not exist in recipe_data table, append df
-        if not engine.execute(  f"""
-                                SELECT EXISTS
-                                (
-                                SELECT * FROM recipe_data
-                                WHERE recipe_url = '{self.link}'
-                                );
-                                """        
-                                ).first()[0]:
-            self.recipe_df.to_sql("recipe_data", engine, index=False, if_exists='append')
+        return
+    
+    
+    def _written(self, output: str, links: list):
+        '''
+        Called once the 'shard' (or data.json) or 'rds' output of links is written, 
+        shards when complete and RDS rows when their batch is committed. Links with 
+        both outputs written are marked done.
+        '''
+        done = []
+        with self._unwritten_lock:
+            for link in links:
+                outputs = self._unwritten.get(link)
+                if outputs is None:
+                    continue
+                outputs.discard(output)
+                if not outputs:
+                    del self._unwritten[link]
+                    done.append(link)
+        self._mark_done(done)
+    
+    
+    def _mark_done(self, links: list):
+        '''
+        Records links whose recipes are stored in seen_index and the checkpoint
+        '''
+        for link in links:
+            if self.seen_index is not None:
+                self.seen_index.add(link)
+            if self.checkpoint is not None:
+                self.checkpoint.mark(link, 'done')
+    
+    
+    def _finish_scrape(self):
+        '''
+        Flushes buffered output and reports the results at the end of a run
+        '''
+        #completes the last shard and RDS batch first, so their links are marked done below
+        if self.shard_writer is not None:
+            self.shard_writer.close()
+        if self.rds_writer is not None:
+            self.rds_writer.close()
+        if self.seen_index is not None:
+            self.seen_index.close()
+        if self.checkpoint is not None:
+            print(f'Crawl checkpoint: {self.checkpoint.counts()}')
+        if self.fetcher is not None:
+            self.fetcher.close()
+        self.image_transfer.close()
+        if self.image_processor is not None:
+            self.image_processor.close()
+            print(f'Recipe images: {self.image_processor.stats()}')
+        if self.cache is not None:
+            print(f'Response cache: {self.cache.stats()}')
+        if self.archive is not None:
+            print(f'HTML archive: {len(self.archive)} pages in {self.archive.directory}')
+            self.archive.close()
+        if isinstance(self.rate_policy, RateLimiter):
+            print(f'Rate limits: {self.rate_policy.stats()}')
+        if self.failures.causes:
+            print(f'Failures by cause: {self.failures.summary()}')
+        if self.extract_latency:
+            print(f'{self.extraction_mode} extraction: {latency_summary(self.extract_latency)}')
+        if self.page_weights:
+            print(f"{'lean' if self.lean else 'full'} profile pages: {weight_summary(self.page_weights)}")
+        if self.shard_writer is not None:
+            print(f'{self.shard_writer.records_written} urls have been scraped')
+        elif os.path.isdir('raw_recipe_data'):
+            print(f'{len(os.listdir("raw_recipe_data"))} urls have been scraped')
             
         return
     
     
-    def scraper_scrape(self):
+    def iter_recipe_links(self, discover=None, refresh: bool = False):
+        '''
+        Yields the recipe links which still need to be scraped, one at a time
+        
+        Parameters
+        ----------
+        discover: callable
+            If given, a link discovery method such as next_page_direct. It runs in the 
+            background and links are yielded as they reach the frontier, and closing the 
+            generator early closes the frontier, which stops discovery. Otherwise the 
+            links of total_links_list, from an earlier discovery or resume_links, are 
+            yielded.
+        refresh: bool
+            Also yield links already in seen_index
+        '''
+        if discover is None:
+            yield from self._iter_links_to_scrape(self.total_links_list, refresh)
+            return
+        
+        def run_discovery():
+            try:
+                discover()
+            except FrontierClosed:
+                #the reader stopped early
+                pass
+            finally:
+                #stop the iteration even if discovery fails
+                self.frontier.close()
+                
+        discovery = threading.Thread(target=run_discovery, name='discovery', daemon=True)
+        self._streaming = True
+        discovery.start()
+        try:
+            yield from self._iter_links_to_scrape(self.frontier, refresh)
+        finally:
+            #if the generator is closed early, discovery stops at its next page
+            self.frontier.close()
+            discovery.join()
+            self._streaming = False
+    
+    
+    def iter_recipes(self, links=None, discover=None, refresh: bool = False, store: bool = True):
+        '''
+        Scrapes recipes one at a time and yields each as a compact Recipe record
+        
+        Only the current recipe is held in memory, so the scraper can be embedded in 
+        other pipelines whatever the crawl size. Links which fail are recorded with 
+        their cause and skipped.
+        
+        Parameters
+        ----------
+        links: iterable
+            The links to scrape. Defaults to iter_recipe_links(discover, refresh).
+        discover: callable
+            A link discovery method run in the background, see iter_recipe_links. With a 
+            browser, recipes are then loaded in a second Chrome driver.
+        refresh: bool
+            Scrape every link again, including those already in seen_index
+        store: bool
+            Also save, upload and write each recipe to RDS as scraper_scrape does. 
+            Without it recipes are only extracted.
+        
+        Yields
+        ------
+        recipe: recipe_record.Recipe
+            The recipe scraped from each link
+        '''
+        if links is None:
+            links = self.iter_recipe_links(discover, refresh)
+        scraper = self
+        if discover is not None and self.driver is not None:
+            #discovery keeps the main driver
+            scraper = copy.copy(self)
+            scraper.driver = self._new_driver()
+        try:
+            for scraper.link in links:
+                try:
+                    if store:
+                        scraper._scrape_link()
+                    else:
+                        scraper._fetch_details()
+                except Exception as error:
+                    #record the link and carry on with the next one
+                    print(f'Failed to scrape {scraper.link} ({error!r}).')
+                    PAGES_FAILED.inc()
+                    scraper._record_failure(scraper.link, error)
+                    continue
+                yield Recipe.from_dict(scraper.dict_recipe)
+        finally:
+            if scraper is not self:
+                scraper.driver.quit()
+    
+    
+    def scraper_scrape(self, refresh: bool = False):
         '''
         Scrape data for each link in total_links_list through get_details method
         
         Store and upload the data by calling upload_image, download_info, 
         upload_to_cloud and upload_to_RDS methods
+        
+        Parameters
+        ----------
+        refresh: bool
+            Scrape every link again, including those already in seen_index
         '''
-        for self.link in tqdm(self.total_links_list):
+        for _ in self.iter_recipes(tqdm(self._links_to_scrape(refresh))):
+            pass
             
-            self.driver.get(self.link)
-            time.sleep(3)
-            self._get_details()
-            time.sleep(5)
-            # self._download_image()
-            self._upload_image()
-            self._download_info()
-            self._upload_to_cloud()
-            self._upload_to_RDS()
+        self._finish_scrape()
+    
+    
+    def scraper_scrape_pool(self, workers: int = 4, recycle_after: int = 50, refresh: bool = False):
+        '''
+        Scrape data for each link in total_links_list with a pool of Chrome drivers
+        
+        Each worker has its own webdriver.Chrome, started with the same chrome_options 
+        as this scraper, and takes links from a shared queue.
+        
+        Parameters
+        ----------
+        workers: int
+            The number of Chrome drivers running at the same time
+        recycle_after: int
+            Restart each driver after this many pages to contain Chrome memory growth
+        refresh: bool
+            Scrape every link again, including those already in seen_index
+        
+        Returns
+        -------
+        worker_stats: list
+            Pages, failures, restarts and pages per minute for each worker
+        '''
+        pool = WorkerPool(self, workers=workers, recycle_after=recycle_after)
+        worker_stats = pool.run(self._links_to_scrape(refresh))
+        self._finish_scrape()
+        
+        return worker_stats
+    
+    
+    def scraper_scrape_queue(self, work_queue, batch_size: int = 10, poll_interval: float = 10, 
+                             refresh: bool = False):
+        '''
+        Scrape recipe links claimed from a shared work queue until the queue is drained
+        
+        Any number of scrapers, on any number of machines, can take links from the same 
+        queue. Each batch is leased to this scraper, scraped link by link and acknowledged, 
+        links which fail are released to be retried. The leases of the batch are renewed 
+        once half of the lease time has passed, so a slow batch is not reclaimed.
+        
+        Parameters
+        ----------
+        work_queue: work_queue.WorkQueue
+            The queue filled by the coordinator
+        batch_size: int
+            The number of links claimed at a time
+        poll_interval: float
+            Seconds to wait when other workers hold all remaining links
+        refresh: bool
+            Scrape every link again, including those already in seen_index
             
-        print(f'{len(os.listdir("raw_recipe_data"))} urls have been scraped')
+        Returns
+        -------
+        counts: dict
+            The number of links with each status in the queue
+        '''
+        while True:
+            links = work_queue.claim(batch_size)
+            if not links:
+                if work_queue.drained():
+                    break
+                #leases held by other workers may still expire
+                time.sleep(poll_interval)
+                continue
+            done = []
+            renewed = time.monotonic()
+            for index, self.link in enumerate(links):
+                if time.monotonic() - renewed > work_queue.lease_seconds / 2:
+                    #keep the links waiting for their ack and the rest of the batch leased
+                    work_queue.renew(done + links[index:])
+                    renewed = time.monotonic()
+                if self.seen_index is not None and not refresh and self.link in self.seen_index:
+                    PAGES_SKIPPED.inc()
+                    done.append(self.link)
+                    continue
+                try:
+                    self._scrape_link()
+                    done.append(self.link)
+                except Exception as error:
+                    #release the link, so this or another worker retries it
+                    print(f'Failed to scrape {self.link} ({error!r}).')
+                    PAGES_FAILED.inc()
+                    work_queue.fail(self.link, self.failures.record(self.link, error))
+            if self.shard_writer is not None:
+                #acknowledge links only once their records are in a complete shard
+                self.shard_writer.complete_shard()
+                incomplete = self.shard_writer.incomplete(done)
+                for link in incomplete:
+                    work_queue.fail(link, 'shard upload failed')
+                done = [link for link in done if link not in incomplete]
+            if self.rds_writer is not None and done:
+                #and only once their rows are committed
+                try:
+                    self.rds_writer.flush()
+                except Exception as error:
+                    print(f'RDS flush failed ({error!r}).')
+                    for link in done:
+                        work_queue.fail(link, self.failures.record(link, error))
+                    done = []
+            work_queue.ack(done)
+        counts = work_queue.counts()
+        print(f'Work queue: {counts}')
+        self._finish_scrape()
+        
+        return counts
+    
+    
+    def _load_record(self, dict_recipe: dict):
+        '''
+        Makes dict_recipe the current recipe, so the storage methods act on it
+        '''
+        self.dict_recipe = dict_recipe
+        self.link = dict_recipe['recipe_url']
+        #recipes without a name are stored under their UUID
+        self.SKU = dict_recipe['sku'] or dict_recipe['uuid']
+        
+        return
+    
+    
+    def scraper_scrape_pipeline(self, fetch_workers: int = 1, image_workers: int = 4, 
+                                upload_workers: int = 4, queue_size: int = 16, 
+                                refresh: bool = False, discover=None, max_attempts: int = 2):
+        '''
+        Scrape data for each link in total_links_list with a staged pipeline
+        
+        Fetching and extracting, image transfer, JSON/S3 upload and the RDS write run 
+        as separate stages connected by bounded queues, so S3 and RDS calls overlap the 
+        next page loads. Each stage thread works on its own copy of the scraper.
+        
+        Parameters
+        ----------
+        fetch_workers: int
+            Threads loading and extracting pages. In browser mode each thread after the 
+            first starts its own Chrome driver.
+        image_workers: int
+            Threads transferring images to S3
+        upload_workers: int
+            Threads saving and uploading the JSON files
+        queue_size: int
+            The number of records which can wait in front of each stage
+        refresh: bool
+            Scrape every link again, including those already in seen_index
+        discover: callable
+            If given, a link discovery method such as next_page_direct. It runs in the 
+            background and links are scraped as they reach the frontier, instead of 
+            scraping total_links_list after discovery. Every fetch thread then starts its 
+            own Chrome driver, leaving the main driver to discovery.
+        max_attempts: int
+            How many times a link is loaded before it is counted as failed. If Chrome 
+            crashes, the fetch thread restarts its driver and loads the link again.
+        
+        Returns
+        -------
+        stage_stats: list
+            Processed, failed, busy time and queue depth for each stage
+        '''
+        local = threading.local()
+        main_driver_taken = [True] if discover is not None else []
+        drivers_lock = threading.Lock()
+        
+        def worker():
+            #a per-thread copy holds that thread's current recipe
+            if not hasattr(local, 'scraper'):
+                local.scraper = copy.copy(self)
+            return local.scraper
+        
+        def fetch(link):
+            scraper = worker()
+            if self.fetch_mode == 'browser' and not hasattr(local, 'driver_claimed'):
+                with drivers_lock:
+                    if main_driver_taken:
+                        #the main driver is used by another fetch thread
+                        scraper.driver = self._new_driver()
+                    main_driver_taken.append(True)
+                local.driver_claimed = True
+            scraper.link = link
+            attempt = 0
+            while True:
+                try:
+                    return scraper._fetch_details()
+                except WebDriverException as error:
+                    attempt += 1
+                    if self.fetch_mode != 'browser' or attempt >= max_attempts:
+                        raise
+                    print(f'{threading.current_thread().name}: driver failed on {link} '
+                          f'({error.__class__.__name__}), restarting.')
+                    restart_driver(scraper)
+                    PAGES_RETRIED.inc()
+        
+        def restart_driver(scraper):
+            #as DriverWorker does, a crashed driver is replaced before the link is retried. 
+            #The link is retried by this thread, putting it back on the bounded fetch 
+            #queue could block every fetch thread.
+            try:
+                scraper.driver.quit()
+            except WebDriverException:
+                #the driver has already crashed
+                pass
+            scraper.driver = self._new_driver()
+        
+        def quit_driver():
+            scraper = getattr(local, 'scraper', None)
+            if scraper is not None and scraper.driver is not self.driver:
+                scraper.driver.quit()
+        
+        def transfer_image(dict_recipe):
+            scraper = worker()
+            scraper._load_record(dict_recipe)
+            scraper._upload_image()
+            return scraper.dict_recipe
+        
+        def upload(dict_recipe):
+            scraper = worker()
+            scraper._load_record(dict_recipe)
+            scraper._store_record()
+            return scraper.dict_recipe
+        
+        def failed(item, error):
+            #items are links before the fetch stage and records after it
+            self._record_failure(item if isinstance(item, str) else item['recipe_url'], error)
+            progress.update(1)
+        
+        def write(dict_recipe):
+            scraper = worker()
+            scraper._load_record(dict_recipe)
+            if self.rds_writer is not None:
+                self.rds_writer.add(dict_recipe)
+            else:
+                scraper._upload_to_RDS()
+                self._written('rds', [scraper.link])
+            if self.archive is not None:
+                self.archive.set_outputs(dict_recipe)
+            PAGES_SCRAPED.inc()
+            progress.update(1)
+        
+        if discover is not None:
+            links = self.iter_recipe_links(discover, refresh)
+        else:
+            links = self._links_to_scrape(refresh)
+        pipeline = Pipeline([
+            Stage('fetch', fetch, workers=fetch_workers, maxsize=queue_size, on_exit=quit_driver, 
+                  on_error=failed),
+            Stage('image', transfer_image, workers=image_workers, maxsize=queue_size, on_error=failed),
+            Stage('upload', upload, workers=upload_workers, maxsize=queue_size, on_error=failed),
+            #one writer keeps the shared RDS connection on a single thread
+            Stage('rds', write, workers=1, maxsize=queue_size, on_error=failed)
+        ])
+        with tqdm(total=len(links) if discover is None else None) as progress:
+            stage_stats = pipeline.run(links)
+        self._finish_scrape()
+        
+        return stage_stats
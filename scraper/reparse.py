@@ -0,0 +1,178 @@
+'''
+This file contains the offline re-parse of the raw HTML archive. Every
+archived recipe page is extracted again with recipe_parser in a
+multiprocessing pool, and the JSON, S3 and RDS outputs are rewritten in bulk,
+without loading any page from the BBC site:
+
+    python scraper/reparse.py --archive html_archive --processes 8
+    python scraper/reparse.py --shard-size 1000      # NDJSON shards instead of data.json files
+    python scraper/reparse.py --local-only           # only rewrite the local JSON
+'''
+
+import argparse
+import json
+import os
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+from lxml import etree
+from html_archive import HTMLArchive, read_page
+from rds_writer import RecipeWriter
+from recipe_parser import new_recipe_dict, parse_recipe
+from resilience import Resilience
+from shard_writer import ShardWriter
+from storage_credentials import get_s3_client, get_bucket_name, get_engine
+
+
+def parse_archived(page: tuple, json_ld: bool = False):
+    '''
+    Extracts the recipe from an archived page. This runs in the worker processes.
+
+    Parameters
+    ----------
+    page: tuple
+        (url, path, uuid, image_s3) as returned by HTMLArchive.pages
+    json_ld: bool
+        Read the JSON-LD Recipe block first, see recipe_parser.parse_recipe
+
+    Returns
+    -------
+    dict_recipe: dictionary
+        The recipe, keeping the UUID and image_s3 it was given when it was scraped.
+        Pages which cannot be read or parsed give an empty recipe.
+    '''
+    url, path, uuid, image_s3 = page
+    try:
+        dict_recipe = parse_recipe(read_page(path), url, json_ld=json_ld)
+    except (etree.ParserError, etree.XMLSyntaxError, ValueError, OSError, EOFError) as error:
+        #one broken page is counted as empty instead of stopping the re-parse
+        print(f'Failed to parse {url} ({error!r}).')
+        dict_recipe = new_recipe_dict()
+        dict_recipe['recipe_url'] = url
+        return dict_recipe
+    if uuid:
+        dict_recipe['uuid'] = uuid
+    if image_s3:
+        dict_recipe['image_s3'] = image_s3
+
+    return dict_recipe
+
+
+def reparse(archive: HTMLArchive, processes: int = None, chunksize: int = 16, json_ld: bool = False):
+    '''
+    Yields the recipe of every archived page, parsed in a pool of processes
+
+    Parameters
+    ----------
+    archive: HTMLArchive
+        The archive written by the scraper
+    processes: int
+        The number of worker processes, defaults to the number of CPUs
+    chunksize: int
+        Pages sent to a worker at a time
+    json_ld: bool
+        Read the JSON-LD Recipe block first, as --extraction-mode jsonld does
+    '''
+    with Pool(processes) as pool:
+        yield from pool.imap(partial(parse_archived, json_ld=json_ld), archive.pages(), chunksize=chunksize)
+
+
+def write_outputs(records, shard_writer=None, rds_writer=None, s3_client=None,
+                  bucket_name: str = None, upload_workers: int = 8, resilience=None):
+    '''
+    Writes re-parsed recipes as the scraper does: to shards or one data.json per recipe
+    uploaded to S3, and to RDS, replacing the previous outputs. The data.json uploads 
+    are retried by resilience, which defaults to Resilience().
+
+    Returns
+    -------
+    counts: dict
+        The number of recipes written and of pages without a recipe
+    '''
+    resilience = resilience if resilience is not None else Resilience()
+    counts = {'written': 0, 'empty': 0}
+    try:
+        with ThreadPoolExecutor(max_workers=upload_workers) as executor:
+            uploads = []
+            for dict_recipe in records:
+                if not dict_recipe['name']:
+                    counts['empty'] += 1
+                    continue
+                if shard_writer is not None:
+                    shard_writer.write(dict_recipe)
+                else:
+                    sku = dict_recipe['sku']
+                    filepath = f'raw_recipe_data/{sku}'
+                    os.makedirs(filepath, exist_ok=True)
+                    with open(f'{filepath}/data.json', 'w') as json_file:
+                        json.dump(dict_recipe, json_file)
+                    if s3_client is not None:
+                        uploads.append(executor.submit(
+                            resilience.call, f's3://{bucket_name}', s3_client.upload_file,
+                            f'{filepath}/data.json', bucket_name, f'{sku}_data.json'))
+                if rds_writer is not None:
+                    rds_writer.add(dict_recipe)
+                counts['written'] += 1
+            for upload in uploads:
+                upload.result()
+    finally:
+        #flush what was written, even if the re-parse stopped early
+        if shard_writer is not None:
+            shard_writer.close()
+        if rds_writer is not None:
+            rds_writer.close()
+
+    return counts
+
+
+def parse_args():
+    '''
+    Reads the command line options for the re-parse
+    '''
+    parser = argparse.ArgumentParser(description='Re-parse the raw HTML archive of the BBC recipe scraper')
+    parser.add_argument('--archive', default='html_archive',
+                        help='directory the scraper archived pages to (--archive-html)')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='processes parsing pages (0 uses one per CPU)')
+    parser.add_argument('--extraction-mode', choices=('xpath', 'jsonld'), default='xpath',
+                        help="'jsonld' reads each recipe's schema.org block before the XPaths")
+    parser.add_argument('--shard-size', type=int, default=0,
+                        help='write records to NDJSON shards of this many records (0 writes one data.json per recipe)')
+    parser.add_argument('--rds-batch-size', type=int, default=500,
+                        help='recipes written to RDS per statement')
+    parser.add_argument('--local-only', action='store_true',
+                        help='only rewrite the local JSON, not S3 or RDS')
+
+    return parser.parse_args()
+
+
+def main():
+    '''
+    Re-parses every archived page and rewrites the outputs
+    '''
+    args = parse_args()
+    archive = HTMLArchive(args.archive)
+    s3_client = None if args.local_only else get_s3_client()
+    resilience = Resilience()
+    shard_writer = None
+    if args.shard_size:
+        shard_writer = ShardWriter(max_records=args.shard_size, s3_client=s3_client,
+                                   bucket_name=get_bucket_name(), resilience=resilience)
+    rds_writer = None
+    if not args.local_only:
+        rds_writer = RecipeWriter(get_engine(), batch_size=args.rds_batch_size, replace=True)
+    start = time.perf_counter()
+    print(f'Re-parsing {len(archive)} archived pages.')
+    records = reparse(archive, args.processes or None, json_ld=args.extraction_mode == 'jsonld')
+    counts = write_outputs(records, shard_writer=shard_writer, rds_writer=rds_writer,
+                           s3_client=s3_client, bucket_name=get_bucket_name(), resilience=resilience)
+    elapsed = time.perf_counter() - start
+    print(f"{counts['written']} recipes rewritten, {counts['empty']} pages without a recipe, "
+          f"{elapsed:.1f}s ({counts['written'] / elapsed:.0f} recipes/s).")
+    archive.close()
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,285 @@
+'''
+This file contains the resilience layer shared by every network call the web
+scraper makes: Chrome page loads, HTTP fetches, image transfers and S3
+uploads. Resilience.call runs a call against a host with
+
+    - retries of transient errors (timeouts, dropped connections, 429 and 5xx)
+      after a jittered exponential backoff,
+    - a retry budget shared by the whole run, so an outage does not multiply
+      the load on the site by the number of retries,
+    - a circuit breaker per host, which stops calling a host after repeated
+      failures and lets one trial call through once reset_timeout has passed.
+
+Failures are classified by cause (failure_cause) and counted in a FailureLog,
+and the cause is stored with the failed link in the checkpoint or work queue,
+so failed links can be re-queued.
+'''
+
+import random
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import urlsplit
+import requests
+from botocore.exceptions import BotoCoreError, ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as S3ConnectionError
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from metrics import CALLS_RETRIED, FAILURES
+
+
+class CircuitOpenError(Exception):
+    '''
+    Raised instead of calling a host whose circuit breaker is open
+    '''
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f'{host} is paused after repeated failures, retry in {retry_in:.0f}s')
+        self.host = host
+        self.retry_in = retry_in
+
+
+class EmptyPageError(Exception):
+    '''
+    Raised when a page loaded but no recipe could be read from it
+    '''
+
+
+def is_transient(error: Exception):
+    '''
+    Checks whether a failed call is worth retrying: the host may answer next time
+    '''
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status == 429 or (status is not None and status >= 500)
+    if isinstance(error, ClientError):
+        response = error.response or {}
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+        return status >= 500 or response.get('Error', {}).get('Code') in (
+            'Throttling', 'SlowDown', 'RequestTimeout')
+    return isinstance(error, (requests.Timeout, requests.ConnectionError, TimeoutException,
+                              HTTPClientError, S3ConnectionError))
+
+
+def failure_cause(error: Exception):
+    '''
+    Returns a short, stable name for the cause of a failure, e.g. 'timeout' or 'http_503'
+    '''
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(error, EmptyPageError):
+        return 'empty_page'
+    if isinstance(error, (requests.Timeout, TimeoutException)):
+        return 'timeout'
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return f'http_{error.response.status_code}'
+    if isinstance(error, requests.ConnectionError):
+        return 'connection'
+    if isinstance(error, ClientError):
+        return f"s3_{(error.response or {}).get('Error', {}).get('Code', 'error')}"
+    if isinstance(error, BotoCoreError):
+        return 's3'
+    if isinstance(error, WebDriverException):
+        return 'webdriver'
+    return error.__class__.__name__
+
+
+class RetryBudget:
+    '''
+    Allows retries while they stay under minimum plus ratio of all calls made, e.g.
+    with ratio 0.2 at most one call in five is a retry once the minimum is used up
+    '''
+
+    def __init__(self, ratio: float = 0.2, minimum: int = 20):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.calls = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        '''
+        Counts a first attempt
+        '''
+        with self._lock:
+            self.calls += 1
+
+    def withdraw(self):
+        '''
+        Takes one retry from the budget, returns False if it is used up
+        '''
+        with self._lock:
+            if self.retries >= self.minimum + self.ratio * self.calls:
+                return False
+            self.retries += 1
+            return True
+
+
+class CircuitBreaker:
+    '''
+    Counts consecutive failures per host and opens the host's circuit after
+    failure_threshold of them. An open circuit lets one trial call through every
+    reset_timeout seconds, and closes again when a call succeeds.
+    '''
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        #host: [consecutive failures, time the circuit opened or was last tried]
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def check(self, host: str):
+        '''
+        Raises CircuitOpenError if host must not be called now
+        '''
+        with self._lock:
+            failures, opened = self._hosts.get(host, (0, 0))
+            if failures < self.failure_threshold:
+                return
+            waited = time.monotonic() - opened
+            if waited < self.reset_timeout:
+                raise CircuitOpenError(host, self.reset_timeout - waited)
+            #half open: this call is the trial, others wait for the next window
+            self._hosts[host][1] = time.monotonic()
+
+    def success(self, host: str):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def failure(self, host: str):
+        with self._lock:
+            state = self._hosts.setdefault(host, [0, 0])
+            state[0] += 1
+            if state[0] >= self.failure_threshold:
+                state[1] = time.monotonic()
+
+    def state(self, host: str):
+        '''
+        Returns 'closed', 'open' or 'half_open'
+        '''
+        with self._lock:
+            failures, opened = self._hosts.get(host, (0, 0))
+        if failures < self.failure_threshold:
+            return 'closed'
+        return 'open' if time.monotonic() - opened < self.reset_timeout else 'half_open'
+
+
+class Resilience:
+
+    def __init__(self, timeout: float = 20, retries: int = 3, backoff: float = 0.5,
+                 max_backoff: float = 30, retry_ratio: float = 0.2, min_retries: int = 20,
+                 failure_threshold: int = 5, reset_timeout: float = 60):
+        '''
+        Initialises the resilience policy shared by a run
+
+        Parameters
+        ----------
+        timeout: float
+            Seconds any single network call may take, used for page loads, HTTP
+            requests and image transfers
+        retries: int
+            The most times a call is retried after a transient error
+        backoff: float
+            The first retry waits up to this many seconds, doubling for every retry
+        max_backoff: float
+            The longest wait before a retry
+        retry_ratio: float
+            The share of all calls which may be retries, see RetryBudget
+        min_retries: int
+            Retries allowed before retry_ratio applies
+        failure_threshold: int
+            Consecutive failures after which a host is paused
+        reset_timeout: float
+            Seconds a paused host is left alone before a trial call
+        '''
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = RetryBudget(retry_ratio, min_retries)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+
+    def backoff_delay(self, attempt: int):
+        '''
+        Returns the wait before retry number attempt + 1, with full jitter so retries
+        from many threads do not arrive together
+        '''
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+    def call(self, url: str, function, *args, **kwargs):
+        '''
+        Calls function(*args, **kwargs) as a call to the host of url, retrying
+        transient errors within the retry budget
+
+        Raises CircuitOpenError if the host is paused, otherwise the last error once
+        the call is not retried any more.
+        '''
+        host = urlsplit(url).netloc or url
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            self.breaker.check(host)
+            try:
+                result = function(*args, **kwargs)
+            except Exception as error:
+                if not is_transient(error):
+                    #e.g. a 404 or a parse error, which says nothing about the host's health
+                    raise
+                self.breaker.failure(host)
+                if attempt >= self.retries or not self.budget.withdraw():
+                    raise
+                CALLS_RETRIED.labels(host=host).inc()
+                time.sleep(self.backoff_delay(attempt))
+                attempt += 1
+                continue
+            self.breaker.success(host)
+            return result
+
+
+class FailureLog:
+    '''
+    Records failed links and calls with the cause of each failure. Every failure
+    is counted, the details of only the latest max_failures are kept.
+    '''
+
+    def __init__(self, max_failures: int = 10000):
+        self.causes = Counter()
+        self.failures = deque(maxlen=max_failures)
+        self._lock = threading.Lock()
+
+    def record(self, url: str, error: Exception, stage: str = 'page'):
+        '''
+        Records a failure
+
+        Returns
+        -------
+        reason: str
+            The cause and the error, to store with the failed link
+        '''
+        cause = failure_cause(error)
+        reason = f'{cause}: {error!r}'
+        FAILURES.labels(stage=stage, cause=cause).inc()
+        with self._lock:
+            self.causes[(stage, cause)] += 1
+            self.failures.append({'url': url, 'stage': stage, 'cause': cause, 'error': repr(error)})
+
+        return reason
+
+    def urls(self, stage: str = 'page', causes=None):
+        '''
+        Returns the failed URLs of a stage, optionally only those failed with causes,
+        e.g. to re-queue links which timed out
+        '''
+        with self._lock:
+            return list(dict.fromkeys(failure['url'] for failure in self.failures
+                                      if failure['stage'] == stage
+                                      and (causes is None or failure['cause'] in causes)))
+
+    def summary(self):
+        '''
+        Returns the number of failures by stage and cause
+        '''
+        with self._lock:
+            return {f'{stage}/{cause}': count for (stage, cause), count in self.causes.most_common()}
@@ -0,0 +1,248 @@
+'''
+This file contains the persistent HTTP response cache used by the fetch
+layer. Pages fetched by HTTPFetcher are kept on disk between runs, keyed by
+their canonical URL, so a page which has not changed is not downloaded again:
+
+    - a page younger than the TTL of its page type is read from disk without
+      any request,
+    - an older page is revalidated with If-None-Match / If-Modified-Since and
+      costs a 304 response if it has not changed.
+
+Bodies are stored gzip compressed and named by the SHA-256 of their content,
+so pages with identical bodies share one file. The cache is held under a size
+cap by evicting the least recently used pages.
+
+    {directory}/index.db                  URL, body hash, validators and times
+    {directory}/bodies/ab/ab12....html.gz  compressed page bodies
+'''
+
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from frontier import canonicalize
+from metrics import CACHE_REQUESTS
+
+
+#seconds a cached page is used without revalidating it, by page type
+DEFAULT_TTLS = {'category': 24 * 3600, 'recipe': 7 * 24 * 3600, 'other': 3600}
+
+CATEGORY_RE = re.compile(r'/food/recipes/a-z/')
+RECIPE_RE = re.compile(r'/food/recipes/[^/]+$')
+
+
+def page_type(url: str):
+    '''
+    Returns 'category' for A-Z category pages, 'recipe' for recipe pages and 'other'
+    for everything else
+    '''
+    if CATEGORY_RE.search(url):
+        return 'category'
+    if RECIPE_RE.search(url):
+        return 'recipe'
+    return 'other'
+
+
+class CacheEntry:
+    '''
+    A cached page
+    '''
+
+    __slots__ = ('url', 'text', 'etag', 'last_modified', 'fresh')
+
+    def __init__(self, url: str, text: str, etag: str, last_modified: str, fresh: bool):
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+
+    def validators(self):
+        '''
+        Returns the request headers which ask the server whether the page changed
+        '''
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+
+    def __init__(self, directory: str = 'http_cache', max_bytes: int = 500 * 2 ** 20,
+                 ttls: dict = None):
+        '''
+        Opens (or creates) the cache
+
+        Parameters
+        ----------
+        directory: str
+            Where the index and the compressed bodies are stored
+        max_bytes: int
+            The most compressed bytes kept, least recently used pages are evicted
+            beyond it
+        ttls: dict
+            Seconds a page of each type ('category', 'recipe', 'other') is used without
+            revalidation, merged into DEFAULT_TTLS. 0 always revalidates.
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        with self.connection:
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    body_hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored REAL NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed);
+                CREATE INDEX IF NOT EXISTS pages_body_hash ON pages (body_hash);
+            ''')
+
+
+    def _path(self, body_hash: str):
+        return os.path.join(self.directory, 'bodies', body_hash[:2], f'{body_hash}.html.gz')
+
+
+    def get(self, url: str):
+        '''
+        Looks a page up
+
+        Returns
+        -------
+        entry: CacheEntry
+            The cached page, whose fresh attribute tells whether it can be used without
+            revalidation, or None if the page is not cached
+        '''
+        url = canonicalize(url)
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT body_hash, etag, last_modified, stored FROM pages WHERE url = ?',
+                (url,)).fetchone()
+        if row is None:
+            return None
+        body_hash, etag, last_modified, stored = row
+        try:
+            with gzip.open(self._path(body_hash), 'rt', encoding='utf-8') as body:
+                text = body.read()
+        except (OSError, EOFError):
+            #the body file was removed or is damaged
+            with self._lock, self.connection:
+                self.connection.execute('DELETE FROM pages WHERE url = ?', (url,))
+            return None
+        fresh = time.time() - stored < self.ttls[page_type(url)]
+        with self._lock, self.connection:
+            self.connection.execute('UPDATE pages SET accessed = ? WHERE url = ?', (time.time(), url))
+            if fresh:
+                self.hits += 1
+        if fresh:
+            CACHE_REQUESTS.labels(result='hit').inc()
+
+        return CacheEntry(url, text, etag, last_modified, fresh)
+
+
+    def refresh(self, url: str):
+        '''
+        Restarts the TTL of a page the server reported as not modified
+        '''
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.execute('UPDATE pages SET stored = ?, accessed = ? WHERE url = ?',
+                                    (now, now, canonicalize(url)))
+            self.revalidated += 1
+        CACHE_REQUESTS.labels(result='revalidated').inc()
+
+
+    def put(self, url: str, text: str, etag: str = None, last_modified: str = None):
+        '''
+        Stores a page downloaded from the server, evicting pages if the cache is over
+        max_bytes
+        '''
+        body = text.encode('utf-8')
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            #write then rename, so readers never see a partial body
+            temporary = f'{path}.{threading.get_ident()}.tmp'
+            with gzip.open(temporary, 'wb') as handler:
+                handler.write(body)
+            os.replace(temporary, path)
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO pages (url, body_hash, size, etag, last_modified, stored, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET '
+                'body_hash = excluded.body_hash, size = excluded.size, etag = excluded.etag, '
+                'last_modified = excluded.last_modified, stored = excluded.stored, '
+                'accessed = excluded.accessed',
+                (canonicalize(url), body_hash, os.path.getsize(path), etag, last_modified, now, now))
+            self.misses += 1
+        CACHE_REQUESTS.labels(result='miss').inc()
+        self._evict()
+
+
+    def size(self):
+        '''
+        Returns the compressed bytes stored, counting shared bodies once
+        '''
+        with self._lock:
+            return self.connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM '
+                '(SELECT MAX(size) AS size FROM pages GROUP BY body_hash)').fetchone()[0]
+
+
+    def _evict(self):
+        '''
+        Removes least recently used pages until the cache is within max_bytes
+        '''
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+        with self._lock, self.connection:
+            rows = self.connection.execute('SELECT url, body_hash, size FROM pages ORDER BY accessed')
+            for url, body_hash, size in rows.fetchall():
+                if excess <= 0:
+                    break
+                self.connection.execute('DELETE FROM pages WHERE url = ?', (url,))
+                shared = self.connection.execute(
+                    'SELECT 1 FROM pages WHERE body_hash = ? LIMIT 1', (body_hash,)).fetchone()
+                if shared is None:
+                    try:
+                        os.remove(self._path(body_hash))
+                    except FileNotFoundError:
+                        pass
+                    excess -= size
+
+
+    def stats(self):
+        '''
+        Returns the cache counters for this run
+        '''
+        with self._lock:
+            pages = self.connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        return {'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses,
+                'pages': pages, 'bytes': self.size()}
+
+
+    def close(self):
+        '''
+        Closes the index
+        '''
+        self.connection.close()
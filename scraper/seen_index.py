@@ -0,0 +1,101 @@
+'''
+This file contains the index of recipe URLs which have already been scraped.
+It is loaded once at startup from the recipe_data table in RDS and/or a local
+manifest file, so recipes from previous runs are skipped before any page is
+opened.
+'''
+
+import os
+import threading
+from sqlalchemy import inspect, text
+
+
+class SeenIndex:
+
+    def __init__(self, urls=(), manifest_path: str = None):
+        '''
+        Initialises the index
+
+        Parameters
+        ----------
+        urls: iterable
+            Recipe URLs which have already been scraped
+        manifest_path: str
+            A text file with one scraped recipe URL per line. URLs already in the file
+            are loaded, and URLs scraped in this run are appended to it.
+        '''
+        self.urls = set(urls)
+        self.manifest_path = manifest_path
+        self._manifest = None
+        self._lock = threading.Lock()
+        if manifest_path and os.path.isfile(manifest_path):
+            with open(manifest_path) as manifest:
+                self.urls.update(line.strip() for line in manifest if line.strip())
+
+
+    @classmethod
+    def load(cls, engine=None, manifest_path: str = None, table: str = 'recipe_data'):
+        '''
+        Loads every recipe_url already stored in RDS and/or the local manifest
+
+        Parameters
+        ----------
+        engine: sqlalchemy Engine
+            The database holding the recipe table, or None to only use the manifest
+        manifest_path: str
+            The local manifest file
+        table: str
+            The table recipes are stored in
+
+        Returns
+        -------
+        seen_index: SeenIndex
+        '''
+        urls = []
+        if engine is not None and inspect(engine).has_table(table):
+            with engine.connect() as connection:
+                urls = [row[0] for row in connection.execute(text(f'SELECT recipe_url FROM {table}'))]
+        seen_index = cls(urls, manifest_path)
+        print(f'{len(seen_index)} recipe urls already scraped.')
+
+        return seen_index
+
+
+    def __contains__(self, url):
+        return url in self.urls
+
+
+    def __len__(self):
+        return len(self.urls)
+
+
+    def filter(self, links: list):
+        '''
+        Returns the links which have not been scraped, keeping their order
+        '''
+        return [link for link in links if link not in self.urls]
+
+
+    def add(self, url: str):
+        '''
+        Records a scraped recipe URL and appends it to the manifest
+        '''
+        with self._lock:
+            if url in self.urls:
+                return
+            self.urls.add(url)
+            if self.manifest_path:
+                if self._manifest is None:
+                    self._manifest = open(self.manifest_path, 'a')
+                self._manifest.write(url + '\n')
+                self._manifest.flush()
+
+
+    def close(self):
+        '''
+        Closes the manifest file
+        '''
+        with self._lock:
+            if self._manifest is not None:
+                self._manifest.close()
+                self._manifest = None
@@ -0,0 +1,259 @@
+'''
+This file contains the sharded output writer used by the web scraper.
+Instead of one data.json directory and one S3 object per recipe, records are
+appended to rolling NDJSON shards which rotate by record count or size.
+Each completed shard is listed in a manifest and uploaded in one call, so
+consumers can read new data incrementally. A shard stays pending in the
+manifest until its upload succeeds and is uploaded again later otherwise. The
+recipe URLs of a shard are only reported done (on_complete) once it is
+complete, so records in an open shard or a failed upload are scraped again.
+'''
+
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from botocore.exceptions import BotoCoreError, ClientError
+from metrics import S3_UPLOAD_SECONDS
+from resilience import CircuitOpenError, Resilience
+
+
+class ShardWriter:
+
+    def __init__(self, directory: str = 'raw_recipe_data/shards', prefix: str = 'recipes',
+                 max_records: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 s3_client=None, bucket_name: str = None, key_prefix: str = 'shards/',
+                 compress: bool = True, resilience=None, on_complete=None):
+        '''
+        Initialises the shard writer
+
+        Parameters
+        ----------
+        directory: str
+            Local directory shards and the manifest are written to
+        prefix: str
+            The start of every shard file name
+        max_records: int
+            Rotate to a new shard after this many records
+        max_bytes: int
+            Rotate to a new shard once it holds this many bytes of (uncompressed) JSON
+        s3_client: boto3 S3 client
+            If given, each completed shard and the manifest are uploaded to bucket_name
+        bucket_name: str
+            The bucket shards are uploaded to
+        key_prefix: str
+            The S3 key prefix for shards and the manifest
+        compress: bool
+            Write gzip compressed shards (.ndjson.gz)
+        resilience: resilience.Resilience
+            The retries and circuit breaker used for uploads. Defaults to Resilience().
+        on_complete: callable
+            Called with the recipe URLs of each shard once it is complete: written 
+            and, with an s3_client, uploaded
+        '''
+        self.directory = directory
+        self.prefix = prefix
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key_prefix = key_prefix
+        self.compress = compress
+        self.resilience = resilience if resilience is not None else Resilience()
+        self.on_complete = on_complete
+        self.records_written = 0
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.manifest = self._load_manifest()
+        #guards the open shard and the manifest, uploads run outside it
+        self._lock = threading.Lock()
+        #one thread uploads pending shards at a time
+        self._upload_lock = threading.Lock()
+        self._shard = None
+        #recipe URLs of shards whose upload failed in this run, by shard name
+        self._pending_urls = {}
+        os.makedirs(directory, exist_ok=True)
+
+
+    def _load_manifest(self):
+        '''
+        Loads the manifest of completed shards from previous runs
+        '''
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path) as manifest:
+                return json.load(manifest)
+        return {'shards': []}
+
+
+    def _open_shard(self):
+        '''
+        Opens a new shard file named by its creation time
+        '''
+        created = datetime.now(timezone.utc)
+        extension = '.ndjson.gz' if self.compress else '.ndjson'
+        name = f'{self.prefix}-{created:%Y%m%dT%H%M%S%f}{extension}'
+        path = os.path.join(self.directory, name)
+        handle = gzip.open(path, 'wt', encoding='utf-8') if self.compress else open(path, 'w', encoding='utf-8')
+        self._shard = {'name': name, 'path': path, 'handle': handle, 'records': 0,
+                       'bytes': 0, 'created': created.isoformat(), 'urls': []}
+
+
+    def write(self, dict_recipe: dict):
+        '''
+        Appends a recipe record to the current shard, rotating it if it is full
+        '''
+        line = json.dumps(dict_recipe) + '\n'
+        with self._lock:
+            if self._shard is None:
+                self._open_shard()
+            self._shard['handle'].write(line)
+            self._shard['records'] += 1
+            self._shard['bytes'] += len(line)
+            self._shard['urls'].append(dict_recipe.get('recipe_url'))
+            self.records_written += 1
+            full = (self._shard['records'] >= self.max_records
+                    or self._shard['bytes'] >= self.max_bytes)
+            if full:
+                self._rotate()
+        if full:
+            self._upload_pending()
+
+
+    def _rotate(self):
+        '''
+        Closes the current shard and adds it to the manifest as pending, called with 
+        the lock held. The caller uploads it with _upload_pending once it is released.
+        '''
+        shard, self._shard = self._shard, None
+        shard['handle'].close()
+        entry = {
+            'name': shard['name'],
+            'records': shard['records'],
+            'bytes': os.path.getsize(shard['path']),
+            'created': shard['created'],
+            'completed': datetime.now(timezone.utc).isoformat()
+        }
+        self._pending_urls[shard['name']] = shard['urls']
+        if self.s3_client is not None:
+            entry['key'] = self.key_prefix + shard['name']
+            entry['uploaded'] = False
+        self.manifest['shards'].append(entry)
+        self._write_manifest()
+
+
+    def _upload(self, path: str, key: str):
+        self.resilience.call(f's3://{self.bucket_name}', self.s3_client.upload_file,
+                             path, self.bucket_name, key)
+
+
+    def _upload_pending(self):
+        '''
+        Uploads every shard in the manifest which is not uploaded yet, including those 
+        of earlier runs, then the manifest, and reports the shards which are complete
+        '''
+        with self._upload_lock:
+            with self._lock:
+                pending = [entry for entry in self.manifest['shards'] if not entry.get('uploaded', True)]
+            completed = []
+            if self.s3_client is not None:
+                for entry in pending:
+                    try:
+                        with S3_UPLOAD_SECONDS.labels(kind='shard').time():
+                            self._upload(os.path.join(self.directory, entry['name']), entry['key'])
+                    except (BotoCoreError, ClientError, CircuitOpenError, OSError) as error:
+                        #kept pending, the next rotation or run uploads it
+                        print(f"Shard {entry['name']} was not uploaded: {error!r}")
+                        continue
+                    completed.append(entry)
+            with self._lock:
+                for entry in completed:
+                    entry['uploaded'] = True
+                self._write_manifest()
+                names = [entry['name'] for entry in completed] if self.s3_client is not None \
+                    else list(self._pending_urls)
+                completed_urls = [self._pending_urls.pop(name, []) for name in names]
+            self._upload_manifest()
+        for urls in completed_urls:
+            if self.on_complete is not None and urls:
+                self.on_complete(urls)
+
+
+    def _write_manifest(self):
+        '''
+        Writes the manifest atomically, called with the lock held
+        '''
+        self.manifest['updated'] = datetime.now(timezone.utc).isoformat()
+        self.manifest['records'] = sum(entry['records'] for entry in self.manifest['shards'])
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as manifest:
+            json.dump(self.manifest, manifest, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+
+    def _upload_manifest(self):
+        '''
+        Uploads the local manifest
+        '''
+        if self.s3_client is None:
+            return
+        try:
+            self._upload(self.manifest_path, self.key_prefix + 'manifest.json')
+        except (BotoCoreError, ClientError, CircuitOpenError, OSError) as error:
+            #the local manifest is complete, it is uploaded again after the next shard
+            print(f'Shard manifest was not uploaded: {error!r}')
+
+
+    def complete_shard(self):
+        '''
+        Completes the current shard now, instead of when it is full
+        '''
+        with self._lock:
+            rotated = self._shard is not None and self._shard['records']
+            if rotated:
+                self._rotate()
+        if rotated:
+            self._upload_pending()
+
+
+    def pending(self):
+        '''
+        Returns the names of shards in the manifest which are not uploaded yet
+        '''
+        with self._lock:
+            return [entry['name'] for entry in self.manifest['shards'] if not entry.get('uploaded', True)]
+
+
+    def incomplete(self, urls: list):
+        '''
+        Returns the urls whose records are in the open shard or a shard of this run 
+        which is not uploaded yet, pending shards of earlier runs are not checked
+        '''
+        with self._lock:
+            waiting = {url for shard_urls in self._pending_urls.values() for url in shard_urls}
+            if self._shard is not None:
+                waiting.update(self._shard['urls'])
+        return [url for url in urls if url in waiting]
+
+
+    def close(self):
+        '''
+        Completes the current shard and retries pending uploads, called at the end of 
+        a run
+        '''
+        with self._lock:
+            if self._shard is not None and self._shard['records']:
+                self._rotate()
+            elif self._shard is not None:
+                self._shard['handle'].close()
+                os.remove(self._shard['path'])
+                self._shard = None
+        if self.pending() or self._pending_urls:
+            self._upload_pending()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,43 +1,151 @@
 '''
-This file contains the data storage credentials to connect to AWS s3 bucket 
-and RDS inside the web scraper. Credentials can be adjusted in this config 
+This file contains the data storage credentials to connect to AWS s3 bucket
+and RDS inside the web scraper. Credentials can be adjusted in this config
 file so no editing is required in the recipe_scraper script.
+
+Nothing connects when this module is imported. The s3 client and the pooled
+RDS engine are created on first use by get_s3_client and get_engine, and are
+shared by all threads. Both can be pointed at local stand-ins (e.g. a local
+S3 emulator or SQLite) with environment variables or configure().
 '''
 
+import os
+import threading
 import boto3
+from botocore.config import Config
 from sqlalchemy import create_engine
-from secrets import(access_key_id,
-                    secret_access_key,
-                    region,
-                    bucket_name,
-                    bucket_link,
-                    database_type,
-                    dbapi, 
-                    endpoint,
-                    user,
-                    database,
-                    password,
-                    port)
-
-#connect to s3 bucket
-s3_client = boto3.client('s3', 
-                    aws_access_key_id=access_key_id, 
-                    aws_secret_access_key=secret_access_key, 
-                    region_name=region)
-
-#s3 bucket credentials
-s3_bucket_name = bucket_name
-s3_bucket_link = bucket_link
-
-#RDS database credentials
-DATABASE_TYPE = database_type
-DBAPI = dbapi
-ENDPOINT = endpoint
-USER = user
-PASSWORD = password
-DATABASE = database
-PORT = port
-
-# connect to RDS
-engine = create_engine(f"{DATABASE_TYPE}+{DBAPI}://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DATABASE}").connect() 
 
+
+#names read from the local secrets.py file
+SECRET_NAMES = ('access_key_id', 'secret_access_key', 'region', 'bucket_name', 'bucket_link',
+                'database_type', 'dbapi', 'endpoint', 'user', 'database', 'password', 'port')
+
+_lock = threading.Lock()
+_settings = {}
+_s3_client = None
+_engine = None
+
+
+def _secrets():
+    '''
+    Reads the credentials in secrets.py, missing values are None
+    '''
+    import secrets
+    return {name: getattr(secrets, name, None) for name in SECRET_NAMES}
+
+
+def _setting(name: str):
+    '''
+    Returns a storage setting: a value passed to configure(), then an environment
+    variable, then secrets.py
+    '''
+    if name in _settings:
+        return _settings[name]
+    env_value = os.environ.get(name.upper())
+    if env_value is not None:
+        return env_value
+    return _secrets().get(name)
+
+
+def configure(**settings):
+    '''
+    Overrides storage settings before first use and drops any handles already created
+
+    Accepts any of the secrets.py names, plus s3_endpoint_url, s3_max_pool_connections,
+    s3_connect_timeout, s3_read_timeout, database_url, db_pool_size and db_max_overflow.
+    A ready-made client or engine can be passed as s3_client or engine.
+    '''
+    global _s3_client, _engine
+    with _lock:
+        _s3_client = settings.pop('s3_client', None)
+        if _engine is not None and settings.get('engine') is not _engine:
+            _engine.dispose()
+        _engine = settings.pop('engine', None)
+        _settings.update(settings)
+
+
+def get_s3_client():
+    '''
+    Returns the shared s3 client, creating it on first use
+
+    The client's connection pool size is set by s3_max_pool_connections (default 20),
+    its timeouts by s3_connect_timeout (default 10 seconds) and s3_read_timeout (default 
+    60 seconds), and s3_endpoint_url points it at a local S3 emulator.
+    '''
+    global _s3_client
+    if _s3_client is None:
+        with _lock:
+            if _s3_client is None:
+                pool_size = int(_setting('s3_max_pool_connections') or 20)
+                _s3_client = boto3.client(
+                    's3',
+                    aws_access_key_id=_setting('access_key_id'),
+                    aws_secret_access_key=_setting('secret_access_key'),
+                    region_name=_setting('region'),
+                    endpoint_url=_setting('s3_endpoint_url'),
+                    config=Config(max_pool_connections=pool_size,
+                                  connect_timeout=float(_setting('s3_connect_timeout') or 10),
+                                  read_timeout=float(_setting('s3_read_timeout') or 60)))
+
+    return _s3_client
+
+
+def get_bucket_name():
+    '''
+    Returns the name of the s3 bucket
+    '''
+    return _setting('bucket_name')
+
+
+def get_bucket_link():
+    '''
+    Returns the public URL prefix of the s3 bucket
+    '''
+    return _setting('bucket_link')
+
+
+def database_url():
+    '''
+    Returns the database URL, either database_url or one built from the RDS credentials
+    '''
+    url = _setting('database_url')
+    if url:
+        return url
+    return (f"{_setting('database_type')}+{_setting('dbapi')}://{_setting('user')}:"
+            f"{_setting('password')}@{_setting('endpoint')}:{_setting('port')}/{_setting('database')}")
+
+
+def get_engine():
+    '''
+    Returns the shared, pooled database engine, creating it on first use
+
+    Connections are checked with a pre-ping before use, so connections dropped by RDS
+    are replaced instead of failing a write.
+    '''
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                url = database_url()
+                options = {'pool_pre_ping': True}
+                if not url.startswith('sqlite'):
+                    options['pool_size'] = int(_setting('db_pool_size') or 5)
+                    options['max_overflow'] = int(_setting('db_max_overflow') or 10)
+                _engine = create_engine(url, **options)
+
+    return _engine
+
+
+def __getattr__(name: str):
+    '''
+    Keeps the original module attributes working, created on first access
+    '''
+    if name == 's3_client':
+        return get_s3_client()
+    if name == 'engine':
+        return get_engine()
+    if name == 's3_bucket_name':
+        return get_bucket_name()
+    if name == 's3_bucket_link':
+        return get_bucket_link()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,125 @@
+'''
+This file contains the wait engine used by the web scraper. Instead of
+sleeping for a fixed time after every page load or click, the scraper waits
+for an element the next step needs to be present, up to a timeout. Delays
+between requests, which keep the crawl polite to the BBC site, are set by a
+RatePolicy instead of being hidden in sleeps (or per host, adapting to the
+site's responses, by rate_limiter.RateLimiter).
+'''
+
+import random
+import threading
+import time
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+
+#elements which show a page is ready to be read
+AZ_KEYBOARD = (By.XPATH, '//*[@class="az-keyboard__list"]/li')
+PROMO_COLLECTION = (By.XPATH, '//*[@class="gel-wrap promo-collection__container az-page"]/div')
+RECIPE_TITLE = (By.XPATH, '//h1[@class="gel-trafalgar content-title__text"]')
+COOKIES_BUTTON = (By.XPATH, '//*[@id="bbccookies-continue-button"]')
+
+
+def wait_for(driver, locator: tuple, timeout: float = 10, condition=EC.presence_of_element_located,
+             poll_frequency: float = 0.1):
+    '''
+    Waits until the element at locator meets condition
+
+    Parameters
+    ----------
+    driver: webdriver.Chrome
+        The driver showing the page
+    locator: tuple
+        A (By, selector) pair, e.g. RECIPE_TITLE
+    timeout: float
+        The most seconds to wait
+    condition: callable
+        An expected_conditions factory taking the locator
+
+    Returns
+    -------
+    element: WebElement
+        The element, or None if the condition was not met within timeout
+    '''
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(condition(locator))
+    except TimeoutException:
+        return None
+
+
+def wait_for_replaced(driver, element, locator: tuple, timeout: float = 10,
+                      poll_frequency: float = 0.1):
+    '''
+    Waits until element has been removed from the page, e.g. after clicking a link, and
+    the element at locator is present on the new page
+
+    Returns
+    -------
+    element: WebElement
+        The new element, or None if the page did not change within timeout
+    '''
+    deadline = time.monotonic() + timeout
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(EC.staleness_of(element))
+    except TimeoutException:
+        return None
+
+    return wait_for(driver, locator, max(deadline - time.monotonic(), 0), poll_frequency=poll_frequency)
+
+
+class RatePolicy:
+
+    def __init__(self, min_interval: float = 1.0, jitter: float = 0.0):
+        '''
+        Initialises the politeness delay between page requests
+
+        Parameters
+        ----------
+        min_interval: float
+            The fewest seconds between two page requests, shared by every thread and
+            driver using the policy. 0 requests pages as fast as they load.
+        jitter: float
+            Up to this many random seconds added to each interval
+        '''
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._next_request = 0
+
+
+    def wait(self, url: str = None):
+        '''
+        Blocks until the next page request is allowed
+
+        Parameters
+        ----------
+        url: str
+            The page about to be requested
+
+        Returns
+        -------
+        delay: float
+            The seconds spent waiting
+        '''
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request)
+            #reserve a slot, so concurrent callers are spaced out
+            self._next_request = start + self.min_interval + random.uniform(0, self.jitter)
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+        return delay
+
+
+    def observe(self, url: str, status: int = None, latency: float = None, retry_after: str = None,
+                browser: bool = False):
+        '''
+        Receives the outcome of a page request. The fixed delay does not adapt to it,
+        see rate_limiter.RateLimiter.
+        '''
+        return
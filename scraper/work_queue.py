@@ -0,0 +1,250 @@
+'''
+This file contains the shared work queue used to run the web scraper on
+several machines. A coordinator publishes discovered recipe URLs into a
+queue table in the existing PostgreSQL database, and any number of workers
+claim batches of URLs, scrape them and acknowledge them.
+
+Claimed URLs are leased: a worker owns them until the lease expires, after
+which another worker can claim them again, so URLs held by a crashed worker
+are not lost. Each claim has its own lease token, which acknowledgements and
+renewals must match, so a late ack never touches a newer lease. Workers
+renew their leases while they are still scraping a batch. On PostgreSQL batches are claimed with FOR UPDATE SKIP LOCKED,
+so concurrent workers never block each other or claim the same URL.
+'''
+
+import os
+import socket
+import time
+import uuid
+from sqlalchemy import bindparam, text
+
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class WorkQueue:
+
+    def __init__(self, engine, table: str = 'crawl_queue', lease_seconds: float = 600,
+                 max_attempts: int = 3, owner: str = None):
+        '''
+        Initialises the queue and creates its table if it does not exist
+
+        Parameters
+        ----------
+        engine: sqlalchemy Engine
+            The shared database, RDS PostgreSQL or SQLite for a single machine
+        table: str
+            The queue table
+        lease_seconds: float
+            How long a claimed URL belongs to the worker before it can be reclaimed
+        max_attempts: int
+            How many times a URL is claimed before it is marked failed
+        owner: str
+            The name of this worker, defaults to the host name and process id
+        '''
+        self.engine = engine
+        self.table = table
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = owner or f'{socket.gethostname()}-{os.getpid()}'
+        #the lease token of each URL this worker has claimed
+        self._tokens = {}
+        self.create_table()
+
+
+    def create_table(self):
+        '''
+        Creates the queue table and its status index if they do not exist
+        '''
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                f'url TEXT PRIMARY KEY, '
+                f'status TEXT NOT NULL, '
+                f'attempts INTEGER NOT NULL DEFAULT 0, '
+                f'lease_owner TEXT, '
+                f'lease_token TEXT, '
+                f'lease_expires DOUBLE PRECISION, '
+                f'error TEXT, '
+                f'published DOUBLE PRECISION NOT NULL, '
+                f'updated DOUBLE PRECISION NOT NULL)'))
+            connection.execute(text(
+                f'CREATE INDEX IF NOT EXISTS {self.table}_status_idx '
+                f'ON {self.table} (status, published)'))
+
+
+    def publish(self, urls):
+        '''
+        Adds URLs to the queue, URLs which are already queued are left as they are
+
+        Returns
+        -------
+        urls: int
+            The number of URLs sent to the queue
+        '''
+        now = time.time()
+        rows = [{'url': url, 'status': PENDING, 'now': now + index * 1e-6}
+                for index, url in enumerate(dict.fromkeys(urls))]
+        if not rows:
+            return 0
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                f'INSERT INTO {self.table} (url, status, attempts, published, updated) '
+                f'VALUES (:url, :status, 0, :now, :now) ON CONFLICT (url) DO NOTHING'), rows)
+
+        return len(rows)
+
+
+    def claim(self, limit: int = 10):
+        '''
+        Leases up to limit URLs to this worker, in the order they were published.
+        Pending URLs and URLs whose lease has expired can be claimed.
+
+        Returns
+        -------
+        urls: list
+            The claimed URLs, empty if there is nothing to claim
+        '''
+        now = time.time()
+        token = uuid.uuid4().hex
+        claimable = ("(status = :pending OR (status = :leased AND lease_expires < :now)) "
+                     "AND attempts < :max_attempts")
+        #other workers skip rows locked by this claim instead of waiting for it
+        lock = ' FOR UPDATE SKIP LOCKED' if self.engine.dialect.name == 'postgresql' else ''
+        params = {'pending': PENDING, 'leased': LEASED, 'now': now, 'limit': limit,
+                  'max_attempts': self.max_attempts, 'owner': self.owner, 'token': token,
+                  'expires': now + self.lease_seconds}
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                f'UPDATE {self.table} SET status = :leased, lease_owner = :owner, '
+                f'lease_token = :token, lease_expires = :expires, attempts = attempts + 1, '
+                f'updated = :now '
+                f'WHERE url IN (SELECT url FROM {self.table} WHERE {claimable} '
+                f'ORDER BY published LIMIT :limit{lock}) AND {claimable}'), params)
+            #the token identifies exactly the rows this claim updated
+            rows = connection.execute(text(
+                f'SELECT url FROM {self.table} WHERE lease_token = :token ORDER BY published'),
+                {'token': token})
+            urls = [row[0] for row in rows]
+        self._tokens.update(dict.fromkeys(urls, token))
+
+        return urls
+
+
+    def _by_token(self, urls, release: bool = False):
+        '''
+        Groups claimed URLs by the token of the claim which leased them
+
+        Returns
+        -------
+        leases: dict
+            The URLs of each lease token, URLs this worker did not claim are left out
+        '''
+        leases = {}
+        for url in urls:
+            token = self._tokens.pop(url, None) if release else self._tokens.get(url)
+            if token is not None:
+                leases.setdefault(token, []).append(url)
+        return leases
+
+
+    def renew(self, urls, lease_seconds: float = None):
+        '''
+        Extends the leases of URLs this worker is still scraping, so they are not
+        reclaimed during a long batch
+
+        Returns
+        -------
+        urls: int
+            The number of leases renewed, leases which already expired and were claimed
+            by another worker are not
+        '''
+        expires = time.time() + (lease_seconds or self.lease_seconds)
+        renewed = 0
+        with self.engine.begin() as connection:
+            for token, leased in self._by_token(urls).items():
+                result = connection.execute(text(
+                    f'UPDATE {self.table} SET lease_expires = :expires '
+                    f'WHERE url IN :urls AND lease_token = :token AND status = :leased'
+                ).bindparams(bindparam('urls', expanding=True)),
+                    {'expires': expires, 'urls': leased, 'token': token, 'leased': LEASED})
+                renewed += result.rowcount
+
+        return renewed
+
+
+    def ack(self, urls):
+        '''
+        Marks URLs scraped by this worker as done, if they are still leased by the 
+        claim which returned them
+        '''
+        leases = self._by_token(urls, release=True)
+        if not leases:
+            return
+        with self.engine.begin() as connection:
+            for token, leased in leases.items():
+                connection.execute(text(
+                    f'UPDATE {self.table} SET status = :done, lease_token = NULL, error = NULL, '
+                    f'updated = :now WHERE url IN :urls AND lease_token = :token'
+                ).bindparams(bindparam('urls', expanding=True)),
+                    {'done': DONE, 'now': time.time(), 'urls': leased, 'token': token})
+
+
+    def fail(self, url: str, error: str = None):
+        '''
+        Releases a URL this worker could not scrape, so it is retried until it has been
+        claimed max_attempts times and then marked failed
+        '''
+        token = self._tokens.pop(url, None)
+        if token is None:
+            return
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                f'UPDATE {self.table} SET status = CASE WHEN attempts >= :max_attempts '
+                f'THEN :failed ELSE :pending END, lease_token = NULL, lease_expires = NULL, '
+                f'error = :error, updated = :now WHERE url = :url AND lease_token = :token'),
+                {'max_attempts': self.max_attempts, 'failed': FAILED, 'pending': PENDING,
+                 'error': error, 'now': time.time(), 'url': url, 'token': token})
+
+
+    def reclaim(self):
+        '''
+        Returns URLs with expired leases to the queue, or marks them failed once they
+        have been claimed max_attempts times
+
+        Returns
+        -------
+        urls: int
+            The number of expired leases released
+        '''
+        with self.engine.begin() as connection:
+            result = connection.execute(text(
+                f'UPDATE {self.table} SET status = CASE WHEN attempts >= :max_attempts '
+                f'THEN :failed ELSE :pending END, lease_token = NULL, lease_expires = NULL, '
+                f"error = 'lease expired', updated = :now "
+                f'WHERE status = :leased AND lease_expires < :now'),
+                {'max_attempts': self.max_attempts, 'failed': FAILED, 'pending': PENDING,
+                 'leased': LEASED, 'now': time.time()})
+            return result.rowcount
+
+
+    def counts(self):
+        '''
+        Returns the number of URLs with each status
+        '''
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(
+                f'SELECT status, COUNT(*) FROM {self.table} GROUP BY status'))
+            return {status: count for status, count in rows}
+
+
+    def drained(self):
+        '''
+        Checks every URL is done or failed, after releasing expired leases
+        '''
+        self.reclaim()
+        counts = self.counts()
+        return not counts.get(PENDING) and not counts.get(LEASED)
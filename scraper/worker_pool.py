@@ -0,0 +1,203 @@
+'''
+This file contains the browser worker pool used by the web scraper.
+Several Chrome drivers scrape recipes at the same time, sharing one queue of
+recipe links. Drivers are recycled after a set number of pages to contain
+Chrome memory growth and restarted automatically if they crash.
+'''
+
+import copy
+import queue
+import threading
+import time
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from tqdm import tqdm
+from metrics import PAGES_FAILED, PAGES_RETRIED, track_queue
+
+
+class DriverWorker(threading.Thread):
+
+    def __init__(self, scraper, links: queue.Queue, recycle_after: int,
+                 max_attempts: int, progress, name: str):
+        '''
+        Initialises a worker with its own copy of the scraper and its own driver
+
+        Parameters
+        ----------
+        scraper: BBCRecipeScraper
+            The scraper whose settings, storage and chrome_options the worker uses
+        links: queue.Queue
+            The shared queue of (link, attempt) pairs to scrape
+        recycle_after: int
+            Restart the driver after this many pages
+        max_attempts: int
+            How many times a link is tried before it is counted as failed
+        progress: tqdm
+            The shared progress bar
+        name: str
+            The worker name used in the throughput counters
+        '''
+        super().__init__(name=name, daemon=True)
+        #shallow copy, so per-recipe state (link, dict_recipe, SKU) is per worker
+        self.scraper = copy.copy(scraper)
+        self.scraper.driver = None
+        self.scraper._driver_lock = threading.Lock()
+        self.links = links
+        self.recycle_after = recycle_after
+        self.max_attempts = max_attempts
+        self.progress = progress
+        self.pages = 0
+        self.failures = 0
+        self.restarts = 0
+        self.elapsed = 0
+        self._driver_pages = 0
+
+
+    def _start_driver(self):
+        '''
+        Starts a fresh Chrome driver, quitting the previous one if there is one
+        '''
+        self._stop_driver()
+        self.scraper.driver = self.scraper._new_driver()
+        self._driver_pages = 0
+
+
+    def _stop_driver(self):
+        '''
+        Quits the worker's Chrome driver
+        '''
+        if self.scraper.driver is not None:
+            try:
+                self.scraper.driver.quit()
+            except WebDriverException:
+                #the driver has already crashed
+                pass
+            self.scraper.driver = None
+        self.scraper._driver_lock = threading.Lock()
+
+
+    def run(self):
+        '''
+        Scrapes links from the shared queue until it is empty
+        '''
+        start = time.monotonic()
+        try:
+            while True:
+                try:
+                    link, attempt = self.links.get_nowait()
+                except queue.Empty:
+                    break
+                self._scrape(link, attempt)
+        finally:
+            self._stop_driver()
+            self.elapsed = time.monotonic() - start
+
+
+    def _scrape(self, link: str, attempt: int):
+        '''
+        Scrapes one link, restarting the driver and re-queueing the link if Chrome
+        crashes. A page which times out is a failed page, Chrome itself is fine.
+        '''
+        try:
+            if self.scraper.driver is None or self._driver_pages >= self.recycle_after:
+                if self.scraper.driver is not None:
+                    self.restarts += 1
+                self._start_driver()
+            self.scraper.link = link
+            self.scraper._scrape_link()
+            self._driver_pages += 1
+            self.pages += 1
+            self.progress.update(1)
+        except TimeoutException as error:
+            #a subclass of WebDriverException, caught first so the driver is kept
+            print(f'{self.name}: timed out on {link}.')
+            self._failed(link, error)
+        except WebDriverException as error:
+            print(f'{self.name}: driver failed on {link} ({error.__class__.__name__}), restarting.')
+            self._stop_driver()
+            if attempt + 1 < self.max_attempts:
+                self.links.put((link, attempt + 1))
+                PAGES_RETRIED.inc()
+            else:
+                self._failed(link, error)
+        except Exception as error:
+            #keep the worker running when a single recipe fails to store
+            print(f'{self.name}: failed to scrape {link} ({error!r}).')
+            self._failed(link, error)
+
+
+    def _failed(self, link: str, error: Exception):
+        '''
+        Counts a link which could not be scraped and records it, with the cause, in the 
+        checkpoint
+        '''
+        self.failures += 1
+        PAGES_FAILED.inc()
+        self.progress.update(1)
+        self.scraper._record_failure(link, error)
+
+
+    def stats(self):
+        '''
+        Returns the worker's throughput counters
+        '''
+        minutes = self.elapsed / 60
+        return {
+            'worker': self.name,
+            'pages': self.pages,
+            'failures': self.failures,
+            'restarts': self.restarts,
+            'pages_per_minute': round(self.pages / minutes, 2) if minutes else 0
+        }
+
+
+class WorkerPool:
+
+    def __init__(self, scraper, workers: int = 4, recycle_after: int = 50, max_attempts: int = 2):
+        '''
+        Initialises a pool of Chrome workers for a scraper
+
+        Parameters
+        ----------
+        scraper: BBCRecipeScraper
+            The scraper the workers copy their settings and storage from
+        workers: int
+            The number of Chrome drivers running at the same time
+        recycle_after: int
+            Restart each driver after this many pages
+        max_attempts: int
+            How many times a link is tried before it is counted as failed
+        '''
+        self.scraper = scraper
+        self.workers = workers
+        self.recycle_after = recycle_after
+        self.max_attempts = max_attempts
+
+
+    def run(self, links: list):
+        '''
+        Scrapes all links with the worker pool and waits for it to finish
+
+        Returns
+        -------
+        worker_stats: list
+            Pages, failures, restarts and pages per minute for each worker
+        '''
+        link_queue = queue.Queue()
+        for link in links:
+            link_queue.put((link, 0))
+        track_queue('links', link_queue)
+
+        with tqdm(total=len(links)) as progress:
+            workers = [DriverWorker(self.scraper, link_queue, self.recycle_after,
+                                    self.max_attempts, progress, f'worker-{number}')
+                       for number in range(self.workers)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        worker_stats = [worker.stats() for worker in workers]
+        for stats in worker_stats:
+            print(stats)
+
+        return worker_stats
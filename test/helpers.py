@@ -0,0 +1,88 @@
+'''
+Fakes and fixtures shared by the test modules. They add the test directory to
+sys.path and import this module as helpers.
+'''
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from botocore.exceptions import ClientError
+import storage_credentials
+from waits import RatePolicy
+
+
+class FakeS3:
+    '''
+    Stub S3 client keeping uploaded objects in memory. Uploads are delayed by delay
+    seconds and raise AccessDenied if fail is set.
+    '''
+
+    def __init__(self, delay=0, fail=False):
+        self.objects = {}
+        self.content_types = {}
+        self.keys = []
+        self.puts = 0
+        self.delay = delay
+        self.fail = fail
+
+    def _put(self, key, data, content_type=None):
+        if self.fail:
+            raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'PutObject')
+        self.objects[key] = data
+        self.content_types[key] = content_type
+        self.keys.append(key)
+        self.puts += 1
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None, **kwargs):
+        time.sleep(self.delay)
+        with open(filename, 'rb') as handler:
+            self._put(key, handler.read(), (ExtraArgs or {}).get('ContentType'))
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+        time.sleep(self.delay)
+        #read in chunks, as boto3 does with a stream
+        self._put(key, b''.join(iter(lambda: fileobj.read(1024), b'')), (ExtraArgs or {}).get('ContentType'))
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        return {}
+
+
+class FakeDriver:
+
+    def __init__(self):
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+class BrowserlessScraperTestCase(unittest.TestCase):
+    '''
+    Runs each test in a temporary working directory with a BBCRecipeScraper which
+    fetches pages over HTTP without Chrome, storing to a FakeS3 (self.s3) and SQLite
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        #the scraper writes raw_recipe_data relative to the working directory
+        os.chdir(self.temp_dir.name)
+        self.s3 = FakeS3()
+        storage_credentials.configure(s3_client=self.s3, bucket_name='test-bucket',
+                                      bucket_link='https://test-bucket/',
+                                      database_url=f'sqlite:///{self.temp_dir.name}/recipes.db')
+        from recipe_scraper import BBCRecipeScraper
+        self.scraper = BBCRecipeScraper(None, fetch_mode='http', browser=False, rate_policy=RatePolicy(0))
+
+    def tearDown(self):
+        self.scraper.fetcher.close()
+        self.scraper.image_transfer.close()
+        storage_credentials.configure()
+        storage_credentials._settings.clear()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
@@ -0,0 +1,55 @@
+#%%
+
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from browser_profile import BLOCKED_URL_PATTERNS, block_resources, lean_options, weight_summary
+from chrome_config import chrome_options
+
+
+class CommandRecorder:
+    '''
+    Stands in for a driver and records the DevTools commands sent to it
+    '''
+
+    def __init__(self):
+        self.commands = []
+
+    def execute_cdp_cmd(self, command, parameters):
+        self.commands.append((command, parameters))
+
+
+class BrowserProfileTest(unittest.TestCase):
+
+    def test_lean_options(self):
+        options = lean_options(chrome_options)
+        self.assertEqual(options.experimental_options['prefs'],
+                         {'profile.managed_default_content_settings.images': 2})
+        self.assertTrue(options.experimental_options['detach'])
+        rules = [argument for argument in options.arguments if argument.startswith('--host-resolver-rules')]
+        self.assertEqual(len(rules), 1)
+        self.assertIn('EXCLUDE *.bbc.co.uk', rules[0])
+        #the full profile is unchanged
+        self.assertNotIn('prefs', chrome_options.experimental_options)
+        self.assertNotIn(rules[0], chrome_options.arguments)
+
+    def test_block_resources(self):
+        driver = CommandRecorder()
+        block_resources(driver)
+        self.assertEqual(driver.commands, [
+            ('Network.enable', {}),
+            ('Network.setBlockedURLs', {'urls': list(BLOCKED_URL_PATTERNS)})
+        ])
+
+    def test_weight_summary(self):
+        weights = [{'load_ms': 300, 'bytes': 1000, 'requests': 4},
+                   {'load_ms': 100, 'bytes': 3000, 'requests': 2},
+                   {'load_ms': None, 'bytes': 2000, 'requests': 3}]
+        self.assertEqual(weight_summary(weights),
+                         {'pages': 3, 'p50_load_ms': 300, 'mean_bytes': 2000, 'mean_requests': 3.0})
+        self.assertEqual(weight_summary([]), {'pages': 0})
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,53 @@
+#%%
+
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from checkpoint import CrawlCheckpoint
+
+
+class CrawlCheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'checkpoint.db')
+        self.checkpoint = CrawlCheckpoint(self.path, batch_size=2)
+
+    def tearDown(self):
+        self.checkpoint.connection.close()
+        self.temp_dir.cleanup()
+
+    def test_resume_after_restart(self):
+        self.checkpoint.add_category('a', ['a1', 'a2', 'a3'])
+        self.checkpoint.set_discovery_complete()
+        self.checkpoint.mark('a1', 'done')
+        self.checkpoint.mark('a2', 'failed', 'TimeoutException')
+        #simulate the container dying without a final flush
+        self.checkpoint.connection.close()
+
+        checkpoint = CrawlCheckpoint(self.path)
+        self.assertTrue(checkpoint.discovery_complete())
+        self.assertEqual(checkpoint.completed_categories(), {'a'})
+        self.assertEqual(checkpoint.links(), ['a2', 'a3'])
+        self.assertEqual(checkpoint.filter_pending(['a1', 'a2', 'a3']), ['a2', 'a3'])
+        self.checkpoint = checkpoint
+
+    def test_updates_are_batched(self):
+        self.checkpoint.add_category('a', ['a1', 'a2'])
+        self.checkpoint.mark('a1', 'done')
+        self.assertEqual(len(self.checkpoint._updates), 1)
+        self.checkpoint.mark('a2', 'done')
+        self.assertEqual(self.checkpoint._updates, [])
+        self.assertEqual(self.checkpoint.counts(), {'done': 2})
+
+    def test_reset(self):
+        self.checkpoint.add_category('a', ['a1'])
+        self.checkpoint.reset()
+        self.assertEqual(self.checkpoint.links(), [])
+        self.assertFalse(self.checkpoint.discovery_complete())
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,104 @@
+#%%
+
+import os
+import re
+import sys
+import types
+import unittest
+from urllib.parse import urljoin
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmark'))
+from lxml import html as lxml_html
+from selenium.common.exceptions import NoSuchElementException
+from dom_script import RECIPE_SCRIPT, extract_recipe
+from fixture_server import FixtureSite
+from recipe_scraper import BBCRecipeScraper
+
+
+class LxmlElement:
+    '''
+    The WebElement calls used by BBCRecipeScraper._get_details, answered from lxml
+    '''
+
+    def __init__(self, element, base_url):
+        self.element = element
+        self.base_url = base_url
+
+    @property
+    def text(self):
+        return ' '.join(self.element.text_content().split())
+
+    def get_attribute(self, name):
+        value = self.element.get(name)
+        #Chrome reports src as an absolute URL
+        return urljoin(self.base_url, value) if name == 'src' and value else value
+
+    def find_elements(self, by, xpath):
+        return [LxmlElement(element, self.base_url) for element in self.element.xpath(xpath)]
+
+    def find_element(self, by, xpath):
+        elements = self.find_elements(by, xpath)
+        if not elements:
+            raise NoSuchElementException(xpath)
+        return elements[0]
+
+
+class LxmlDriver(LxmlElement):
+    '''
+    A driver with a page loaded. execute_script runs RECIPE_SCRIPT by evaluating
+    the XPaths written in the script, so the test fails if they drift from those of
+    _get_details.
+    '''
+
+    def __init__(self, page_html, url):
+        super().__init__(lxml_html.fromstring(page_html), url)
+        self.scripts = 0
+
+    def _first(self, xpath, context=None):
+        elements = (context or self).find_elements(None, xpath)
+        return elements[0] if elements else None
+
+    def execute_script(self, script):
+        self.scripts += 1
+        assert script == RECIPE_SCRIPT
+        nodes = {name: self._first(xpath) for name, xpath in re.findall(r"var (\w+) = first\('([^']+)'\)", script)}
+        rows_xpath = re.search(r"document\.evaluate\('([^']+)', wrapper", script).group(1)
+        fields = {name: getattr(self._first(xpath), 'text', None)
+                  for name, xpath in re.findall(r"(\w+): text\(first\(\s*'([^']+)'\)\)", script)}
+        fields['image_url'] = nodes['image'].get_attribute('src') if nodes['image'] else None
+        fields['ingredients'] = [row.text for row in nodes['wrapper'].find_elements(None, rows_xpath)] \
+            if nodes['wrapper'] else []
+        return fields
+
+
+class DomScriptTest(unittest.TestCase):
+
+    def xpath_details(self, driver, url):
+        scraper = types.SimpleNamespace(driver=driver, link=url)
+        scraper._get_ingredients = lambda: BBCRecipeScraper._get_ingredients(scraper)
+        return BBCRecipeScraper._get_details(scraper)
+
+    def assert_parity(self, page_html, url):
+        expected = self.xpath_details(LxmlDriver(page_html, url), url)
+        driver = LxmlDriver(page_html, url)
+        dict_recipe = extract_recipe(driver, url)
+        self.assertEqual(driver.scripts, 1)
+        for field in ('name', 'sku', 'description', 'time', 'image_url', 'ingredients', 'recipe_url'):
+            self.assertEqual(dict_recipe[field], expected[field], field)
+        return dict_recipe
+
+    def test_parity_with_xpath(self):
+        site = FixtureSite()
+        for slug in site.recipe_slugs('a', 1)[:5]:
+            url = f'http://fixtures.local/food/recipes/{slug}'
+            dict_recipe = self.assert_parity(site.recipe_page(slug, 'fixtures.local'), url)
+            self.assertTrue(dict_recipe['name'])
+            self.assertTrue(dict_recipe['ingredients'])
+
+    def test_parity_on_missing_fields(self):
+        self.assert_parity('<html><body><h1 class="gel-trafalgar content-title__text">Toast</h1>'
+                           '</body></html>', 'http://fixtures.local/food/recipes/toast')
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
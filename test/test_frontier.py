@@ -0,0 +1,86 @@
+#%%
+
+import os
+import sys
+import threading
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from frontier import BloomFilter, Frontier, canonicalize
+
+
+class FrontierTest(unittest.TestCase):
+
+    def test_canonicalize(self):
+        for url in ('https://www.bbc.co.uk/food/recipes/apple_pie_1#featured-content',
+                    'https://WWW.BBC.CO.UK/food/recipes/apple_pie_1/',
+                    'https://www.bbc.co.uk:443/food/recipes/apple_pie_1?utm_source=share'):
+            self.assertEqual(canonicalize(url), 'https://www.bbc.co.uk/food/recipes/apple_pie_1')
+        self.assertEqual(canonicalize('http://127.0.0.1:8000/food/recipes/x'),
+                         'http://127.0.0.1:8000/food/recipes/x')
+
+    def test_duplicates_removed(self):
+        frontier = Frontier()
+        accepted = frontier.extend(['https://www.bbc.co.uk/food/recipes/a',
+                                    'https://www.bbc.co.uk/food/recipes/a#featured-content',
+                                    'https://www.bbc.co.uk/food/recipes/b'])
+        self.assertEqual(accepted, ['https://www.bbc.co.uk/food/recipes/a',
+                                    'https://www.bbc.co.uk/food/recipes/b'])
+        self.assertEqual(frontier.stats()['duplicates'], 1)
+
+    def test_budgets(self):
+        frontier = Frontier(max_links=5, max_per_category=2)
+        self.assertEqual(len(frontier.extend([f'https://x/a{number}' for number in range(4)], 'a')), 2)
+        self.assertTrue(frontier.category_full('a'))
+        self.assertFalse(frontier.full)
+        frontier.extend([f'https://x/b{number}' for number in range(2)], 'b')
+        frontier.extend([f'https://x/c{number}' for number in range(2)], 'c')
+        self.assertTrue(frontier.full)
+        self.assertEqual(len(frontier), 5)
+        self.assertEqual(frontier.stats()['over_budget'], 3)
+
+    def test_links_kept_only_if_asked(self):
+        urls = [f'https://x/recipe_{number}' for number in range(3)]
+        frontier = Frontier()
+        frontier.extend(urls)
+        self.assertIsNone(frontier.links)
+        self.assertEqual(len(frontier), 3)
+        frontier = Frontier(keep_links=True)
+        frontier.extend(urls)
+        self.assertEqual(frontier.links, urls)
+
+    def test_limit_leaves_budget(self):
+        frontier = Frontier(max_links=10)
+        self.assertEqual(len(frontier.extend([f'https://x/a{number}' for number in range(5)], 
+                                             limit=2)), 2)
+        self.assertEqual(frontier.max_links, 10)
+        self.assertFalse(frontier.full)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        urls = [f'https://www.bbc.co.uk/food/recipes/recipe_{number}' for number in range(1000)]
+        self.assertTrue(all(bloom.add(url) for url in urls[:500]))
+        self.assertTrue(all(url in bloom for url in urls[:500]))
+        false_positives = sum(url in bloom for url in urls[500:])
+        self.assertLess(false_positives, 25)
+        frontier = Frontier(max_links=None, bloom_capacity=1000)
+        self.assertEqual(len(frontier.extend(urls[:10] + urls[:10])), 10)
+
+    def test_iterate_while_discovering(self):
+        frontier = Frontier(max_links=None)
+        urls = [f'https://x/recipe_{number}' for number in range(100)]
+
+        def discover():
+            for url in urls:
+                frontier.add(url, 'x')
+            frontier.close()
+
+        thread = threading.Thread(target=discover)
+        thread.start()
+        self.assertEqual(list(frontier), urls)
+        thread.join()
+        with self.assertRaises(ValueError):
+            frontier.add('https://x/late')
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,122 @@
+#%%
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from botocore.exceptions import ClientError
+from sqlalchemy import create_engine, text
+from html_archive import HTMLArchive, read_page
+from rds_writer import RecipeWriter
+from reparse import reparse, write_outputs
+from resilience import Resilience
+
+
+RECIPE_URL = 'https://www.bbc.co.uk/food/recipes/marys_sponge_cake_1234'
+
+RECIPE_HTML = '''
+<html><body>
+<h1 class="gel-trafalgar content-title__text">Mary's sponge cake</h1>
+<div class="recipe-ingredients-wrapper">
+  <ul><li>225g/8oz <a href="/food/butter">butter</a>, softened</li></ul>
+</div>
+</body></html>
+'''
+
+
+class SlowDownS3:
+    '''
+    Stub S3 client which throttles the first upload
+    '''
+
+    def __init__(self):
+        self.keys = []
+
+    def upload_file(self, path, bucket, key):
+        self.keys.append(key)
+        if len(self.keys) == 1:
+            raise ClientError({'Error': {'Code': 'SlowDown'}}, 'PutObject')
+
+
+class HTMLArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.archive = HTMLArchive(os.path.join(self.temp_dir.name, 'html_archive'))
+
+    def tearDown(self):
+        self.archive.close()
+        self.temp_dir.cleanup()
+
+    def test_pages_kept_between_runs(self):
+        self.archive.put(RECIPE_URL + '#featured-content', '<h1>Old</h1>')
+        self.archive.put(RECIPE_URL, RECIPE_HTML)
+        self.archive.set_outputs({'recipe_url': RECIPE_URL, 'uuid': 'uuid-1',
+                                  'image_s3': 'https://bucket/images/ab/original.jpg'})
+        self.archive.close()
+        self.archive = HTMLArchive(os.path.join(self.temp_dir.name, 'html_archive'))
+        self.assertEqual(len(self.archive), 1)
+        url, path, uuid, image_s3 = self.archive.pages()[0]
+        self.assertEqual((url, uuid, image_s3),
+                         (RECIPE_URL, 'uuid-1', 'https://bucket/images/ab/original.jpg'))
+        self.assertEqual(read_page(path), RECIPE_HTML)
+
+    def test_image_variants_kept(self):
+        image_s3 = {'original': 'https://bucket/images/ab/original.jpg',
+                    'thumb': 'https://bucket/images/ab/thumb.jpg'}
+        self.archive.put(RECIPE_URL, RECIPE_HTML)
+        self.archive.set_outputs({'recipe_url': RECIPE_URL, 'uuid': 'uuid-1', 'image_s3': image_s3})
+        self.assertEqual(self.archive.pages()[0][3], image_s3)
+
+    def test_reparse_keeps_outputs(self):
+        self.archive.put(RECIPE_URL, RECIPE_HTML)
+        self.archive.set_outputs({'recipe_url': RECIPE_URL, 'uuid': 'uuid-1', 'image_s3': []})
+        self.archive.put('https://www.bbc.co.uk/food/recipes/error_page', '<html></html>')
+        self.archive.put('https://www.bbc.co.uk/food/recipes/blank_page', '')
+        records = list(reparse(self.archive, processes=1))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[2]['name'], [])
+        self.assertEqual(records[0]['name'], 'Marys sponge cake')
+        self.assertEqual(records[0]['uuid'], 'uuid-1')
+        self.assertEqual(records[0]['image_s3'], [])
+
+    def test_outputs_replaced(self):
+        engine = create_engine('sqlite://')
+        writer = RecipeWriter(engine)
+        writer.add({'uuid': 'uuid-1', 'name': 'Old name', 'recipe_url': RECIPE_URL})
+        writer.close()
+        self.archive.put(RECIPE_URL, RECIPE_HTML)
+        self.archive.set_outputs({'recipe_url': RECIPE_URL, 'uuid': 'uuid-1'})
+        self.archive.put('https://www.bbc.co.uk/food/recipes/error_page', '<html></html>')
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            counts = write_outputs(reparse(self.archive, processes=1),
+                                   rds_writer=RecipeWriter(engine, replace=True))
+            with open('raw_recipe_data/MARYS-SPONGE-CAKE/data.json') as json_file:
+                self.assertEqual(json.load(json_file)['uuid'], 'uuid-1')
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(counts, {'written': 1, 'empty': 1})
+        with engine.connect() as connection:
+            rows = connection.execute(text('SELECT uuid, name FROM recipe_data')).fetchall()
+        self.assertEqual([tuple(row) for row in rows], [('uuid-1', 'Marys sponge cake')])
+
+    def test_throttled_upload_retried(self):
+        self.archive.put(RECIPE_URL, RECIPE_HTML)
+        s3_client = SlowDownS3()
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            counts = write_outputs(reparse(self.archive, processes=1), s3_client=s3_client,
+                                   bucket_name='bucket', resilience=Resilience(retries=1, backoff=0))
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(counts, {'written': 1, 'empty': 0})
+        self.assertEqual(s3_client.keys, ['MARYS-SPONGE-CAKE_data.json'] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,96 @@
+#%%
+
+import hashlib
+import io
+import os
+import sys
+import threading
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from image_processing import (ImageProcessor,
+                              Image,
+                              content_key,
+                              content_type,
+                              make_variants,
+                              parse_variants,
+                              variant_url)
+from helpers import FakeS3
+
+
+def jpeg(width, height, colour):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), colour).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class ImageProcessingTest(unittest.TestCase):
+
+    def test_parse_variants(self):
+        self.assertEqual(parse_variants('thumb=320, medium=960'), {'thumb': 320, 'medium': 960})
+        self.assertEqual(parse_variants(''), {})
+        with self.assertRaises(ValueError):
+            parse_variants('thumb')
+
+    def test_variant_url(self):
+        url = 'https://bucket.s3.amazonaws.com/' + content_key('ab12')
+        self.assertEqual(url, 'https://bucket.s3.amazonaws.com/images/ab12/original.jpg')
+        self.assertEqual(variant_url(url, 'thumb'), 'https://bucket.s3.amazonaws.com/images/ab12/thumb.jpg')
+        url = 'https://bucket.s3.amazonaws.com/' + content_key('ab12', extension='png')
+        self.assertEqual(variant_url(url, 'thumb'), 'https://bucket.s3.amazonaws.com/images/ab12/thumb.jpg')
+
+    def test_content_type(self):
+        self.assertEqual(content_type(b'\x89PNG\r\n\x1a\n' + bytes(8)), 'image/png')
+        self.assertEqual(content_type(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'image/webp')
+        self.assertEqual(content_type(b'GIF89a'), 'image/gif')
+        self.assertEqual(content_type(b'not an image'), 'application/octet-stream')
+
+    def test_unreadable_image_keeps_original_only(self):
+        self.assertEqual(make_variants(b'not an image', {'thumb': 320}), {})
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_variants_resized(self):
+        variants = make_variants(jpeg(1280, 720, 'red'), {'thumb': 320})
+        with Image.open(io.BytesIO(variants['thumb'])) as thumb:
+            self.assertEqual(thumb.size, (320, 180))
+
+    def test_identical_images_stored_once(self):
+        s3 = FakeS3()
+        processor = ImageProcessor(s3, 'bucket', 'https://bucket/', variants={'thumb': 64}, workers=1)
+        image_data = jpeg(200, 100, 'blue') if Image is not None else b'image'
+        first = processor.store(image_data)
+        puts = s3.puts
+        self.assertEqual(processor.store(image_data), first)
+        processor.close()
+        self.assertEqual(s3.puts, puts)
+        self.assertEqual(processor.stats(), {'uploaded': 1, 'duplicates': 1})
+        #a new run finds the image in the bucket
+        processor = ImageProcessor(s3, 'bucket', 'https://bucket/', variants={'thumb': 64}, workers=1)
+        self.assertEqual(processor.store(image_data), first)
+        processor.close()
+        self.assertEqual(s3.puts, puts)
+
+    def test_concurrent_identical_images_stored_once(self):
+        s3 = FakeS3(delay=0.05)
+        processor = ImageProcessor(s3, 'bucket', 'https://bucket/', variants={})
+        image_data = b'\x89PNG\r\n\x1a\n' + bytes(64)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(processor.store(image_data)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        processor.close()
+        self.assertEqual(s3.puts, 1)
+        self.assertEqual(processor.stats(), {'uploaded': 1, 'duplicates': 3})
+        self.assertEqual(len({result['original'] for result in results}), 1)
+        self.assertEqual(list(s3.content_types.values()), ['image/png'])
+        #the original keeps the extension of its format
+        digest = hashlib.sha256(image_data).hexdigest()
+        self.assertEqual(list(s3.objects), [f'images/{digest}/original.png'])
+        self.assertEqual(results[0]['original'], f'https://bucket/images/{digest}/original.png')
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,107 @@
+#%%
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import requests
+from botocore.exceptions import ClientError
+from helpers import FakeS3
+from image_transfer import ImageTransfer
+from resilience import Resilience
+
+
+IMAGE = b'\xff\xd8\xff' + bytes(range(256)) * 64
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    '''
+    Serves IMAGE at /image.jpg, fails /flaky.jpg once with a 503 and 404s the rest
+    '''
+
+    requests = []
+
+    def do_GET(self):
+        ImageHandler.requests.append(self.path)
+        if self.path == '/flaky.jpg' and ImageHandler.requests.count(self.path) == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path not in ('/image.jpg', '/flaky.jpg'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(IMAGE)))
+        self.end_headers()
+        self.wfile.write(IMAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageTransferTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        ImageHandler.requests = []
+        self.s3 = FakeS3()
+        self.transfer = ImageTransfer(self.s3, 'bucket', 'https://bucket/',
+                                      resilience=Resilience(timeout=5, retries=1, backoff=0))
+
+    def tearDown(self):
+        self.transfer.close()
+
+    def test_image_streamed_to_bucket(self):
+        url = self.transfer.transfer(self.base + '/image.jpg', 'SKU_image.jpg')
+        self.assertEqual(url, 'https://bucket/SKU_image.jpg')
+        self.assertEqual(self.s3.objects['SKU_image.jpg'], IMAGE)
+
+    def test_local_copy_from_same_download(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            local_path = os.path.join(temp_dir, 'SKU', 'images.jpg')
+            self.transfer.transfer(self.base + '/image.jpg', 'SKU_image.jpg', local_path)
+            with open(local_path, 'rb') as handler:
+                self.assertEqual(handler.read(), IMAGE)
+        self.assertEqual(self.s3.objects['SKU_image.jpg'], IMAGE)
+        self.assertEqual(ImageHandler.requests, ['/image.jpg'])
+
+    def test_transient_error_downloads_again(self):
+        self.transfer.transfer(self.base + '/flaky.jpg', 'SKU_image.jpg')
+        self.assertEqual(ImageHandler.requests, ['/flaky.jpg', '/flaky.jpg'])
+        self.assertEqual(self.s3.objects['SKU_image.jpg'], IMAGE)
+
+    def test_missing_image_not_uploaded(self):
+        with self.assertRaises(requests.HTTPError):
+            self.transfer.transfer(self.base + '/missing.jpg', 'SKU_image.jpg')
+        #client errors are not retried
+        self.assertEqual(ImageHandler.requests, ['/missing.jpg'])
+        self.assertEqual(self.s3.objects, {})
+
+    def test_upload_failure_raised(self):
+        self.transfer.s3_client = FakeS3(fail=True)
+        with self.assertRaises(ClientError):
+            self.transfer.transfer(self.base + '/image.jpg', 'SKU_image.jpg')
+
+    def test_fetch(self):
+        self.assertEqual(self.transfer.fetch(self.base + '/image.jpg'), IMAGE)
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
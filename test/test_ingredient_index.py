@@ -0,0 +1,74 @@
+#%%
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+from sqlalchemy import create_engine, event
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from ingredient_index import IngredientIndex, ingredient_name
+
+
+def record(number, ingredients):
+    return {'recipe_url': [f'https://www.bbc.co.uk/food/recipes/recipe_{number}'],
+            'name': [f'Recipe {number}'], 'ingredients': ingredients}
+
+
+class IngredientIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f'sqlite:///{self.temp_dir.name}/recipes.db')
+        self.index = IngredientIndex(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def test_ingredient_name(self):
+        self.assertEqual(ingredient_name('200g/7oz plain flour, sifted'), 'plain flour')
+        self.assertEqual(ingredient_name('1½ tbsp olive oil'), 'olive oil')
+        self.assertEqual(ingredient_name('1 onion (finely chopped)'), 'onion')
+        self.assertEqual(ingredient_name('Free-range eggs'), 'free-range eggs')
+        self.assertIsNone(ingredient_name('2 tbsp'))
+
+    def test_find_recipes(self):
+        records = [record(0, ['200g/7oz plain flour', '2 free-range eggs', '300ml/10fl oz milk']),
+                   record(1, ['plain flour', 'butter']),
+                   record(2, ['3 free-range eggs', '25g/1oz butter'])]
+        self.assertEqual(self.index.load(records), 3)
+        #loading again adds nothing
+        self.index.load(records)
+        self.assertEqual(self.index.counts(),
+                         {'recipes': 3, 'ingredients': 4, 'recipe_ingredients': 7})
+        found = self.index.find_recipes(['Plain flour', 'free-range eggs'])
+        self.assertEqual([recipe['name'] for recipe in found], ['Recipe 0'])
+        found = self.index.find_recipes(['butter', 'milk'], match_all=False)
+        self.assertEqual([recipe['name'] for recipe in found], ['Recipe 0', 'Recipe 1', 'Recipe 2'])
+        self.assertEqual(self.index.find_recipes(['saffron']), [])
+        self.assertEqual(self.index.search_ingredients('flour'), ['plain flour'])
+
+    def test_query_at_scale(self):
+        generator = random.Random(0)
+        pantry = [f'ingredient {number}' for number in range(2000)]
+        records = [record(number, generator.sample(pantry, 10)) for number in range(10000)]
+        records[42]['ingredients'] += ['saffron', 'rice']
+        self.index.load(records)
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, parameters, context, executemany:
+                     statements.append((statement, parameters)))
+        found = self.index.find_recipes(['saffron', 'rice'])
+        self.assertEqual([recipe['name'] for recipe in found], ['Recipe 42'])
+        #the ingredients are looked up in the primary key, not by scanning every row
+        statement, parameters = statements[-1]
+        with self.engine.connect() as connection:
+            plan = [row[3] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        self.assertIn('SEARCH recipe_ingredients USING COVERING INDEX '
+                      'sqlite_autoindex_recipe_ingredients_1 (ingredient_id=?)', plan)
+        self.assertFalse([step for step in plan if step.startswith('SCAN recipe')])
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,53 @@
+#%%
+
+import os
+import socket
+import sys
+import unittest
+import requests
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from metrics import start_metrics_server
+from pipeline import Pipeline, Stage
+from rds_writer import RecipeWriter
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_rds_batch_write_is_timed(self):
+        before = sample('scraper_rds_write_seconds_count', mode='batch')
+        writer = RecipeWriter(create_engine('sqlite://'), batch_size=2)
+        writer.add({'recipe_url': 'a'})
+        writer.add({'recipe_url': 'b'})
+        self.assertEqual(sample('scraper_rds_write_seconds_count', mode='batch'), before + 1)
+
+    def test_stage_failures_and_queue_depth(self):
+        before = sample('scraper_pages_failed_total')
+
+        def fail_odd(number):
+            if number % 2:
+                raise ValueError(number)
+            return number
+
+        Pipeline([Stage('metrics-test', fail_odd)]).run(range(6))
+        self.assertEqual(sample('scraper_pages_failed_total'), before + 3)
+        self.assertEqual(sample('scraper_queue_depth', queue='metrics-test'), 0)
+
+    def test_metrics_endpoint(self):
+        with socket.socket() as free:
+            free.bind(('127.0.0.1', 0))
+            port = free.getsockname()[1]
+        start_metrics_server(port, addr='127.0.0.1')
+        response = requests.get(f'http://127.0.0.1:{port}/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('scraper_page_load_seconds', response.text)
+        self.assertIn('scraper_pages_scraped_total', response.text)
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,45 @@
+#%%
+
+import os
+import sys
+import threading
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from pipeline import Pipeline, Stage
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_all_items_pass_through_stages(self):
+        results = []
+        lock = threading.Lock()
+
+        def collect(item):
+            with lock:
+                results.append(item)
+
+        pipeline = Pipeline([
+            Stage('double', lambda item: item * 2, workers=3, maxsize=2),
+            Stage('increment', lambda item: item + 1, workers=2, maxsize=2),
+            Stage('collect', collect, workers=1, maxsize=2)
+        ])
+        stage_stats = pipeline.run(range(50))
+        self.assertEqual(sorted(results), [item * 2 + 1 for item in range(50)])
+        self.assertEqual([stats['processed'] for stats in stage_stats], [50, 50, 50])
+
+    def test_failed_items_are_dropped(self):
+        def fail_on_odd(item):
+            if item % 2:
+                raise ValueError(item)
+            return item
+
+        stage = Stage('filter', fail_on_odd, workers=2)
+        sink = Stage('sink', lambda item: None)
+        stage_stats = Pipeline([stage, sink]).run(range(10))
+        self.assertEqual(stage_stats[0]['processed'], 5)
+        self.assertEqual(stage_stats[0]['failed'], 5)
+        self.assertEqual(stage_stats[1]['processed'], 5)
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
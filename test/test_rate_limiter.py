@@ -0,0 +1,122 @@
+#%%
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import requests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from rate_limiter import RateLimiter, parse_crawl_delay, parse_retry_after
+
+
+HOST = 'www.bbc.co.uk'
+URL = f'https://{HOST}/food/recipes/apple_pie_1'
+
+
+class RobotsSession:
+    '''
+    Answers every request with the robots.txt given
+    '''
+
+    def __init__(self, robots_txt):
+        self.robots_txt = robots_txt
+        self.requests = []
+
+    def get(self, url, timeout=None):
+        self.requests.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.robots_txt.encode()
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_parse_headers(self):
+        robots_txt = 'User-agent: *\nCrawl-delay: 2\nDisallow: /search\n'
+        self.assertEqual(parse_crawl_delay(robots_txt), 2.0)
+        self.assertIsNone(parse_crawl_delay('User-agent: *\nDisallow:\n'))
+        self.assertEqual(parse_retry_after('30'), 30)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertGreater(parse_retry_after('Wed, 21 Oct 2099 07:28:00 GMT'), 0)
+
+    def test_crawl_delay_raises_floor(self):
+        limiter = RateLimiter(min_interval=0)
+        limiter.session = RobotsSession('User-agent: *\nCrawl-delay: 0.2\n')
+        self.assertEqual(limiter.wait(URL), 0)
+        start = time.monotonic()
+        limiter.wait(URL)
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+        limiter.wait(f'https://{HOST}/food/recipes/other')
+        #robots.txt is read once per host
+        self.assertEqual(limiter.session.requests, [f'https://{HOST}/robots.txt'])
+        self.assertEqual(limiter.stats()[HOST]['floor'], 0.2)
+
+    def test_throttling_backs_off_and_recovers(self):
+        limiter = RateLimiter(min_interval=0, robots=False, max_interval=0.1)
+        limiter.wait(URL)
+        limiter.observe(URL, 429, 0.1, retry_after='0.2')
+        self.assertEqual(limiter.interval(HOST), 0.1)
+        start = time.monotonic()
+        limiter.wait(URL)
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+        for _ in range(30):
+            limiter.observe(URL, 200, 0.1)
+        self.assertEqual(limiter.interval(HOST), 0)
+        #other hosts are not slowed down
+        self.assertEqual(limiter.wait('https://ichef.bbci.co.uk/image.jpg'), 0)
+
+    def test_slow_responses_stretch_interval(self):
+        limiter = RateLimiter(min_interval=0.5, robots=False, latency_target=1)
+        limiter.wait(URL)
+        limiter.observe(URL, 200, 3)
+        self.assertEqual(limiter.interval(HOST), 0.625)
+        limiter.observe(URL, 200, 0.2)
+        self.assertEqual(limiter.interval(HOST), 0.5625)
+
+    def test_slow_browser_loads_keep_interval(self):
+        limiter = RateLimiter(min_interval=0.5, robots=False)
+        limiter.wait(URL)
+        #a page loaded with its subresources takes seconds in Chrome
+        for _ in range(100):
+            limiter.observe(URL, latency=8, browser=True)
+        self.assertEqual(limiter.interval(HOST), 0.5)
+        #loads close to the page timeout still slow the host down, up to max_interval
+        for _ in range(100):
+            limiter.observe(URL, latency=45, browser=True)
+        self.assertEqual(limiter.interval(HOST), limiter.max_interval)
+
+    def test_store_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = os.path.join(temp_dir, 'rate_limits.db')
+            #each limiter has its own connection, as in separate processes
+            limiters = [RateLimiter(min_interval=0.05, robots=False, store=store) for _ in range(3)]
+            starts = []
+            lock = threading.Lock()
+
+            def request(limiter):
+                for _ in range(3):
+                    limiter.wait(URL)
+                    with lock:
+                        starts.append(time.monotonic())
+
+            threads = [threading.Thread(target=request, args=(limiter,)) for limiter in limiters]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for limiter in limiters:
+                limiter.close()
+        starts.sort()
+        gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+        self.assertGreaterEqual(min(gaps), 0.035)
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
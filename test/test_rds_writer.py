@@ -0,0 +1,95 @@
+#%%
+
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from sqlalchemy import create_engine, event, text
+from rds_writer import RecipeWriter
+
+
+def make_recipe(recipe_url):
+    return {
+        'uuid': 'uuid-' + recipe_url,
+        'sku': 'SKU',
+        'name': 'Name',
+        'description': [],
+        'ingredients': ['BUTTER', 'EGGS'],
+        'time': '10 mins',
+        'image_url': [],
+        'image_s3': [],
+        'recipe_url': recipe_url
+    }
+
+
+class RecipeWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        '''
+        Using an in-memory SQLite database as a stand-in for RDS
+        '''
+        self.engine = create_engine('sqlite://')
+        self.writer = RecipeWriter(self.engine, batch_size=3, flush_interval=3600)
+
+    def count(self):
+        with self.engine.connect() as connection:
+            return connection.execute(text('SELECT COUNT(*) FROM recipe_data')).scalar()
+
+    def test_flush_on_batch_size(self):
+        self.writer.add(make_recipe('a'))
+        self.writer.add(make_recipe('b'))
+        self.assertEqual(self.count(), 0)
+        self.writer.add(make_recipe('c'))
+        self.assertEqual(self.count(), 3)
+
+    def test_duplicates_skipped(self):
+        for recipe_url in ('a', 'b', 'a'):
+            self.writer.add(make_recipe(recipe_url))
+        self.writer.add(make_recipe('b'))
+        self.writer.close()
+        self.assertEqual(self.count(), 2)
+        #rows skipped by ON CONFLICT DO NOTHING are not counted
+        self.assertEqual(self.writer.rows_written, 2)
+
+    def test_flush_on_interval(self):
+        self.writer.flush_interval = 0
+        self.writer.add(make_recipe('a'))
+        self.assertEqual(self.count(), 1)
+
+    def test_row_values(self):
+        self.writer.add(make_recipe('a'))
+        self.writer.close()
+        with self.engine.connect() as connection:
+            row = connection.execute(text('SELECT ingredients, description FROM recipe_data')).first()
+        self.assertEqual(row[0], '["BUTTER", "EGGS"]')
+        self.assertIsNone(row[1])
+
+    def test_replace_updates_rows(self):
+        self.writer.add(make_recipe('a'))
+        self.writer.close()
+        writer = RecipeWriter(self.engine, replace=True)
+        recipe = make_recipe('a')
+        recipe.update(uuid='new-uuid', name='New name')
+        writer.add(recipe)
+        writer.close()
+        with self.engine.connect() as connection:
+            row = connection.execute(text('SELECT uuid, name FROM recipe_data')).first()
+        self.assertEqual(tuple(row), ('uuid-a', 'New name'))
+
+    def test_batch_sent_in_one_statement(self):
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, parameters, context, executemany:
+                     statements.append((statement, executemany)))
+        writer = RecipeWriter(self.engine, batch_size=50, replace=True)
+        for recipe_url in ('a', 'b', 'c', 'a'):
+            writer.add(make_recipe(recipe_url))
+        writer.close()
+        inserts = [statement for statement in statements if statement[0].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertFalse(inserts[0][1])
+        self.assertEqual(self.count(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
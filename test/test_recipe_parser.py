@@ -0,0 +1,137 @@
+#%%
+
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from recipe_parser import (parse_recipe, 
+                           parse_recipe_links, 
+                           parse_page_count, 
+                           category_page_urls, 
+                           iso_duration, 
+                           parity_report)
+
+
+RECIPE_HTML = '''
+<html><body>
+<h1 class="gel-trafalgar content-title__text">Mary's sponge cake</h1>
+<p class="recipe-description__text">A classic   sponge.</p>
+<div class="gel-layout__item gel-1/4 recipe-leading-info__side-bar">
+  <div>
+    <div><p>Preparation time</p><p>less than 30 mins</p></div>
+    <div><p>Cooking time</p><p>10 to 30 mins</p></div>
+  </div>
+</div>
+<div class="recipe-media__image responsive-image-container__16/9">
+  <img src="https://ichef.bbci.co.uk/food/sponge.jpg">
+</div>
+<div class="recipe-ingredients-wrapper">
+  <ul>
+    <li>225g/8oz <a href="/food/butter">butter</a>, softened</li>
+    <li>4 free-range <a href="/food/egg">eggs</a></li>
+    <li>pinch of salt</li>
+  </ul>
+  <ul>
+    <li><a href="/food/butter">butter</a>, for greasing</li>
+    <li><a href="/food/jam">jam</a></li>
+  </ul>
+</div>
+</body></html>
+'''
+
+JSON_LD = '''
+<script type="application/ld+json">{"@context": "http://schema.org", "@graph": [
+  {"@type": "WebPage", "name": "BBC Food"},
+  {"@type": "Recipe", "name": "Mary's sponge cake", "description": "A classic   sponge.",
+   "cookTime": "PT30M", "image": [{"@type": "ImageObject", "url": "https://ichef.bbci.co.uk/food/sponge.jpg"}],
+   "recipeIngredient": ["225g/8oz butter, softened", "4 free-range eggs", "pinch of salt", "jam"]}
+]}</script>
+'''
+JSON_LD_HTML = RECIPE_HTML.replace('<html>', '<html><head>' + JSON_LD + '</head>')
+
+CATEGORY_HTML = '''
+<html><body>
+<div class="gel-wrap promo-collection__container az-page">
+  <div>
+    <div><a href="/food/recipes/apple_pie_1"><span>Apple pie</span></a></div>
+    <div><a href="/food/recipes/apricot_tart_2">Apricot tart</a><a href="/food/chefs">Chef</a></div>
+  </div>
+</div>
+<div class="pagination">
+  <a href="/food/recipes/a-z/a/1">1</a><a href="/food/recipes/a-z/a/2">2</a>
+  <a href="/food/recipes/a-z/a/14">14</a><a href="/food/recipes/a-z/a/2"><span aria-label="Next"></span></a>
+</div>
+</body></html>
+'''
+
+
+class RecipeParserTest(unittest.TestCase):
+
+    def test_parse_recipe(self):
+        dict_recipe = parse_recipe(RECIPE_HTML, 'https://www.bbc.co.uk/food/recipes/sponge')
+        self.assertEqual(dict_recipe['name'], 'Marys sponge cake')
+        self.assertEqual(dict_recipe['sku'], 'MARYS-SPONGE-CAKE')
+        self.assertEqual(dict_recipe['description'], 'A classic sponge.')
+        self.assertEqual(dict_recipe['time'], '10 to 30 mins')
+        self.assertEqual(dict_recipe['image_url'], 'https://ichef.bbci.co.uk/food/sponge.jpg')
+        self.assertEqual(dict_recipe['ingredients'], ['BUTTER', 'EGGS', 'JAM'])
+        self.assertEqual(dict_recipe['recipe_url'], 'https://www.bbc.co.uk/food/recipes/sponge')
+
+    def test_missing_fields(self):
+        dict_recipe = parse_recipe('<html><body></body></html>', 'https://example.com')
+        self.assertEqual(dict_recipe['name'], [])
+        self.assertEqual(dict_recipe['ingredients'], [])
+        self.assertEqual(len(dict_recipe['uuid']), 36)
+
+    def test_parse_recipe_json_ld(self):
+        dict_recipe = parse_recipe(JSON_LD_HTML, 'https://www.bbc.co.uk/food/recipes/sponge', json_ld=True)
+        self.assertEqual(dict_recipe['name'], 'Marys sponge cake')
+        self.assertEqual(dict_recipe['sku'], 'MARYS-SPONGE-CAKE')
+        self.assertEqual(dict_recipe['description'], 'A classic sponge.')
+        self.assertEqual(dict_recipe['time'], '30 mins')
+        self.assertEqual(dict_recipe['image_url'], 'https://ichef.bbci.co.uk/food/sponge.jpg')
+        #names without quantities, as the XPath extraction stores them
+        self.assertEqual(dict_recipe['ingredients'], ['BUTTER', 'FREE-RANGE EGGS', 'SALT', 'JAM'])
+
+    def test_json_ld_fallback(self):
+        #a malformed block and a block without a Recipe fall back to the XPaths
+        page_html = RECIPE_HTML.replace('<html>', '<html><script type="application/ld+json">{"@type": '
+                                        '</script><script type="application/ld+json">{"@type": "Person"}</script>')
+        self.assertEqual(parse_recipe(page_html, 'https://example.com', json_ld=True)['time'],
+                         '10 to 30 mins')
+        #the XPaths are the default
+        self.assertEqual(parse_recipe(JSON_LD_HTML, 'https://example.com')['time'], '10 to 30 mins')
+
+    def test_iso_duration(self):
+        self.assertEqual(iso_duration('PT1H30M'), '1 hour 30 mins')
+        self.assertEqual(iso_duration('PT2H'), '2 hours')
+        self.assertEqual(iso_duration('PT1M'), '1 min')
+        self.assertIsNone(iso_duration('30 mins'))
+        self.assertIsNone(iso_duration(None))
+
+    def test_parity_report(self):
+        report = parity_report([('https://example.com/a', JSON_LD_HTML), ('https://example.com/b', RECIPE_HTML)])
+        self.assertEqual(report['pages'], 2)
+        self.assertEqual(report['json_ld_found'], 1)
+        self.assertEqual(report['match']['name'], 1)
+        self.assertEqual(report['match']['ingredients'], 1)
+        self.assertEqual(report['match']['time'], 0)
+        self.assertEqual(report['differences']['time'][0]['xpath'], '10 to 30 mins')
+
+    def test_parse_recipe_links(self):
+        recipe_links = parse_recipe_links(CATEGORY_HTML, 'https://www.bbc.co.uk/food/recipes/a-z/a/1')
+        self.assertEqual(recipe_links, ['https://www.bbc.co.uk/food/recipes/apple_pie_1',
+                                        'https://www.bbc.co.uk/food/recipes/apricot_tart_2'])
+
+    def test_page_count(self):
+        self.assertEqual(parse_page_count(CATEGORY_HTML), 14)
+        self.assertEqual(parse_page_count('<html><body><p>x</p></body></html>'), 1)
+
+    def test_category_page_urls(self):
+        page_urls = category_page_urls('https://www.bbc.co.uk/food/recipes/a-z/b/1#featured-content', 3)
+        self.assertEqual(page_urls[0], 'https://www.bbc.co.uk/food/recipes/a-z/b/1#featured-content')
+        self.assertEqual(page_urls[2], 'https://www.bbc.co.uk/food/recipes/a-z/b/3#featured-content')
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,86 @@
+#%%
+
+import os
+import sys
+import tracemalloc
+import unittest
+import requests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sqlalchemy import text
+import storage_credentials
+from helpers import BrowserlessScraperTestCase
+from recipe_parser import new_recipe_dict
+from recipe_record import Recipe
+
+
+RECIPE_PAGE = '''
+<html><body>
+<h1 class="gel-trafalgar content-title__text">%s</h1>
+<div class="recipe-ingredients-wrapper">
+  <ul><li><a href="/food/butter">butter</a></li><li>4 <a href="/food/egg">eggs</a></li></ul>
+</div>
+</body></html>
+'''
+
+
+class RecipeRecordTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        dict_recipe = new_recipe_dict()
+        dict_recipe.update(uuid='uuid-1', sku='SPONGE', name='Sponge', ingredients=['BUTTER', 'EGGS'],
+                           recipe_url='https://www.bbc.co.uk/food/recipes/sponge')
+        recipe = Recipe.from_dict(dict_recipe)
+        self.assertIsNone(recipe.description)
+        self.assertEqual(recipe.ingredients, ('BUTTER', 'EGGS'))
+        self.assertEqual(recipe.to_dict(), dict_recipe)
+        self.assertEqual(Recipe.from_dict(recipe.to_dict()), recipe)
+        with self.assertRaises(AttributeError):
+            recipe.extra = 1
+
+
+class StreamingTest(BrowserlessScraperTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.scraper.fetcher.get = self.get
+
+    def get(self, url):
+        if url.endswith('missing'):
+            raise requests.HTTPError('404 error')
+        number = url.rsplit('_', 1)[1]
+        return RECIPE_PAGE % f'Recipe {number}'
+
+    def test_recipes_stored_and_yielded(self):
+        self.scraper.total_links_list = ['https://www.bbc.co.uk/food/recipes/recipe_1',
+                                         'https://www.bbc.co.uk/food/recipes/missing',
+                                         'https://www.bbc.co.uk/food/recipes/recipe_2']
+        recipes = list(self.scraper.iter_recipes())
+        self.assertEqual([recipe.name for recipe in recipes], ['Recipe 1', 'Recipe 2'])
+        self.assertEqual(self.scraper.failures.urls(), ['https://www.bbc.co.uk/food/recipes/missing'])
+        self.assertEqual(self.s3.keys, ['RECIPE-1_data.json', 'RECIPE-2_data.json'])
+        #stored again, the rows are not duplicated
+        self.scraper._load_record(recipes[0].to_dict())
+        self.scraper._upload_to_RDS()
+        with storage_credentials.get_engine().connect() as connection:
+            rows = connection.execute(text('SELECT name, ingredients FROM recipe_data')).fetchall()
+        self.assertEqual([tuple(row) for row in rows],
+                         [('Recipe 1', '["BUTTER", "EGGS"]'), ('Recipe 2', '["BUTTER", "EGGS"]')])
+
+    def test_memory_flat(self):
+        links = (f'https://www.bbc.co.uk/food/recipes/recipe_{number}' for number in range(3000))
+        tracemalloc.start()
+        recipes = self.scraper.iter_recipes(links, store=False)
+        for _ in zip(range(500), recipes):
+            pass
+        after_500 = tracemalloc.get_traced_memory()[0]
+        for _ in recipes:
+            pass
+        after_3000 = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        #only the per-page latencies grow with the crawl
+        self.assertLess(after_3000 - after_500, 500 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
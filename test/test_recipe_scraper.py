@@ -0,0 +1,166 @@
+#%%
+
+import os
+import re
+import sys
+import threading
+import unittest
+from unittest import mock
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmark'))
+from selenium.common.exceptions import WebDriverException
+from sqlalchemy import event, text
+import storage_credentials
+from fixture_server import FixtureSite
+from frontier import Frontier
+from helpers import BrowserlessScraperTestCase, FakeDriver
+from rds_writer import RecipeWriter
+from recipe_parser import new_recipe_dict
+from seen_index import SeenIndex
+from work_queue import WorkQueue
+
+
+class BrowserlessScraperTest(BrowserlessScraperTestCase):
+
+    def test_accept_cookies_without_browser(self):
+        self.assertIsNone(self.scraper.driver)
+        self.scraper.accept_cookies()
+
+    def test_pipeline_restarts_crashed_driver(self):
+        crashed = []
+
+        def fetch_details(scraper):
+            if scraper.link.endswith('broken') or (scraper.link.endswith('flaky') and not crashed):
+                crashed.append(scraper.driver)
+                raise WebDriverException('chrome not reachable')
+            scraper.dict_recipe = new_recipe_dict()
+            scraper.dict_recipe.update(uuid=scraper.link, sku=scraper.link[-5:].upper(), 
+                                       name=scraper.link, recipe_url=scraper.link)
+            return scraper.dict_recipe
+
+        self.scraper.fetch_mode = 'browser'
+        self.scraper.driver = FakeDriver()
+        self.scraper._new_driver = FakeDriver
+        self.scraper.total_links_list = ['https://x/flaky', 'https://x/broken']
+        with mock.patch.object(type(self.scraper), '_fetch_details', fetch_details), \
+                mock.patch('recipe_scraper.tqdm') as progress:
+            stage_stats = self.scraper.scraper_scrape_pipeline(max_attempts=2)
+        #flaky crashed once and was retried, broken crashed on both attempts
+        self.assertEqual(len(crashed), 3)
+        self.assertTrue(crashed[0].quit_called)
+        self.assertEqual(stage_stats[0]['processed'], 1)
+        self.assertEqual(stage_stats[0]['failed'], 1)
+        self.assertEqual(self.scraper.failures.urls(), ['https://x/broken'])
+        self.assertEqual(progress.return_value.__enter__.return_value.update.call_count, 2)
+
+    def discover_direct(self, frontier):
+        '''
+        Runs next_page_direct over fixture category pages for a and b, three pages 
+        each, and returns the links and the page URLs which were fetched
+        '''
+        site = FixtureSite(letters='ab', pages_per_letter=3, recipes_per_page=4)
+        fetched = []
+
+        def get(url):
+            fetched.append(url)
+            letter, page = re.search(r'/a-z/(\w)/(\d+)', url).groups()
+            return site.category_page(letter, int(page))
+
+        self.scraper.fetcher.get = get
+        self.scraper.frontier = frontier
+        self.scraper.category_links = [f'https://www.bbc.co.uk/food/recipes/a-z/{letter}/1#featured-content'
+                                       for letter in 'ab']
+        return self.scraper.next_page_direct(max_workers=2), sorted(fetched)
+
+    def test_next_page_direct(self):
+        links, fetched = self.discover_direct(Frontier(max_links=None))
+        expected = [f'https://www.bbc.co.uk/food/recipes/{slug}' for letter in 'ab' for page in (1, 2, 3)
+                    for slug in FixtureSite(recipes_per_page=4).recipe_slugs(letter, page)]
+        self.assertEqual(links, expected)
+        #the page count is read from the first page, nothing after the last page is fetched
+        self.assertEqual(fetched, [f'https://www.bbc.co.uk/food/recipes/a-z/{letter}/{page}#featured-content'
+                                   for letter in 'ab' for page in (1, 2, 3)])
+
+    def test_next_page_direct_stops_at_category_budget(self):
+        links, fetched = self.discover_direct(Frontier(max_links=None, max_per_category=6))
+        self.assertEqual(len(links), 12)
+        #two pages of four links hold the six of each category
+        self.assertEqual(fetched, [f'https://www.bbc.co.uk/food/recipes/a-z/{letter}/{page}#featured-content'
+                                   for letter in 'ab' for page in (1, 2)])
+
+    def test_closing_link_stream_stops_discovery(self):
+        finished = threading.Event()
+
+        def discover():
+            try:
+                for number in range(10000):
+                    self.scraper.frontier.add(f'https://x/recipe_{number}')
+            finally:
+                finished.set()
+
+        self.scraper.frontier.max_links = None
+        links = self.scraper.iter_recipe_links(discover)
+        self.assertEqual(next(links), 'https://x/recipe_0')
+        links.close()
+        self.assertTrue(finished.is_set())
+        self.assertTrue(self.scraper.frontier.closed)
+        self.assertLess(len(self.scraper.frontier), 10000)
+        self.assertFalse(self.scraper._streaming)
+
+    def test_recipe_table_created_once(self):
+        statements = []
+        engine = storage_credentials.get_engine()
+        event.listen(engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        for recipe_url in ('https://x/a', 'https://x/b', 'https://x/a'):
+            self.scraper.dict_recipe = new_recipe_dict()
+            self.scraper.dict_recipe.update(uuid=recipe_url, name='Name', recipe_url=recipe_url)
+            self.scraper._upload_to_RDS()
+        self.assertEqual(sum(statement.startswith('CREATE TABLE') for statement in statements), 1)
+        with engine.connect() as connection:
+            urls = connection.execute(text('SELECT recipe_url FROM recipe_data')).fetchall()
+        self.assertEqual(sorted(row[0] for row in urls), ['https://x/a', 'https://x/b'])
+
+    def test_link_done_once_rds_row_committed(self):
+        def fetch_details(scraper):
+            scraper.dict_recipe = new_recipe_dict()
+            scraper.dict_recipe.update(uuid='uuid-a', sku='A', name='A', recipe_url=scraper.link)
+            scraper._load_record(scraper.dict_recipe)
+            return scraper.dict_recipe
+
+        writer = RecipeWriter(storage_credentials.get_engine(), batch_size=10,
+                              on_flush=lambda links: self.scraper._written('rds', links))
+        self.scraper.rds_writer = writer
+        self.scraper.seen_index = SeenIndex.load(None, 'scraped_urls.txt')
+        self.scraper.link = 'https://x/a'
+        with mock.patch.object(type(self.scraper), '_fetch_details', fetch_details), \
+                mock.patch.object(type(self.scraper), '_upload_image'):
+            self.scraper._scrape_link()
+        #the row is only buffered, so the link is not done yet
+        self.assertNotIn('https://x/a', self.scraper.seen_index)
+        writer.flush()
+        self.assertIn('https://x/a', self.scraper.seen_index)
+        self.scraper.seen_index.close()
+
+    def test_queue_links_failed_when_rds_flush_fails(self):
+        def fetch_details(scraper):
+            scraper.dict_recipe = new_recipe_dict()
+            scraper.dict_recipe.update(uuid='uuid-a', sku='A', name='A', recipe_url=scraper.link)
+            scraper._load_record(scraper.dict_recipe)
+            return scraper.dict_recipe
+
+        work_queue = WorkQueue(storage_credentials.get_engine(), max_attempts=1)
+        work_queue.publish(['https://x/a'])
+        self.scraper.rds_writer = RecipeWriter(storage_credentials.get_engine(), batch_size=10)
+        #the flush before the ack fails, the final flush of the run succeeds
+        with mock.patch.object(type(self.scraper), '_fetch_details', fetch_details), \
+                mock.patch.object(type(self.scraper), '_upload_image'), \
+                mock.patch('rds_writer.insert_rows', side_effect=[RuntimeError('database down'), 1]):
+            counts = self.scraper.scraper_scrape_queue(work_queue)
+        self.assertEqual(counts, {'failed': 1})
+        self.assertEqual(self.scraper.failures.urls(), ['https://x/a'])
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,121 @@
+#%%
+
+import os
+import sys
+import time
+import unittest
+import requests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from resilience import (CircuitBreaker,
+                        CircuitOpenError,
+                        FailureLog,
+                        Resilience,
+                        RetryBudget,
+                        failure_cause)
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f'{status} error', response=response)
+
+
+class Flaky:
+    '''
+    Raises the given errors in turn, then returns 'ok'
+    '''
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+class ResilienceTest(unittest.TestCase):
+
+    def test_transient_errors_retried(self):
+        resilience = Resilience(retries=3, backoff=0)
+        call = Flaky(requests.Timeout(), http_error(503), requests.ConnectionError())
+        self.assertEqual(resilience.call('https://www.bbc.co.uk/food', call), 'ok')
+        self.assertEqual(call.calls, 4)
+
+    def test_client_errors_not_retried(self):
+        resilience = Resilience(retries=3, backoff=0)
+        call = Flaky(http_error(404))
+        with self.assertRaises(requests.HTTPError):
+            resilience.call('https://www.bbc.co.uk/food', call)
+        self.assertEqual(call.calls, 1)
+
+    def test_retry_budget(self):
+        budget = RetryBudget(ratio=0.5, minimum=1)
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+        resilience = Resilience(retries=5, backoff=0, retry_ratio=0, min_retries=2)
+        call = Flaky(*[requests.Timeout()] * 5)
+        with self.assertRaises(requests.Timeout):
+            resilience.call('https://ichef.bbci.co.uk/image.jpg', call)
+        self.assertEqual(call.calls, 3)
+
+    def test_circuit_breaker_pauses_host(self):
+        resilience = Resilience(retries=0, failure_threshold=2, reset_timeout=0.1)
+        for _ in range(2):
+            with self.assertRaises(requests.Timeout):
+                resilience.call('https://www.bbc.co.uk/a', Flaky(requests.Timeout()))
+        call = Flaky()
+        with self.assertRaises(CircuitOpenError):
+            resilience.call('https://www.bbc.co.uk/b', call)
+        self.assertEqual(call.calls, 0)
+        #other hosts are not paused
+        self.assertEqual(resilience.call('https://ichef.bbci.co.uk/c', Flaky()), 'ok')
+        time.sleep(0.15)
+        self.assertEqual(resilience.breaker.state('www.bbc.co.uk'), 'half_open')
+        self.assertEqual(resilience.call('https://www.bbc.co.uk/b', call), 'ok')
+        self.assertEqual(resilience.breaker.state('www.bbc.co.uk'), 'closed')
+
+    def test_client_errors_do_not_reset_breaker(self):
+        resilience = Resilience(retries=0, failure_threshold=2, reset_timeout=10)
+        with self.assertRaises(requests.Timeout):
+            resilience.call('https://www.bbc.co.uk/a', Flaky(requests.Timeout()))
+        with self.assertRaises(ValueError):
+            resilience.call('https://www.bbc.co.uk/b', Flaky(ValueError('no recipe name')))
+        with self.assertRaises(requests.Timeout):
+            resilience.call('https://www.bbc.co.uk/c', Flaky(requests.Timeout()))
+        self.assertEqual(resilience.breaker.state('www.bbc.co.uk'), 'open')
+
+    def test_half_open_allows_one_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.failure('host')
+        time.sleep(0.06)
+        breaker.check('host')
+        with self.assertRaises(CircuitOpenError):
+            breaker.check('host')
+
+    def test_failures_recorded_with_cause(self):
+        failures = FailureLog()
+        reason = failures.record('https://www.bbc.co.uk/food/recipes/a', requests.Timeout('slow'))
+        self.assertTrue(reason.startswith('timeout: '))
+        failures.record('https://www.bbc.co.uk/food/recipes/b', http_error(503))
+        failures.record('https://ichef.bbci.co.uk/a.jpg', http_error(404), stage='image')
+        self.assertEqual(failures.urls(causes=('timeout',)), ['https://www.bbc.co.uk/food/recipes/a'])
+        self.assertEqual(failures.summary(), {'page/timeout': 1, 'page/http_503': 1, 'image/http_404': 1})
+        self.assertEqual(failure_cause(CircuitOpenError('www.bbc.co.uk', 10)), 'circuit_open')
+
+    def test_failure_details_bounded(self):
+        failures = FailureLog(max_failures=3)
+        for number in range(5):
+            failures.record(f'https://www.bbc.co.uk/food/recipes/{number}', requests.Timeout('slow'))
+        self.assertEqual(len(failures.failures), 3)
+        self.assertEqual(failures.urls()[0], 'https://www.bbc.co.uk/food/recipes/2')
+        self.assertEqual(failures.summary(), {'page/timeout': 5})
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,109 @@
+#%%
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+import requests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from http_fetch import HTTPFetcher
+from response_cache import ResponseCache, page_type
+
+
+RECIPE_URL = 'https://www.bbc.co.uk/food/recipes/apple_pie_1'
+
+
+class FakeSession:
+    '''
+    Answers every request with the page, or 304 if the request's ETag matches
+    '''
+
+    def __init__(self, text, etag):
+        self.text = text
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(headers)
+        response = requests.Response()
+        response.url = url
+        response.headers['ETag'] = self.etag
+        if headers and headers.get('If-None-Match') == self.etag:
+            response.status_code = 304
+        else:
+            response.status_code = 200
+            response._content = self.text.encode()
+            response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.temp_dir.name)
+
+    def tearDown(self):
+        self.cache.close()
+        self.temp_dir.cleanup()
+
+    def test_page_type(self):
+        self.assertEqual(page_type('https://www.bbc.co.uk/food/recipes/a-z/a/2'), 'category')
+        self.assertEqual(page_type(RECIPE_URL), 'recipe')
+        self.assertEqual(page_type('https://www.bbc.co.uk/food'), 'other')
+
+    def test_pages_kept_between_runs(self):
+        self.cache.put(RECIPE_URL + '#featured-content', '<h1>Apple pie</h1>', etag='"1"')
+        self.cache.close()
+        self.cache = ResponseCache(self.temp_dir.name)
+        entry = self.cache.get(RECIPE_URL)
+        self.assertEqual(entry.text, '<h1>Apple pie</h1>')
+        self.assertTrue(entry.fresh)
+        self.assertEqual(entry.validators(), {'If-None-Match': '"1"'})
+        self.assertIsNone(self.cache.get('https://www.bbc.co.uk/food/recipes/other'))
+
+    def test_stale_pages_revalidated(self):
+        fetcher = HTTPFetcher(cache=self.cache)
+        fetcher.session = FakeSession('<h1>Apple pie</h1>', '"1"')
+        self.assertEqual(fetcher.get(RECIPE_URL), '<h1>Apple pie</h1>')
+        #fresh, no request
+        self.assertEqual(fetcher.get(RECIPE_URL), '<h1>Apple pie</h1>')
+        self.assertEqual(fetcher.session.requests, [None])
+        self.cache.ttls['recipe'] = 0
+        self.assertEqual(fetcher.get(RECIPE_URL), '<h1>Apple pie</h1>')
+        self.assertEqual(fetcher.session.requests[-1], {'If-None-Match': '"1"'})
+        self.assertEqual({key: self.cache.stats()[key] for key in ('hits', 'revalidated', 'misses')},
+                         {'hits': 1, 'revalidated': 1, 'misses': 1})
+
+    def test_least_recently_used_evicted(self):
+        pages = {f'https://www.bbc.co.uk/food/recipes/recipe_{number}': os.urandom(2000).hex()
+                 for number in range(3)}
+        for url, text in pages.items():
+            self.cache.put(url, text)
+            time.sleep(0.01)
+        page_size = self.cache.size() // 3
+        self.cache.max_bytes = page_size * 3 + page_size // 2
+        #reading the first page makes the second the least recently used
+        first, second, third = pages
+        self.cache.get(first)
+        self.cache.put('https://www.bbc.co.uk/food/recipes/recipe_3', os.urandom(2000).hex())
+        self.assertIsNone(self.cache.get(second))
+        for url in (first, third, 'https://www.bbc.co.uk/food/recipes/recipe_3'):
+            self.assertIsNotNone(self.cache.get(url))
+        self.assertLessEqual(self.cache.size(), self.cache.max_bytes)
+
+    def test_identical_bodies_stored_once(self):
+        self.cache.put('https://www.bbc.co.uk/food/recipes/a', 'same page')
+        self.cache.put('https://www.bbc.co.uk/food/recipes/b', 'same page')
+        bodies = [name for _, _, names in os.walk(os.path.join(self.temp_dir.name, 'bodies'))
+                  for name in names]
+        self.assertEqual(len(bodies), 1)
+        self.assertEqual(self.cache.stats()['pages'], 2)
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
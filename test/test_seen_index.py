@@ -0,0 +1,52 @@
+#%%
+
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from sqlalchemy import create_engine
+from rds_writer import RecipeWriter
+from seen_index import SeenIndex
+
+
+class SeenIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        '''
+        Using a SQLite database as a stand-in for RDS
+        '''
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f'sqlite:///{self.temp_dir.name}/recipes.db')
+        self.manifest_path = os.path.join(self.temp_dir.name, 'manifest.txt')
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def test_load_without_table(self):
+        seen_index = SeenIndex.load(self.engine)
+        self.assertEqual(len(seen_index), 0)
+
+    def test_load_from_rds_and_manifest(self):
+        with RecipeWriter(self.engine) as writer:
+            writer.add({'uuid': 'uuid-a', 'recipe_url': 'https://x/a'})
+        with open(self.manifest_path, 'w') as manifest:
+            manifest.write('https://x/b\n')
+        seen_index = SeenIndex.load(self.engine, self.manifest_path)
+        self.assertIn('https://x/a', seen_index)
+        self.assertEqual(seen_index.filter(['https://x/a', 'https://x/c', 'https://x/b']),
+                         ['https://x/c'])
+
+    def test_added_urls_kept_between_runs(self):
+        seen_index = SeenIndex.load(None, self.manifest_path)
+        seen_index.add('https://x/a')
+        seen_index.add('https://x/a')
+        seen_index.close()
+        with open(self.manifest_path) as manifest:
+            self.assertEqual(manifest.read(), 'https://x/a\n')
+        self.assertIn('https://x/a', SeenIndex.load(None, self.manifest_path))
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
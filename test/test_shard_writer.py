@@ -0,0 +1,124 @@
+#%%
+
+import gzip
+import json
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from botocore.exceptions import ClientError
+from resilience import Resilience
+from shard_writer import ShardWriter
+
+
+class FlakyS3:
+    '''
+    Stub S3 client whose shard uploads fail until up is set, and uploads of the keys 
+    in failing always fail
+    '''
+
+    def __init__(self):
+        self.up = False
+        self.failing = set()
+        self.keys = []
+
+    def upload_file(self, path, bucket, key):
+        if (not self.up and not key.endswith('manifest.json')) or key in self.failing:
+            raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'PutObject')
+        self.keys.append(key)
+
+
+class ShardWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.writer = ShardWriter(self.temp_dir.name, max_records=2)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_shards_rotate_by_count(self):
+        for number in range(5):
+            self.writer.write({'recipe_url': str(number)})
+        self.writer.close()
+        with open(os.path.join(self.temp_dir.name, 'manifest.json')) as manifest:
+            manifest = json.load(manifest)
+        self.assertEqual([entry['records'] for entry in manifest['shards']], [2, 2, 1])
+        self.assertEqual(manifest['records'], 5)
+
+        recipe_urls = []
+        for entry in manifest['shards']:
+            with gzip.open(os.path.join(self.temp_dir.name, entry['name']), 'rt') as shard:
+                recipe_urls.extend(json.loads(line)['recipe_url'] for line in shard)
+        self.assertEqual(recipe_urls, ['0', '1', '2', '3', '4'])
+
+    def test_manifest_kept_between_runs(self):
+        self.writer.write({'recipe_url': 'a'})
+        self.writer.close()
+        writer = ShardWriter(self.temp_dir.name, max_records=2)
+        writer.write({'recipe_url': 'b'})
+        writer.close()
+        self.assertEqual(len(writer.manifest['shards']), 2)
+
+    def test_links_completed_with_their_shard(self):
+        completed = []
+        writer = ShardWriter(self.temp_dir.name, max_records=2, on_complete=completed.extend)
+        for number in range(3):
+            writer.write({'recipe_url': str(number)})
+        self.assertEqual(completed, ['0', '1'])
+        writer.close()
+        self.assertEqual(completed, ['0', '1', '2'])
+
+    def test_failed_upload_kept_pending(self):
+        s3_client = FlakyS3()
+        completed = []
+        writer = ShardWriter(self.temp_dir.name, max_records=2, s3_client=s3_client, 
+                             bucket_name='bucket', resilience=Resilience(retries=0), 
+                             on_complete=completed.extend)
+        writer.write({'recipe_url': 'a'})
+        writer.write({'recipe_url': 'b'})
+        self.assertEqual(completed, [])
+        self.assertEqual(len(writer.pending()), 1)
+        with open(os.path.join(self.temp_dir.name, 'manifest.json')) as manifest:
+            manifest = json.load(manifest)
+        self.assertEqual(manifest['shards'][0]['uploaded'], False)
+
+        s3_client.up = True
+        writer.close()
+        self.assertEqual(writer.pending(), [])
+        self.assertEqual(completed, ['a', 'b'])
+        self.assertIn('shards/' + manifest['shards'][0]['name'], s3_client.keys)
+
+    def test_upload_outside_lock(self):
+        writer = ShardWriter(self.temp_dir.name, max_records=2, s3_client=FlakyS3(), 
+                             bucket_name='bucket', resilience=Resilience(retries=0))
+        locked = []
+        writer.s3_client.upload_file = lambda path, bucket, key: locked.append(writer._lock.locked())
+        writer.write({'recipe_url': 'a'})
+        writer.write({'recipe_url': 'b'})
+        #the shard and then the manifest, while other threads can write records
+        self.assertEqual(locked, [False, False])
+
+    def test_incomplete_ignores_earlier_runs(self):
+        s3_client = FlakyS3()
+        writer = ShardWriter(self.temp_dir.name, max_records=2, s3_client=s3_client, 
+                             bucket_name='bucket', resilience=Resilience(retries=0))
+        writer.write({'recipe_url': 'a'})
+        writer.close()
+        self.assertEqual(writer.incomplete(['a']), ['a'])
+
+        #the next run still cannot upload the earlier shard, but uploads its own
+        s3_client.failing.add('shards/' + writer.pending()[0])
+        s3_client.up = True
+        writer = ShardWriter(self.temp_dir.name, max_records=2, s3_client=s3_client, 
+                             bucket_name='bucket', resilience=Resilience(retries=0))
+        writer.write({'recipe_url': 'b'})
+        self.assertEqual(writer.incomplete(['b']), ['b'])
+        writer.complete_shard()
+        self.assertEqual(len(writer.pending()), 1)
+        self.assertEqual(writer.incomplete(['b']), [])
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,45 @@
+#%%
+
+import os
+import sys
+import threading
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+import storage_credentials
+
+
+class StorageCredentialsTest(unittest.TestCase):
+
+    def setUp(self):
+        storage_credentials.configure(database_url='sqlite://', bucket_name='test-bucket',
+                                      s3_endpoint_url='http://localhost:9000',
+                                      s3_max_pool_connections=4)
+
+    def tearDown(self):
+        storage_credentials.configure()
+        storage_credentials._settings.clear()
+
+    def test_nothing_created_on_configure(self):
+        self.assertIsNone(storage_credentials._engine)
+        self.assertIsNone(storage_credentials._s3_client)
+
+    def test_engine_shared_between_threads(self):
+        engines = []
+        threads = [threading.Thread(target=lambda: engines.append(storage_credentials.get_engine()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(engine) for engine in engines}), 1)
+        self.assertIs(storage_credentials.engine, engines[0])
+
+    def test_s3_client_settings(self):
+        s3_client = storage_credentials.get_s3_client()
+        self.assertEqual(s3_client.meta.endpoint_url, 'http://localhost:9000')
+        self.assertEqual(s3_client.meta.config.max_pool_connections, 4)
+        self.assertEqual(storage_credentials.s3_bucket_name, 'test-bucket')
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,65 @@
+#%%
+
+import os
+import sys
+import threading
+import time
+import unittest
+from selenium.common.exceptions import NoSuchElementException
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from waits import RECIPE_TITLE, RatePolicy, wait_for
+
+
+class SlowPage:
+    '''
+    Stands in for a driver whose page shows the element after a delay
+    '''
+
+    def __init__(self, ready_after: float):
+        self.ready_at = time.monotonic() + ready_after
+
+    def find_element(self, by, value):
+        if time.monotonic() < self.ready_at:
+            raise NoSuchElementException(value)
+        return (by, value)
+
+
+class WaitsTest(unittest.TestCase):
+
+    def test_wait_returns_when_element_appears(self):
+        start = time.monotonic()
+        element = wait_for(SlowPage(0.2), RECIPE_TITLE, timeout=5, poll_frequency=0.02)
+        self.assertEqual(element, RECIPE_TITLE)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_wait_is_bounded(self):
+        start = time.monotonic()
+        self.assertIsNone(wait_for(SlowPage(10), RECIPE_TITLE, timeout=0.2, poll_frequency=0.02))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_rate_policy_spaces_threads(self):
+        policy = RatePolicy(min_interval=0.05)
+        starts = []
+        lock = threading.Lock()
+
+        def request():
+            policy.wait()
+            with lock:
+                starts.append(time.monotonic())
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        starts.sort()
+        gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+        self.assertGreaterEqual(min(gaps), 0.04)
+
+    def test_no_delay(self):
+        policy = RatePolicy(min_interval=0)
+        self.assertEqual([policy.wait() for _ in range(3)], [0, 0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,108 @@
+#%%
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from sqlalchemy import create_engine
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+from work_queue import WorkQueue
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f'sqlite:///{self.temp_dir.name}/queue.db',
+                                    connect_args={'timeout': 30})
+        self.queue = WorkQueue(self.engine, owner='coordinator')
+        self.urls = [f'https://www.bbc.co.uk/food/recipes/recipe_{number}' for number in range(50)]
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def test_publish_is_idempotent(self):
+        self.assertEqual(self.queue.publish(self.urls), 50)
+        self.queue.publish(self.urls[:10])
+        self.assertEqual(self.queue.counts(), {'pending': 50})
+
+    def test_workers_never_share_urls(self):
+        self.queue.publish(self.urls)
+        claimed = []
+        lock = threading.Lock()
+
+        def work(name):
+            worker = WorkQueue(self.engine, owner=name)
+            while True:
+                urls = worker.claim(3)
+                if not urls:
+                    break
+                with lock:
+                    claimed.extend(urls)
+                worker.ack(urls)
+
+        threads = [threading.Thread(target=work, args=(f'worker-{number}',)) for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(claimed), sorted(self.urls))
+        self.assertEqual(self.queue.counts(), {'done': 50})
+        self.assertTrue(self.queue.drained())
+
+    def test_expired_lease_is_reclaimed(self):
+        self.queue.publish(self.urls[:2])
+        crashed = WorkQueue(self.engine, lease_seconds=0.05, owner='crashed')
+        self.assertEqual(crashed.claim(2), self.urls[:2])
+        worker = WorkQueue(self.engine, owner='worker')
+        self.assertEqual(worker.claim(2), [])
+        time.sleep(0.1)
+        self.assertEqual(worker.claim(2), self.urls[:2])
+        #a late ack from the crashed worker does not touch the new lease
+        crashed.ack(self.urls[:2])
+        self.assertEqual(self.queue.counts(), {'leased': 2})
+        worker.ack(self.urls[:2])
+        self.assertEqual(self.queue.counts(), {'done': 2})
+
+    def test_late_ack_with_same_owner_ignored(self):
+        self.queue.publish(self.urls[:1])
+        first = WorkQueue(self.engine, lease_seconds=0.05, owner='worker')
+        self.assertEqual(first.claim(), self.urls[:1])
+        time.sleep(0.1)
+        #the same worker name, e.g. a restarted container, claims the URL again
+        second = WorkQueue(self.engine, owner='worker')
+        self.assertEqual(second.claim(), self.urls[:1])
+        first.ack(self.urls[:1])
+        first.fail(self.urls[0], 'TimeoutException')
+        self.assertEqual(self.queue.counts(), {'leased': 1})
+        second.ack(self.urls[:1])
+        self.assertEqual(self.queue.counts(), {'done': 1})
+
+    def test_renewed_lease_not_reclaimed(self):
+        self.queue.publish(self.urls[:2])
+        worker = WorkQueue(self.engine, lease_seconds=0.1, owner='worker')
+        self.assertEqual(worker.claim(2), self.urls[:2])
+        time.sleep(0.06)
+        self.assertEqual(worker.renew(self.urls[:2]), 2)
+        time.sleep(0.06)
+        other = WorkQueue(self.engine, owner='other')
+        self.assertEqual(other.claim(2), [])
+        self.assertEqual(other.renew(self.urls[:2]), 0)
+        worker.ack(self.urls[:2])
+        self.assertEqual(self.queue.counts(), {'done': 2})
+
+    def test_failed_urls_are_retried_then_failed(self):
+        self.queue.publish(self.urls[:1])
+        worker = WorkQueue(self.engine, max_attempts=2, owner='worker')
+        for _ in range(2):
+            self.assertEqual(worker.claim(), self.urls[:1])
+            worker.fail(self.urls[0], 'TimeoutException')
+        self.assertEqual(worker.claim(), [])
+        self.assertEqual(self.queue.counts(), {'failed': 1})
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)
@@ -0,0 +1,120 @@
+#%%
+
+import os
+import queue
+import sys
+import threading
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from helpers import FakeDriver
+from worker_pool import DriverWorker, WorkerPool
+
+
+class FakeScraper:
+    '''
+    Stands in for BBCRecipeScraper: links ending in 'crash' crash the driver once,
+    links ending in 'broken' crash it every time, 'slow' links time out and 'bad' 
+    links fail to store
+    '''
+
+    def __init__(self):
+        self.driver = None
+        self.link = None
+        self._driver_lock = threading.Lock()
+        self.drivers = []
+        self.scraped = []
+        self.crashed = []
+        self.failed = []
+
+    def _new_driver(self):
+        driver = FakeDriver()
+        self.drivers.append(driver)
+        return driver
+
+    def _scrape_link(self):
+        if self.link.endswith('broken') or (self.link.endswith('crash') and self.link not in self.crashed):
+            self.crashed.append(self.link)
+            raise WebDriverException('chrome not reachable')
+        if self.link.endswith('slow'):
+            raise TimeoutException('page load timed out')
+        if self.link.endswith('bad'):
+            raise ValueError('no recipe name')
+        self.scraped.append(self.link)
+
+    def _record_failure(self, link, error):
+        self.failed.append((link, error.__class__.__name__))
+
+
+class Progress:
+
+    def __init__(self):
+        self.count = 0
+
+    def update(self, number):
+        self.count += number
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def run_worker(self, links, recycle_after=50, max_attempts=2):
+        scraper = FakeScraper()
+        link_queue = queue.Queue()
+        for link in links:
+            link_queue.put((link, 0))
+        progress = Progress()
+        worker = DriverWorker(scraper, link_queue, recycle_after, max_attempts, progress, 'worker-0')
+        worker.run()
+        return scraper, worker, progress
+
+    def test_crashed_driver_restarted(self):
+        scraper, worker, progress = self.run_worker(['https://x/crash', 'https://x/ok'])
+        self.assertEqual(sorted(scraper.scraped), ['https://x/crash', 'https://x/ok'])
+        #the crashed driver is quit and a new one started for the retry
+        self.assertEqual(len(scraper.drivers), 2)
+        self.assertTrue(all(driver.quit_called for driver in scraper.drivers))
+        self.assertEqual(worker.stats()['failures'], 0)
+        self.assertEqual(progress.count, 2)
+
+    def test_link_failed_after_max_attempts(self):
+        scraper, worker, progress = self.run_worker(['https://x/broken'], max_attempts=3)
+        self.assertEqual(scraper.crashed, ['https://x/broken'] * 3)
+        self.assertEqual(scraper.failed, [('https://x/broken', 'WebDriverException')])
+        self.assertEqual(worker.failures, 1)
+        self.assertEqual(progress.count, 1)
+
+    def test_store_failure_recorded(self):
+        scraper, worker, progress = self.run_worker(['https://x/bad', 'https://x/ok'])
+        self.assertEqual(scraper.failed, [('https://x/bad', 'ValueError')])
+        self.assertEqual(scraper.scraped, ['https://x/ok'])
+        #other errors do not restart the driver
+        self.assertEqual(len(scraper.drivers), 1)
+
+    def test_timeout_fails_page_without_restart(self):
+        scraper, worker, progress = self.run_worker(['https://x/slow', 'https://x/ok'])
+        self.assertEqual(scraper.failed, [('https://x/slow', 'TimeoutException')])
+        self.assertEqual(scraper.scraped, ['https://x/ok'])
+        self.assertEqual(len(scraper.drivers), 1)
+        self.assertEqual(worker.stats()['restarts'], 0)
+        self.assertEqual(progress.count, 2)
+
+    def test_drivers_recycled(self):
+        scraper, worker, progress = self.run_worker([f'https://x/{number}' for number in range(5)],
+                                                    recycle_after=2)
+        self.assertEqual(len(scraper.drivers), 3)
+        self.assertEqual(worker.stats()['restarts'], 2)
+        self.assertEqual(worker.pages, 5)
+
+    def test_pool_scrapes_every_link(self):
+        scraper = FakeScraper()
+        links = [f'https://x/{number}' for number in range(10)] + ['https://x/broken']
+        worker_stats = WorkerPool(scraper, workers=3, recycle_after=4).run(links)
+        self.assertEqual(sorted(scraper.scraped), sorted(links[:10]))
+        self.assertEqual(sum(stats['pages'] for stats in worker_stats), 10)
+        self.assertEqual(sum(stats['failures'] for stats in worker_stats), 1)
+        self.assertEqual(scraper.failed, [('https://x/broken', 'WebDriverException')])
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[''], verbosity=3, exit=False)